@@ -1,93 +1,175 @@
-from utils.upload_document import UploadDocuemnt
-from utils.chatbot import Chatbot
-from utils.clean_chatbot import CleanChatbot
-from utils.ui_settings import UISettings
-import gradio as gr
+from utils.telemetry import StageTimer, log_event
+from threading import Thread
 
-# Clean up previous chatbot data and uploaded documents
-CleanChatbot.remove_uploaded_documents_directory()
-CleanChatbot.remove_uploaded_documents_namespace()
+# Time the startup stages; LangChain, the vector database client, the ingestion and the models are
+# only imported on first use or by the background warm-up, so that the UI is served right away
+startup_timer = StageTimer("startup_seconds")
+with startup_timer.span("imports"):
+    from utils.upload_document import UploadDocuemnt
+    from utils.chatbot import Chatbot
+    from utils.clean_chatbot import CleanChatbot
+    from utils.ui_settings import UISettings
+    from utils.load_app_config import LoadAppConfig
+    import gradio as gr
 
-# Define the Gradio UI
-with gr.Blocks() as demo:
-    with gr.Tabs():
-        with gr.TabItem("RAG-DeepSeek"):
-            with gr.Row():
-                with gr.Column(visible=False) as references_bar:
-                    references = gr.Markdown(
-                        value="References",
-                        height=330
-                    )  
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+def warm_up() -> None:
+    """
+    Build the RAG pipeline (LangChain chain, vector database and LLM clients) in the background,
+    so that the first question does not wait for it, and report the startup stages.
+    """
+    if APP_CONFIG.ui_warm_up:
+        try:
+            with startup_timer.span("rag_pipeline"):
+                from utils.rag_pipeline import RAGPipeline
+
+                RAGPipeline.get_instance()
+        except Exception as error:
+            # The pipeline is built again on the first question
+            print(f"The warm-up failed: {error}")
+    startup_timer.record("total", startup_timer.elapsed())
+    log_event("startup", component="app", stages=startup_timer.stages)
+
+def build_demo() -> gr.Blocks:
+    """
+    Builds the Gradio UI and configures its queue.
+
+    Returns:
+        gr.Blocks: The Gradio app.
+    """
+    # Define the Gradio UI
+    with gr.Blocks() as demo:
+        with gr.Tabs():
+            with gr.TabItem("RAG-DeepSeek"):
+                with gr.Row():
+                    with gr.Column(visible=False) as references_bar:
+                        references = gr.Markdown(
+                            value="References",
+                            height=330
+                        )  
+                    
+                    with gr.Column():
+                        chatbot = gr.Chatbot(
+                            type="messages",
+                            height=330,
+                            group_consecutive_messages=False
+                        )
                 
-                with gr.Column():
-                    chatbot = gr.Chatbot(
-                        type="messages",
-                        height=330,
-                        group_consecutive_messages=False
+                with gr.Row():
+                    text_input = gr.TextArea(
+                        lines=4,
+                        placeholder="Enter your prompt here",
+                        container=False
+                    )
+                
+                with gr.Row():
+                    submit_btn = gr.Button(
+                        value="Submit"
+                    )
+                    sidebar_state = gr.State(False)
+                    references_btn = gr.Button(
+                        value="References"
                     )
-            
-            with gr.Row():
-                text_input = gr.TextArea(
-                    lines=4,
-                    placeholder="Enter your prompt here",
-                    container=False
-                )
-            
-            with gr.Row():
-                submit_btn = gr.Button(
-                    value="Submit"
-                )
-                sidebar_state = gr.State(False)
-                references_btn = gr.Button(
-                    value="References"
-                )
 
-                rag_with_dropdown = gr.Dropdown(
-                    choices=[
-                        "Pre-processed documents",
-                        "Uploaded document(s)"
-                    ],
-                    label="RAG with",
-                    value="Pre-processed documents",
-                    interactive=True
-                )
-                upload_btn = gr.UploadButton(
-                    label="Upload your doc(s)",
-                    file_count="multiple",
-                    file_types=[".pdf"]
-                )
-                clear_btn = gr.ClearButton(
-                    components=[references, chatbot, text_input]
-                )
-            
-            # Define chatbot interactions
-            submit_btn.click(fn=Chatbot.user,
-                             inputs=[text_input, chatbot],
-                             outputs=chatbot,
-                             queue=False).then(fn=Chatbot.bot,
-                                               inputs=[text_input, chatbot, rag_with_dropdown],
-                                               outputs=[references, text_input, chatbot],
-                                               queue=False)
-            
-            text_input.submit(fn=Chatbot.user,
-                              inputs=[text_input, chatbot],
-                              outputs=chatbot,
-                              queue=False).then(fn=Chatbot.bot,
-                                                inputs=[text_input, chatbot, rag_with_dropdown],
-                                                outputs=[references, text_input, chatbot],
-                                                queue=False)
-            
-            # Toggle references sidebar
-            references_btn.click(fn=UISettings.toggle_sidebar,
-                                 inputs=sidebar_state,
-                                 outputs=[references_bar, sidebar_state])
-            
-            # Handle document upload
-            upload_btn.upload(fn=UploadDocuemnt.process_uploaded_documents, 
-                              inputs=[upload_btn, rag_with_dropdown, chatbot],
-                              outputs=[text_input, chatbot],
-                              queue=False)
-            
-# Launch the Gradio UI
+                    rag_with_dropdown = gr.Dropdown(
+                        choices=[
+                            "Pre-processed documents",
+                            "Uploaded document(s)"
+                        ],
+                        label="RAG with",
+                        value="Pre-processed documents",
+                        interactive=True
+                    )
+                    upload_btn = gr.UploadButton(
+                        label="Upload your doc(s)",
+                        file_count="multiple",
+                        file_types=[".pdf"]
+                    )
+                    cancel_upload_btn = gr.Button(
+                        value="Cancel upload"
+                    )
+                    upload_job_id = gr.State("")
+                    upload_timer = gr.Timer(
+                        value=APP_CONFIG.upload_progress_interval,
+                        active=False
+                    )
+                    clear_btn = gr.ClearButton(
+                        components=[references, chatbot, text_input]
+                    )
+                
+                with gr.Row():
+                    upload_status = gr.Markdown(
+                        value=""
+                    )
+                
+                # Define chatbot interactions; both triggers share the chat turns' concurrency limit
+                submit_btn.click(fn=Chatbot.user,
+                                 inputs=[text_input, chatbot],
+                                 outputs=chatbot,
+                                 queue=False).then(fn=Chatbot.bot,
+                                                   inputs=[text_input, chatbot, rag_with_dropdown],
+                                                   outputs=[references, text_input, chatbot],
+                                                   concurrency_limit=APP_CONFIG.chat_concurrency_limit or None,
+                                                   concurrency_id="chat")
+                
+                text_input.submit(fn=Chatbot.user,
+                                  inputs=[text_input, chatbot],
+                                  outputs=chatbot,
+                                  queue=False).then(fn=Chatbot.bot,
+                                                    inputs=[text_input, chatbot, rag_with_dropdown],
+                                                    outputs=[references, text_input, chatbot],
+                                                    concurrency_limit=APP_CONFIG.chat_concurrency_limit or None,
+                                                    concurrency_id="chat")
+                
+                # Toggle references sidebar
+                references_btn.click(fn=UISettings.toggle_sidebar,
+                                     inputs=sidebar_state,
+                                     outputs=[references_bar, sidebar_state])
+                
+                # Handle document upload: start a background ingestion job, then report its progress
+                # on every tick of the upload timer until it finishes
+                upload_btn.upload(fn=UploadDocuemnt.process_uploaded_documents, 
+                                  inputs=[upload_btn, rag_with_dropdown, chatbot],
+                                  outputs=[text_input, chatbot, upload_job_id],
+                                  queue=False).then(fn=UploadDocuemnt.track_upload,
+                                                    inputs=upload_job_id,
+                                                    outputs=[upload_status, upload_timer],
+                                                    queue=False)
+                
+                upload_timer.tick(fn=UploadDocuemnt.track_upload,
+                                  inputs=upload_job_id,
+                                  outputs=[upload_status, upload_timer],
+                                  queue=False)
+                
+                cancel_upload_btn.click(fn=UploadDocuemnt.cancel_upload,
+                                        inputs=upload_job_id,
+                                        outputs=upload_status,
+                                        queue=False)
+                
+    # Streaming the chatbot's answer requires the Gradio queue; events beyond `max_queue_size` are rejected
+    demo.queue(
+        max_size=APP_CONFIG.max_queue_size or None,
+        default_concurrency_limit=APP_CONFIG.default_concurrency_limit or None
+    )
+    return demo
+
+# Only the launched script starts the app. The parsing workers of the ingestion are spawned
+# processes that import this module again, under another name, and must not start it.
 if __name__ == "__main__":
-    demo.launch()
+    # Remove the uploaded documents of expired sessions in the background; the first sweep only
+    # runs after `sweep_interval_seconds`, so no vector database call is made at startup
+    CleanChatbot.start_session_sweeper()
+
+    ui_start = startup_timer.elapsed()
+    demo = build_demo()
+    startup_timer.record("ui", startup_timer.elapsed() - ui_start)
+
+    Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+    # Launch the Gradio UI; the sweeper stops once the app is closed
+    try:
+        demo.launch()
+    finally:
+        CleanChatbot.stop_session_sweeper()
@@ -0,0 +1,125 @@
+from utils.load_app_config import LoadAppConfig
+from multiprocessing import get_context
+from typing import List
+import argparse
+import json
+import time
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+BENCHMARK_MESSAGES = [
+    {"role": "system", "content": APP_CONFIG.system_prompt},
+    {"role": "user", "content": "User prompt:\nSummarize the main idea of the Vision Transformer.\n\nRetrieved documents:\n"
+                                "The Vision Transformer splits an image into fixed-size patches, linearly embeds each of them, "
+                                "adds position embeddings, and feeds the resulting sequence of vectors to a standard Transformer encoder."}
+]
+BENCHMARK_TEXT = ("Startups take off because the founders make them take off. Do things that don't scale, "
+                  "recruit users manually and give them an insanely great experience. ")
+
+def benchmark_mode(mode: str, intra_op_threads: int, inter_op_threads: int, ct_generations: int, ct_texts: int) -> dict:
+    """
+    Loads both models in an inference mode and measures their throughput and memory.
+    Runs in a fresh process so that each mode's resident memory is measured on its own.
+
+    Args:
+        mode (str): Precision, optionally followed by "+compile" (e.g. "int8+compile").
+        intra_op_threads (int): Number of intra-op threads, 0 for the default.
+        inter_op_threads (int): Number of inter-op threads, 0 for the default.
+        ct_generations (int): Number of timed generations.
+        ct_texts (int): Number of timed embeddings.
+
+    Returns:
+        dict: The measurements of the mode.
+    """
+    from transformers import AutoTokenizer, Gemma3ForCausalLM
+    from utils.embedding_engine import EmbeddingEngine
+    from utils.cpu_inference import configure_torch_threads, optimize_model
+    from utils.memory_usage import current_rss_mb, peak_rss_mb
+    import torch
+
+    precision, _, option = mode.partition("+")
+    compile_model = option == "compile"
+    configure_torch_threads(intra_op_threads, inter_op_threads)
+    result = {"mode": mode, "intra_op_threads": torch.get_num_threads(), "inter_op_threads": torch.get_num_interop_threads()}
+
+    # Generation throughput
+    start = time.perf_counter()
+    gen_tokenizer = AutoTokenizer.from_pretrained(APP_CONFIG.gen_model_id)
+    gen_model = Gemma3ForCausalLM.from_pretrained(APP_CONFIG.gen_model_id).eval()
+    gen_model = optimize_model(gen_model, precision, compile_model)
+    result["generation_load_seconds"] = time.perf_counter() - start
+
+    input_ids = gen_tokenizer.apply_chat_template(BENCHMARK_MESSAGES, add_generation_prompt=True, return_tensors="pt")
+    generation_kwargs = {"do_sample": False, "max_new_tokens": APP_CONFIG.max_new_tokens}
+    with torch.no_grad():
+        gen_model.generate(input_ids=input_ids, max_new_tokens=8)
+        ct_tokens = 0
+        start = time.perf_counter()
+        for _ in range(ct_generations):
+            outputs = gen_model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), **generation_kwargs)
+            ct_tokens += outputs.shape[1] - input_ids.shape[1]
+        elapsed = time.perf_counter() - start
+    result["generated_tokens"] = ct_tokens
+    result["tokens_per_second"] = ct_tokens / elapsed
+    result["rss_after_generation_mb"] = current_rss_mb()
+
+    del gen_model
+
+    # Embedding throughput
+    embedding_engine = EmbeddingEngine(
+        APP_CONFIG.embed_model_id,
+        batch_size=APP_CONFIG.embed_batch_size,
+        pooling=APP_CONFIG.embed_pooling,
+        normalize=APP_CONFIG.embed_normalize,
+        precision=precision,
+        compile_model=compile_model
+    )
+    texts = [f"{i}. {BENCHMARK_TEXT * (1 + i % 8)}" for i in range(ct_texts)]
+    embedding_engine.embed(texts[:2])
+    start = time.perf_counter()
+    embedding_engine.embed(texts)
+    elapsed = time.perf_counter() - start
+    result["embeddings_per_second"] = ct_texts / elapsed
+    result["rss_after_embedding_mb"] = current_rss_mb()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def benchmark_inference_modes(modes: List[str], intra_op_threads: int, inter_op_threads: int, ct_generations: int, ct_texts: int) -> List[dict]:
+    """
+    Benchmarks several CPU inference modes, each in its own process.
+
+    Args:
+        modes (List[str]): The modes to benchmark.
+        intra_op_threads (int): Number of intra-op threads, 0 for the default.
+        inter_op_threads (int): Number of inter-op threads, 0 for the default.
+        ct_generations (int): Number of timed generations per mode.
+        ct_texts (int): Number of timed embeddings per mode.
+
+    Returns:
+        List[dict]: The measurements of each mode.
+    """
+    results = []
+    context = get_context("spawn")
+    for mode in modes:
+        print(f"Benchmarking the '{mode}' mode...")
+        with context.Pool(processes=1) as pool:
+            results.append(pool.apply(benchmark_mode, (mode, intra_op_threads, inter_op_threads, ct_generations, ct_texts)))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CPU inference modes of the generation and embedding models.")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8", "fp32+compile"],
+                        help="Modes to benchmark: fp32, bf16 or int8, optionally followed by +compile.")
+    parser.add_argument("--intra-op-threads", type=int, default=APP_CONFIG.intra_op_threads)
+    parser.add_argument("--inter-op-threads", type=int, default=APP_CONFIG.inter_op_threads)
+    parser.add_argument("--generations", type=int, default=3)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--output", default=None, help="Optional path of the JSON report.")
+    args = parser.parse_args()
+
+    report = benchmark_inference_modes(args.modes, args.intra_op_threads, args.inter_op_threads, args.generations, args.texts)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
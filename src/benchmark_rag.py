@@ -0,0 +1,425 @@
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from utils.mock_model_server import MockModelServer, MockTokenizer
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import argparse
+import tempfile
+import random
+import shutil
+import json
+import time
+import os
+
+NAMESPACE = "Pre-processed documents"
+
+DEFAULT_QUESTIONS = [
+    "What is the main idea of the Vision Transformer?",
+    "How does the Vision Transformer split an image into patches?",
+    "Which datasets was the Vision Transformer pre-trained on?",
+    "How does the Vision Transformer compare to convolutional networks?",
+    "What are position embeddings used for?",
+    "What does 'do things that don't scale' mean for a startup?",
+    "How should founders recruit their first users?",
+    "Why do startups take off?",
+    "What makes a good startup idea?",
+    "How much should founders care about their first users' experience?"
+]
+
+SYNTHETIC_VOCABULARY = (
+    "model transformer patch image attention layer token embedding startup founder user growth "
+    "dataset training accuracy benchmark scale network encoder decoder vector retrieval query "
+    "document answer latency memory throughput batch cache index search product market idea"
+).split()
+
+def write_synthetic_pdf(path: str, ct_pages: int, seed: int = 0) -> None:
+    """
+    Writes a PDF of pseudo-random English-like text, so that ingestion can be benchmarked on
+    corpora of any size. The same seed always produces the same document.
+
+    Args:
+        path (str): Path of the PDF.
+        ct_pages (int): Number of pages.
+        seed (int, optional): Seed of the text generator. Defaults to 0.
+    """
+    rng = random.Random(seed)
+
+    def sentence() -> str:
+        words = rng.choices(SYNTHETIC_VOCABULARY, k=rng.randint(6, 14))
+        return " ".join(words).capitalize() + "."
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # The page tree, written once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_ids = []
+    for _ in range(ct_pages):
+        lines = []
+        while len(lines) < 48:
+            line = sentence()
+            while len(line) < 80:
+                line += " " + sentence()
+            lines.append(line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)"))
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode("latin-1"))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode("latin-1"))
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")
+
+    content = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += f"{object_id} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+    xref_offset = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    content += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as file:
+        file.write(content)
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies, in seconds, by their mean, p50, p95 and p99.
+
+    Args:
+        latencies (List[float]): The latencies.
+
+    Returns:
+        Dict[str, float]: The summary.
+    """
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies)
+    return {
+        "count": len(latencies),
+        "mean_seconds": float(values.mean()),
+        "p50_seconds": float(np.percentile(values, 50)),
+        "p95_seconds": float(np.percentile(values, 95)),
+        "p99_seconds": float(np.percentile(values, 99))
+    }
+
+def run_concurrently(task: Callable[[int], float], ct_tasks: int, concurrency: int) -> dict:
+    """
+    Runs tasks with a fixed number of them in flight, and summarizes their latencies.
+
+    Args:
+        task (Callable[[int], float]): Runs the task of an index and returns its latency.
+        ct_tasks (int): Number of tasks.
+        concurrency (int): Number of tasks in flight.
+
+    Returns:
+        dict: The latency summary and the throughput in tasks per second.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(task, range(ct_tasks)))
+    elapsed = time.perf_counter() - start
+    return {**summarize_latencies(latencies), "wall_seconds": elapsed, "per_second": ct_tasks / elapsed}
+
+def configure(model_server: str,
+              work_dir: str,
+              documents_dir: str,
+              prefill_ms: float,
+              token_ms: float,
+              generation_slots: int = 1
+    ) -> Optional[MockModelServer]:
+    """
+    Points the application configuration at local stand-ins: the local vector index and keyword
+    index in a scratch directory, no embedding or answer caches (so that every run measures the
+    same work), and, with the mock model server, a server started in-process and a word-level
+    tokenizer. Must run before any module reading the configuration is imported.
+
+    Args:
+        model_server (str): "mock" for the in-process stand-in, "real" for the configured API URLs.
+        work_dir (str): Scratch directory of the indexes and manifests.
+        documents_dir (str): Directory of the documents to ingest.
+        prefill_ms (float): Simulated prefill time of the mock model server.
+        token_ms (float): Simulated time per generated token of the mock model server.
+        generation_slots (int, optional): Number of generations the mock model server runs at once. Defaults to 1.
+
+    Returns:
+        Optional[MockModelServer]: The started mock model server, if any.
+    """
+    overrides = {
+        "directories": {"documents_dir": documents_dir, "uploaded_documents_dir": os.path.join(work_dir, "uploads")},
+        "vectordb_config": {
+            "index": {"backend": "local", "local": {"index_dir": os.path.join(work_dir, "vectordb")}},
+            "ingestion": {"manifest_dir": os.path.join(work_dir, "manifests"), "incremental": False},
+            "hybrid_search": {"index_dir": os.path.join(work_dir, "keyword_index")}
+        },
+        "embeddings": {"cache": {"enabled": False}},
+        "answer_cache": {"enabled": False},
+        "telemetry": {"structured_logs": False}
+    }
+    server = None
+    if model_server == "mock":
+        server = MockModelServer(prefill_ms=prefill_ms, token_ms=token_ms, generation_slots=generation_slots).start()
+        overrides["api_url"] = server.api_urls()
+    LoadAppConfig.override(overrides)
+    if server is not None:
+        ResourceRegistry.get_or_create(("gen_tokenizer", LoadAppConfig().gen_model_id), MockTokenizer)
+    return server
+
+def benchmark_ingestion(use_model_server: bool) -> dict:
+    """
+    Ingests the documents directory into the local vector index and keyword index.
+
+    Args:
+        use_model_server (bool): Whether to embed through the model server's `/embed` route rather
+            than with the local embedding engine.
+
+    Returns:
+        dict: The number of documents and chunks, and the ingestion throughput.
+    """
+    from utils.prepare_vectordb import PrepareVectorDB
+    from utils.custom_api import CustomAPIEmbeddings
+    from utils.bm25_index import get_keyword_index
+    from utils.memory_usage import track_process_tree_rss
+
+    app_config = LoadAppConfig()
+    start = time.perf_counter()
+    prepare_vectordb = PrepareVectorDB(
+        app_config.documents_dir,
+        app_config.chunk_size,
+        app_config.chunk_overlap,
+        app_config.embed_model_id,
+        app_config.index_name,
+        app_config.cloud,
+        app_config.region,
+        app_config.vectordb_backend,
+        app_config.manifest_dir,
+        app_config.incremental_ingestion,
+        app_config.parse_workers,
+        app_config.ingestion_batch_size,
+        app_config.ingestion_queue_size,
+        get_keyword_index(),
+        CustomAPIEmbeddings(api_url=app_config.embed_api_url) if use_model_server else None
+    )
+    setup_seconds = time.perf_counter() - start
+
+    progress = {}
+    start = time.perf_counter()
+    # The benchmark runs a single ingestion, so the memory of the whole process tree (this process,
+    # the parsing workers and the queue manager, with shared pages counted once per process) is its own
+    with track_process_tree_rss() as memory_usage:
+        prepare_vectordb.prepare_and_save_vectordb(NAMESPACE, progress_callback=progress.update)
+    elapsed = time.perf_counter() - start
+    return {
+        "documents": progress.get("files_done", 0),
+        "chunks": progress.get("chunks_saved", 0),
+        "setup_seconds": setup_seconds,
+        "seconds": elapsed,
+        "chunks_per_second": progress.get("chunks_saved", 0) / elapsed,
+        "process_tree_peak_rss_mb": memory_usage["peak_rss_mb"],
+        "process_tree_peak_rss_delta_mb": memory_usage["peak_rss_delta_mb"]
+    }
+
+def benchmark_queries(questions: List[str], ct_queries: int, concurrency: int) -> dict:
+    """
+    Answers questions through `Chatbot.bot`, as concurrent chat sessions.
+
+    Args:
+        questions (List[str]): The questions, replayed in a loop.
+        ct_queries (int): Number of answered questions.
+        concurrency (int): Number of sessions asking at the same time.
+
+    Returns:
+        dict: The end-to-end and time-to-first-token latency summaries, and the query throughput.
+    """
+    from utils.chatbot import Chatbot
+
+    ttfts = [None] * ct_queries
+
+    def ask(i: int) -> float:
+        request = SimpleNamespace(session_hash=f"benchmark-{i % concurrency}")
+        start = time.perf_counter()
+        for _, _, chat_history in Chatbot.bot(questions[i % len(questions)], [], NAMESPACE, request):
+            if ttfts[i] is None and chat_history[-1]["content"]:
+                ttfts[i] = time.perf_counter() - start
+        return time.perf_counter() - start
+
+    # One untimed question builds the pipeline and opens the connections
+    ask(0)
+    ttfts[0] = None
+    result = run_concurrently(ask, ct_queries, concurrency)
+    return {
+        "concurrency": concurrency,
+        "latency": {key: value for key, value in result.items() if key not in ("wall_seconds", "per_second")},
+        "time_to_first_token": summarize_latencies([ttft for ttft in ttfts if ttft is not None]),
+        "queries_per_second": result["per_second"]
+    }
+
+def benchmark_embed_endpoint(texts: List[str], ct_requests: int, batch_size: int, concurrency: int) -> dict:
+    """
+    Sends batches of texts to the `/embed` route.
+
+    Args:
+        texts (List[str]): The texts, sent in a loop.
+        ct_requests (int): Number of requests.
+        batch_size (int): Number of texts per request.
+        concurrency (int): Number of requests in flight.
+
+    Returns:
+        dict: The request latency summary and the embedding throughput.
+    """
+    from utils.endpoint_pool import get_endpoint_pool
+
+    pool = get_endpoint_pool(LoadAppConfig().embed_api_url)
+
+    def embed(i: int) -> float:
+        batch = [texts[(i * batch_size + j) % len(texts)] for j in range(batch_size)]
+        start = time.perf_counter()
+        with pool.post(json={"texts": batch}):
+            return time.perf_counter() - start
+
+    result = run_concurrently(embed, ct_requests, concurrency)
+    return {"batch_size": batch_size, **result, "embeddings_per_second": result["per_second"] * batch_size}
+
+def benchmark_generate_endpoint(questions: List[str], ct_requests: int, concurrency: int) -> dict:
+    """
+    Sends prompts to the `/generate` route.
+
+    Args:
+        questions (List[str]): The questions, sent in a loop.
+        ct_requests (int): Number of requests.
+        concurrency (int): Number of requests in flight.
+
+    Returns:
+        dict: The request latency summary and the generated tokens per second.
+    """
+    from utils.endpoint_pool import get_endpoint_pool
+
+    app_config = LoadAppConfig()
+    pool = get_endpoint_pool(app_config.llm_api_url)
+    ct_tokens = [0] * ct_requests
+
+    def generate(i: int) -> float:
+        messages = [
+            {"role": "system", "content": app_config.system_prompt},
+            {"role": "user", "content": f"User prompt:\n{questions[i % len(questions)]}\n\nRetrieved documents:\n"}
+        ]
+        start = time.perf_counter()
+        with pool.post(json={"messages": messages}) as response:
+            ct_tokens[i] = response.json().get("metrics", {}).get("generated_tokens", 0)
+        return time.perf_counter() - start
+
+    result = run_concurrently(generate, ct_requests, concurrency)
+    return {**result, "tokens_per_second": sum(ct_tokens) / result["wall_seconds"]}
+
+def compare_with_baseline(report: dict, baseline: dict) -> Dict[str, dict]:
+    """
+    Compares the numeric measurements of a report with those of a baseline report.
+
+    Args:
+        report (dict): The report.
+        baseline (dict): The baseline report.
+
+    Returns:
+        Dict[str, dict]: For each measurement (dotted path), the baseline and current values and the relative change.
+    """
+    def flatten(values: dict, prefix: str = "") -> Dict[str, float]:
+        flat = {}
+        for key, value in values.items():
+            if isinstance(value, dict):
+                flat.update(flatten(value, f"{prefix}{key}."))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                flat[f"{prefix}{key}"] = value
+        return flat
+
+    current = flatten({key: value for key, value in report.items() if key != "settings"})
+    previous = flatten({key: value for key, value in baseline.items() if key not in ("settings", "comparison")})
+    return {
+        key: {
+            "baseline": previous[key],
+            "current": value,
+            "change_percent": (value - previous[key]) / previous[key] * 100 if previous[key] else None
+        }
+        for key, value in current.items() if key in previous
+    }
+
+def benchmark_rag(args: argparse.Namespace) -> dict:
+    """
+    Runs the RAG benchmark suite: ingestion, chat turns, and the `/embed` and `/generate` routes.
+
+    Args:
+        args (argparse.Namespace): The command-line arguments.
+
+    Returns:
+        dict: The report.
+    """
+    work_dir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    documents_dir = args.documents_dir
+    if args.synthetic_pages:
+        documents_dir = os.path.join(work_dir, "documents")
+        os.makedirs(documents_dir)
+        for i in range(args.synthetic_documents):
+            write_synthetic_pdf(os.path.join(documents_dir, f"synthetic-{i}.pdf"), args.synthetic_pages, seed=i)
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as file:
+            questions = [line.strip() for line in file if line.strip()]
+
+    server = configure(args.model_server, work_dir, documents_dir, args.mock_prefill_ms, args.mock_token_ms)
+    from utils.memory_usage import peak_rss_mb
+
+    report = {
+        "settings": {
+            "model_server": args.model_server,
+            "documents_dir": args.documents_dir if not args.synthetic_pages else None,
+            "synthetic_documents": args.synthetic_documents if args.synthetic_pages else 0,
+            "synthetic_pages": args.synthetic_pages,
+            "queries": args.queries,
+            "concurrency": args.concurrency
+        }
+    }
+    try:
+        print("Benchmarking the ingestion...")
+        report["ingestion"] = benchmark_ingestion(use_model_server=args.model_server == "mock")
+        print("Benchmarking the chat turns...")
+        report["queries"] = benchmark_queries(questions, args.queries, args.concurrency)
+        print("Benchmarking the /embed route...")
+        report["embed_endpoint"] = benchmark_embed_endpoint(questions, args.queries, args.embed_batch_size, args.concurrency)
+        print("Benchmarking the /generate route...")
+        report["generate_endpoint"] = benchmark_generate_endpoint(questions, args.queries, args.concurrency)
+        # With the mock model server, the peak includes the in-process server
+        report["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["comparison"] = compare_with_baseline(report, json.load(file))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, chat turns and the model server routes against local stand-ins.")
+    parser.add_argument("--model-server", choices=["mock", "real"], default="mock",
+                        help="'mock' starts an in-process stand-in; 'real' uses the configured API URLs.")
+    parser.add_argument("--documents-dir", default="./data/documents", help="Directory of the PDFs to ingest.")
+    parser.add_argument("--synthetic-pages", type=int, default=0,
+                        help="Ingest synthetic PDFs of this many pages instead of the documents directory.")
+    parser.add_argument("--synthetic-documents", type=int, default=4)
+    parser.add_argument("--questions-file", default=None, help="Optional file of questions, one per line.")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--mock-prefill-ms", type=float, default=50)
+    parser.add_argument("--mock-token-ms", type=float, default=5)
+    parser.add_argument("--baseline", default=None, help="Optional JSON report to compare with.")
+    parser.add_argument("--output", default=None, help="Optional path of the JSON report.")
+    args = parser.parse_args()
+
+    report = benchmark_rag(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,290 @@
+from utils.load_app_config import LoadAppConfig
+from benchmark_rag import DEFAULT_QUESTIONS, NAMESPACE, benchmark_ingestion, configure, summarize_latencies
+from types import SimpleNamespace
+from typing import List, Optional
+import argparse
+import threading
+import tempfile
+import random
+import shutil
+import json
+import time
+
+
+class ChatQueue:
+    """
+    Models the app's Gradio queue for chat turns: at most `concurrency_limit` turns are answered
+    at once, at most `max_queue_size` wait for their turn, and further turns are rejected.
+
+    The turns do not go through Gradio: the load test measures `Chatbot.user` and `Chatbot.bot`
+    behind this model of the queue, without the HTTP and event-stream overhead of the launched
+    app, and Gradio's queue size counts all queued events, not only chat turns. Without a
+    concurrency limit no turn ever waits, so `max_queue_size` has no effect, as in the app.
+    """
+
+    def __init__(self, concurrency_limit: int, max_queue_size: int) -> None:
+        """
+        Initializes the ChatQueue class.
+
+        Args:
+            concurrency_limit (int): Number of turns answered at once, 0 for no limit.
+            max_queue_size (int): Number of turns waiting, 0 for no limit. Ignored without a concurrency limit.
+        """
+        self.slots = threading.Semaphore(concurrency_limit) if concurrency_limit else None
+        self.max_queue_size = max_queue_size if concurrency_limit else 0
+        self.ct_waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """
+        Waits for a free slot.
+
+        Returns:
+            bool: False if the turn is rejected because the queue is full.
+        """
+        if self.slots is None:
+            return True
+        with self.lock:
+            if self.max_queue_size and self.ct_waiting >= self.max_queue_size:
+                return False
+            self.ct_waiting += 1
+        self.slots.acquire()
+        with self.lock:
+            self.ct_waiting -= 1
+        return True
+
+    def release(self) -> None:
+        """
+        Frees the slot of a finished turn.
+        """
+        if self.slots is not None:
+            self.slots.release()
+
+
+def run_session(session_id: str,
+                questions: List[str],
+                session_length: int,
+                think_time: float,
+                chat_queue: ChatQueue,
+                turns: List[dict],
+                rng: random.Random
+    ) -> None:
+    """
+    Plays one chat session: `session_length` questions through `Chatbot.user` and `Chatbot.bot`,
+    each after an exponentially distributed think time.
+
+    Args:
+        session_id (str): The session id.
+        questions (List[str]): The questions the session picks from.
+        session_length (int): Number of questions asked.
+        think_time (float): Mean time between an answer and the next question, in seconds.
+        chat_queue (ChatQueue): The queue of the chat turns.
+        turns (List[dict]): Receives the measurements of each turn.
+        rng (random.Random): The random generator of the session.
+    """
+    from utils.chatbot import Chatbot
+
+    request = SimpleNamespace(session_hash=session_id)
+    chat_history = []
+    for turn in range(session_length):
+        if turn and think_time > 0:
+            time.sleep(rng.expovariate(1 / think_time))
+        user_prompt = rng.choice(questions)
+        measurement = {"rejected": False, "error": False, "queue_wait": None, "latency": None, "time_to_first_token": None}
+        start = time.perf_counter()
+        # Like a user shown a "queue is full" error, a rejected session ends
+        if not chat_queue.acquire():
+            measurement["rejected"] = True
+            turns.append(measurement)
+            return
+        measurement["queue_wait"] = time.perf_counter() - start
+        try:
+            chat_history = Chatbot.user(user_prompt, chat_history)
+            for _, _, chat_history in Chatbot.bot(user_prompt, chat_history, NAMESPACE, request):
+                if measurement["time_to_first_token"] is None and chat_history[-1]["content"]:
+                    measurement["time_to_first_token"] = time.perf_counter() - start
+            measurement["latency"] = time.perf_counter() - start
+        except Exception as error:
+            measurement["error"] = True
+            print(f"Turn of session '{session_id}' failed: {error}")
+        finally:
+            chat_queue.release()
+        turns.append(measurement)
+
+
+def run_load_point(questions: List[str],
+                   arrival_rate: float,
+                   ct_sessions: int,
+                   session_length: int,
+                   think_time: float,
+                   concurrency_limit: int,
+                   max_queue_size: int,
+                   seed: int
+    ) -> dict:
+    """
+    Starts sessions at Poisson-distributed times, at an average arrival rate, and measures their turns.
+
+    Args:
+        questions (List[str]): The questions the sessions pick from.
+        arrival_rate (float): Average number of new sessions per second.
+        ct_sessions (int): Number of sessions.
+        session_length (int): Number of questions per session.
+        think_time (float): Mean think time between the turns of a session, in seconds.
+        concurrency_limit (int): Number of turns answered at once, 0 for no limit.
+        max_queue_size (int): Number of turns waiting, 0 for no limit.
+        seed (int): Seed of the arrival times and of the sessions' questions.
+
+    Returns:
+        dict: The throughput, latency, time-to-first-token and rejection measurements.
+    """
+    rng = random.Random(seed)
+    chat_queue = ChatQueue(concurrency_limit, max_queue_size)
+    turns: List[dict] = []
+    threads = []
+    start = time.perf_counter()
+    for i in range(ct_sessions):
+        if i:
+            time.sleep(rng.expovariate(arrival_rate))
+        thread = threading.Thread(
+            target=run_session,
+            args=(f"load-{seed}-{i}", questions, session_length, think_time, chat_queue, turns, random.Random(rng.random())),
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    answered = [turn for turn in turns if turn["latency"] is not None]
+    return {
+        "arrival_rate": arrival_rate,
+        "turns": len(turns),
+        "answered": len(answered),
+        "rejected": sum(turn["rejected"] for turn in turns),
+        "errors": sum(turn["error"] for turn in turns),
+        "seconds": elapsed,
+        "throughput": len(answered) / elapsed,
+        "latency": summarize_latencies([turn["latency"] for turn in answered]),
+        "queue_wait": summarize_latencies([turn["queue_wait"] for turn in answered]),
+        "time_to_first_token": summarize_latencies([turn["time_to_first_token"] for turn in answered if turn["time_to_first_token"] is not None])
+    }
+
+
+def find_saturation(points: List[dict], latency_slo: float) -> Optional[dict]:
+    """
+    Finds the first point of a throughput versus latency curve at which the deployment saturates:
+    turns are rejected or fail, the p95 latency exceeds the objective, or the throughput stops
+    growing with the arrival rate.
+
+    Args:
+        points (List[dict]): The points, by increasing arrival rate.
+        latency_slo (float): The p95 latency objective, in seconds.
+
+    Returns:
+        Optional[dict]: The arrival rate and reason of the saturation, and the last sustained
+            arrival rate and throughput; None if no point saturates.
+    """
+    for i, point in enumerate(points):
+        reason = None
+        if point["rejected"] or point["errors"]:
+            reason = "rejected or failed turns"
+        elif point["latency"].get("p95_seconds", 0) > latency_slo:
+            reason = "p95 latency above the objective"
+        elif i and point["throughput"] < 1.05 * points[i - 1]["throughput"]:
+            reason = "throughput plateau"
+        if reason is not None:
+            sustained = points[i - 1] if i else None
+            return {
+                "arrival_rate": point["arrival_rate"],
+                "reason": reason,
+                "max_sustained_arrival_rate": sustained["arrival_rate"] if sustained else None,
+                "max_sustained_throughput": sustained["throughput"] if sustained else None
+            }
+    return None
+
+
+def load_test_chat(args: argparse.Namespace) -> dict:
+    """
+    Sweeps the arrival rate of chat sessions for each concurrency limit of the chat turns, and
+    reports the throughput versus latency curves and their saturation points.
+
+    Args:
+        args (argparse.Namespace): The command-line arguments.
+
+    Returns:
+        dict: The report.
+    """
+    work_dir = tempfile.mkdtemp(prefix="rag-load-test-")
+    server = configure(args.model_server, work_dir, args.documents_dir, args.mock_prefill_ms, args.mock_token_ms, args.mock_generation_slots)
+    questions = DEFAULT_QUESTIONS
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as file:
+            questions = [line.strip() for line in file if line.strip()]
+
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "questions_file")},
+        # The turns call the chatbot directly, behind a model of the Gradio queue, see `ChatQueue`
+        "queue": "modeled",
+        "curves": []
+    }
+    try:
+        print("Ingesting the documents...")
+        benchmark_ingestion(use_model_server=args.model_server == "mock")
+        for concurrency_limit in args.concurrency_limits:
+            if not concurrency_limit and args.max_queue_size:
+                print(f"Without a concurrency limit no turn waits, so the queue size of {args.max_queue_size} is not reached.")
+            points = []
+            for arrival_rate in sorted(args.arrival_rates):
+                print(f"Concurrency limit {concurrency_limit or 'none'}, {arrival_rate} session(s)/s...")
+                points.append(run_load_point(
+                    questions,
+                    arrival_rate,
+                    args.sessions,
+                    args.session_length,
+                    args.think_time,
+                    concurrency_limit,
+                    args.max_queue_size,
+                    args.seed
+                ))
+            report["curves"].append({
+                "concurrency_limit": concurrency_limit,
+                "max_queue_size": args.max_queue_size if concurrency_limit else None,
+                "points": points,
+                "saturation": find_saturation(points, args.latency_slo)
+            })
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    app_config = LoadAppConfig()
+    parser = argparse.ArgumentParser(description="Replay chat sessions concurrently through the chatbot, behind a model of the Gradio queue, and find its saturation point.")
+    parser.add_argument("--model-server", choices=["mock", "real"], default="mock",
+                        help="'mock' starts an in-process stand-in; 'real' uses the configured API URLs.")
+    parser.add_argument("--documents-dir", default="./data/documents", help="Directory of the PDFs to ingest.")
+    parser.add_argument("--questions-file", default=None, help="Optional file of questions, one per line.")
+    parser.add_argument("--arrival-rates", type=float, nargs="+", default=[0.5, 1, 2, 4, 8],
+                        help="New sessions per second, one load point each.")
+    parser.add_argument("--sessions", type=int, default=20, help="Number of sessions per load point.")
+    parser.add_argument("--session-length", type=int, default=3, help="Number of questions per session.")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean time between the turns of a session, in seconds.")
+    parser.add_argument("--concurrency-limits", type=int, nargs="+", default=[app_config.chat_concurrency_limit],
+                        help="Concurrency limits of the chat turns to sweep over, 0 for no limit.")
+    parser.add_argument("--max-queue-size", type=int, default=app_config.max_queue_size, help="0 for no limit.")
+    parser.add_argument("--latency-slo", type=float, default=10.0, help="p95 turn latency objective, in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mock-prefill-ms", type=float, default=50)
+    parser.add_argument("--mock-token-ms", type=float, default=5)
+    parser.add_argument("--mock-generation-slots", type=int, default=app_config.max_batch_size)
+    parser.add_argument("--output", default=None, help="Optional path of the JSON report.")
+    args = parser.parse_args()
+
+    report = load_test_chat(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
@@ -1,5 +1,7 @@
 from utils.prepare_vectordb import PrepareVectorDB
 from utils.load_app_config import LoadAppConfig
+from utils.bm25_index import get_keyword_index
+from utils.memory_usage import track_process_tree_rss
 
 # Load application configuration
 APP_CONFIG = LoadAppConfig()
@@ -10,7 +12,8 @@ def process_documents_manually() -> None:
     
     This function initializes the vector database preparation process using configuration parameters.
     It reads documents from the specified directory, chunks them according to the defined size and overlap,
-    embeds them using a specified model, and saves them to the vector database.
+    embeds them using a specified model, and saves them to the vector database. The peak resident
+    memory of the process and its parsing workers is printed at the end.
     
     Namespace: "Pre-processed documents"
     """
@@ -21,9 +24,20 @@ def process_documents_manually() -> None:
         APP_CONFIG.embed_model_id,
         APP_CONFIG.index_name,
         APP_CONFIG.cloud,
-        APP_CONFIG.region
+        APP_CONFIG.region,
+        APP_CONFIG.vectordb_backend,
+        APP_CONFIG.manifest_dir,
+        APP_CONFIG.incremental_ingestion,
+        APP_CONFIG.parse_workers,
+        APP_CONFIG.ingestion_batch_size,
+        APP_CONFIG.ingestion_queue_size,
+        get_keyword_index()
     )
-    prepare_vectordb.prepare_and_save_vectordb(namespace="Pre-processed documents")
+    # Nothing else runs in this process, so the memory of its process tree is that of the ingestion
+    with track_process_tree_rss() as memory_usage:
+        prepare_vectordb.prepare_and_save_vectordb(namespace="Pre-processed documents")
+    print(f"Peak memory of the process and its parsing workers: {memory_usage['peak_rss_mb']:.1f} MiB "
+          f"(+{memory_usage['peak_rss_delta_mb']:.1f} MiB during the ingestion).")
 
 if __name__ == "__main__":
     process_documents_manually()
\ No newline at end of file
@@ -1,74 +1,379 @@
-from flask import Flask, request, jsonify, Response
-from transformers import pipeline, AutoModel, Gemma3ForCausalLM, AutoTokenizer
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from utils.load_app_config import LoadAppConfig
-import torch
+from utils.request_limiter import RequestLimiter
+from utils.telemetry import StageTimer, get_metrics, log_event
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+from threading import Event, Thread
+import asyncio
+import uvicorn
+import queue
+import json
 
 # Load application configuration
 APP_CONFIG = LoadAppConfig()
-app = Flask(__name__)
 
-# Text generation model initialization
-gen_model_id = APP_CONFIG.gen_model_id
-gen_model = Gemma3ForCausalLM.from_pretrained(gen_model_id).eval()
-gen_tokenizer = AutoTokenizer.from_pretrained(gen_model_id)
-generator = pipeline(
-    task="text-generation", 
-    model=gen_model, 
-    tokenizer=gen_tokenizer,
-    device_map=APP_CONFIG.device_map
-)
+# Generation and embedding run on separate workers with their own bounded queues,
+# so short embedding requests never wait behind long generations
+generation_limiter = RequestLimiter(APP_CONFIG.max_pending_generations)
+embedding_limiter = RequestLimiter(APP_CONFIG.max_pending_embeddings)
+embedding_executor = ThreadPoolExecutor(max_workers=APP_CONFIG.embed_workers, thread_name_prefix="embedding")
 
+# The models are loaded in the background once the port is bound: `/health` answers right away,
+# `/ready` and the model routes only once every model is loaded
+models_ready = Event()
+startup_timer = StageTimer("startup_seconds")
+startup_error: Optional[str] = None
+gen_tokenizer = None
+generation_engine = None
+generation_scheduler = None
+embedding_engine = None
+rerank_engine = None
 
-# Embedding model initialization
-embed_model_id = APP_CONFIG.embed_model_id
-embed_tokenizer = AutoTokenizer.from_pretrained(embed_model_id)
-embed_model = AutoModel.from_pretrained(embed_model_id)
+def load_models() -> None:
+    """
+    Import the inference libraries, load the models and warm them up, timing each stage.
+    """
+    global gen_tokenizer, generation_engine, generation_scheduler, embedding_engine, rerank_engine, startup_error
+    try:
+        with startup_timer.span("imports"):
+            from transformers import Gemma3ForCausalLM, AutoTokenizer
+            from utils.generation_scheduler import GenerationScheduler
+            from utils.generation_engine import GenerationEngine
+            from utils.embedding_engine import get_embedding_engine
+            from utils.rerank_engine import RerankEngine
+            from utils.cpu_inference import configure_torch_threads, load_optimized_model, snapshot_path
+
+        # Torch threading must be configured before any model runs
+        configure_torch_threads(APP_CONFIG.intra_op_threads, APP_CONFIG.inter_op_threads)
+
+        # Text generation model initialization
+        with startup_timer.span("generation_model"):
+            gen_model_id = APP_CONFIG.gen_model_id
+            gen_model = load_optimized_model(
+                lambda: Gemma3ForCausalLM.from_pretrained(gen_model_id, device_map=APP_CONFIG.device_map).eval(),
+                APP_CONFIG.gen_precision,
+                APP_CONFIG.gen_compile,
+                snapshot_path(APP_CONFIG.model_snapshot_dir, gen_model_id, APP_CONFIG.gen_precision)
+            )
+            tokenizer = AutoTokenizer.from_pretrained(gen_model_id)
+            # Decoder-only models must be left-padded when generating in batches
+            tokenizer.padding_side = "left"
+
+        # Precompute the key/value cache of the constant system-prompt prefix
+        with startup_timer.span("prefix_cache"):
+            engine = GenerationEngine(
+                model=gen_model,
+                tokenizer=tokenizer,
+                system_prompt=APP_CONFIG.system_prompt,
+                temperature=APP_CONFIG.temperature,
+                max_new_tokens=APP_CONFIG.max_new_tokens,
+                prefix_cache=APP_CONFIG.prefix_cache
+            )
+
+        # Embedding model initialization, shared with the ingestion so both produce the same vectors
+        with startup_timer.span("embedding_model"):
+            embedding_engine = get_embedding_engine(APP_CONFIG.embed_model_id)
+            embedding_engine.embed(["warm-up"])
+
+        # Optional cross-encoder re-ranking model; its short jobs share the embedding workers
+        if APP_CONFIG.reranker_enabled:
+            with startup_timer.span("rerank_model"):
+                rerank_engine = RerankEngine(
+                    APP_CONFIG.rerank_model_id,
+                    batch_size=APP_CONFIG.rerank_batch_size,
+                    precision=APP_CONFIG.rerank_precision,
+                    compile_model=APP_CONFIG.rerank_compile,
+                    snapshot_dir=APP_CONFIG.model_snapshot_dir
+                )
+
+        gen_tokenizer = tokenizer
+        generation_engine = engine
+        # Group concurrent generation requests into batched generator calls
+        generation_scheduler = GenerationScheduler(
+            run_batch=generation_engine.generate_batch,
+            max_batch_size=APP_CONFIG.max_batch_size,
+            batch_wait_ms=APP_CONFIG.batch_wait_ms
+        )
+        startup_timer.record("total", startup_timer.elapsed())
+        models_ready.set()
+        log_event("startup", component="model_server", ready=True, stages=startup_timer.stages)
+    except Exception as error:
+        startup_error = f"{type(error).__name__}: {error}"
+        log_event("startup", component="model_server", ready=False, error=startup_error, stages=startup_timer.stages)
+        raise
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Start loading the models once the server is up.
+    """
+    Thread(target=load_models, name="model-loader", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+def require_models() -> None:
+    """
+    Reject requests with 503 while the models are loading, or if they failed to load.
+    """
+    if not models_ready.is_set():
+        detail = f"The models failed to load: {startup_error}" if startup_error else "The models are loading, retry later."
+        raise HTTPException(status_code=503, detail=detail)
+
+async def run_with_limits(limiter: RequestLimiter, future_factory, timeout: float):
+    """
+    Run a blocking job on a worker pool, rejecting it when the pool queue is full.
+
+    Args:
+        limiter (RequestLimiter): The bound of the worker pool.
+        future_factory (Callable[[], Future]): Function submitting the job and returning its future.
+        timeout (float): Maximum time in seconds to wait for the result.
+
+    Returns:
+        Any: The result of the job.
+    """
+    if not limiter.try_acquire():
+        raise HTTPException(status_code=429, detail="The server is busy, retry later.")
+    future = future_factory()
+    future.add_done_callback(lambda _: limiter.release())
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise HTTPException(status_code=504, detail="The request timed out.")
+
+def timed_call(timer: StageTimer, stage: str, function: Callable[..., Any], *args: Any) -> Any:
+    """
+    Call a function on a worker, recording its duration as a stage of the request timer.
+    """
+    with timer.span(stage):
+        return function(*args)
+
+def record_generation(timer: StageTimer, route: str, stats: dict) -> dict:
+    """
+    Record the stages of a finished generation and return its metrics for the response.
+
+    Args:
+        timer (StageTimer): The timer started when the request arrived.
+        route (str): The route of the request.
+        stats (dict): The statistics returned by the generation engine.
+
+    Returns:
+        dict: The generation metrics.
+    """
+    server_seconds = timer.elapsed()
+    queue_wait_seconds = max(0.0, server_seconds - stats.get("generation_seconds", server_seconds))
+    timer.record("queue_wait", queue_wait_seconds)
+    timer.record("prefill", stats.get("prefill_seconds"))
+    timer.record("decode", stats.get("decode_seconds"))
+    if stats.get("generated_tokens", 0) > 1 and stats.get("decode_seconds"):
+        timer.record("time_per_output_token", stats["decode_seconds"] / (stats["generated_tokens"] - 1))
+    timer.record("total", server_seconds)
+    metrics = {**stats, "queue_wait_seconds": round(queue_wait_seconds, 6), "server_seconds": round(server_seconds, 6)}
+    log_event("generation", route=route, **metrics)
+    return metrics
+
+@app.get("/health")
+async def health() -> JSONResponse:
+    """
+    Liveness probe: answers as soon as the server is up, with the model loading state and the
+    duration of each startup stage. Fails (500) only when the models could not be loaded.
+    """
+    status = "ready" if models_ready.is_set() else "failed" if startup_error else "loading"
+    return JSONResponse({
+        "status": status,
+        "error": startup_error,
+        "startup": startup_timer.stages,
+        "pending_generations": generation_limiter.pending,
+        "pending_embeddings": embedding_limiter.pending
+    }, status_code=500 if startup_error else 200)
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """
+    Readiness probe: answers 200 once every model is loaded, 503 before, so that the clients
+    and load balancers only send traffic to replicas able to serve it.
+    """
+    require_models()
+    return JSONResponse({"status": "ready", "pending_generations": generation_limiter.pending})
+
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    """
+    Expose the latency histograms of the server, with their recent p50/p95/p99, in the Prometheus text format.
+    """
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
 
-@app.route("/generate", methods=["POST"])
-def generate_text() -> Response:
+@app.post("/generate")
+async def generate_text(request: Request) -> JSONResponse:
     """
     Generate text based on input messages using a pre-trained language model.
+    Concurrent requests are batched together by the generation scheduler.
     
     Request:
         - JSON object with a "messages" field containing the input text.
     
     Response:
-        - JSON object with the generated text under the "response" field.
+        - JSON object with the generated text under the "response" field, and the token counts and
+          queue wait, prefill and decode durations under the "metrics" field.
+        - 503 while the models are loading, 429 when too many generations are pending, 504 on timeout.
     """
-    data = request.json
+    require_models()
+    from utils.generation_engine import GenerationRequest
+
+    timer = StageTimer("generation_seconds")
+    data = await request.json()
     messages = data.get("messages", "")
-    response = generator(
-        messages,
-        temperature=APP_CONFIG.temperature,
-        do_sample=True,
-        max_new_tokens=APP_CONFIG.max_new_tokens
+    response, stats = await run_with_limits(
+        generation_limiter,
+        lambda: generation_scheduler.submit(GenerationRequest(messages)),
+        APP_CONFIG.generation_timeout_seconds
     )
-    return jsonify({"response": response[0]["generated_text"][-1]["content"]})
+    return JSONResponse({"response": response, "metrics": record_generation(timer, "/generate", stats)})
 
-@app.route("/embed", methods=["POST"])
-def generate_embedding() -> Response:
+@app.post("/generate_stream")
+async def generate_text_stream(request: Request) -> StreamingResponse:
     """
-    Generate text embeddings for a given input text using a pre-trained model.
+    Generate text based on input messages and stream the tokens as they are produced.
+    Streamed requests go through the generation scheduler too, and are batched with the
+    other requests; decoding stops when the client disconnects.
     
     Request:
-        - JSON object with a "text" field containing the input text.
+        - JSON object with a "messages" field containing the input text.
     
     Response:
-        - JSON object with the computed embedding as a list of float values under the "embedding" field.
+        - Server-sent events stream. Each event carries a JSON object with the next piece
+          of generated text under the "token" field. A last JSON event carries the generation
+          metrics under the "metrics" field, or the failure under the "error" field, and the
+          stream ends with a "[DONE]" event.
+        - 503 while the models are loading, 429 when too many generations are pending.
     """
-    # get the input text
-    data = request.json
-    text = data.get("text", "")
+    require_models()
+    from transformers import TextIteratorStreamer
+    from utils.generation_engine import GenerationRequest
+
+    timer = StageTimer("generation_seconds")
+    data = await request.json()
+    messages = data.get("messages", "")
+    if not generation_limiter.try_acquire():
+        raise HTTPException(status_code=429, detail="The server is busy, retry later.")
+
+    streamer = TextIteratorStreamer(
+        gen_tokenizer,
+        skip_prompt=True,
+        skip_special_tokens=True,
+        timeout=APP_CONFIG.generation_timeout_seconds
+    )
+    cancel_event = Event()
+    future = generation_scheduler.submit(GenerationRequest(messages, streamer=streamer, cancel_event=cancel_event))
+    tokens = iter(streamer)
+
+    def on_done(done: Future) -> None:
+        generation_limiter.release()
+        # A request failing before its generation starts would never end its streamer
+        if done.cancelled() or done.exception() is not None:
+            streamer.end()
+
+    future.add_done_callback(on_done)
+
+    async def stream_events() -> AsyncIterator[str]:
+        try:
+            while True:
+                # The streamer blocks until the next token, so it is read on a worker thread
+                token = await asyncio.to_thread(next, tokens, None)
+                if token is None:
+                    break
+                if token:
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+            _, stats = await asyncio.wait_for(asyncio.wrap_future(future), timeout=APP_CONFIG.generation_timeout_seconds)
+            yield f"data: {json.dumps({'metrics': record_generation(timer, '/generate_stream', stats)})}\n\n"
+        except (queue.Empty, asyncio.TimeoutError):
+            yield f"data: {json.dumps({'error': 'The request timed out.'})}\n\n"
+        except Exception as error:
+            yield f"data: {json.dumps({'error': f'The generation failed: {error}'})}\n\n"
+        finally:
+            # Stops decoding when the client disconnects or the request times out, and drops
+            # the request if it has not started yet
+            cancel_event.set()
+            future.cancel()
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+@app.post("/embed")
+async def generate_embedding(request: Request) -> JSONResponse:
+    """
+    Generate text embeddings for one or many input texts using a pre-trained model.
+    Embeddings are pooled and normalized as configured under `embeddings`.
+    
+    Request:
+        - JSON object with either a "texts" field containing a list of input texts,
+          or a "text" field containing a single input text.
     
-    # Tokenize input text
-    inputs = embed_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
+    Response:
+        - JSON object with the computed embeddings as a list of float lists under the "embeddings" field
+          when "texts" is given, or a single float list under the "embedding" field when "text" is given.
+        - 503 while the models are loading, 429 when too many embedding requests are pending, 504 on timeout.
+    """
+    require_models()
+    timer = StageTimer("embedding_seconds")
+    data = await request.json()
+
+    # Batched request
+    if "texts" in data:
+        texts = data.get("texts") or []
+        if not texts:
+            return JSONResponse({"embeddings": []})
+        embeddings = await run_with_limits(
+            embedding_limiter,
+            lambda: embedding_executor.submit(timed_call, timer, "compute", embedding_engine.embed, texts),
+            APP_CONFIG.embedding_timeout_seconds
+        )
+        timer.record("total", timer.elapsed())
+        return JSONResponse({"embeddings": embeddings})
+
+    # Single text request
+    text = data.get("text", "")
+    embeddings = await run_with_limits(
+        embedding_limiter,
+        lambda: embedding_executor.submit(timed_call, timer, "compute", embedding_engine.embed, [text]),
+        APP_CONFIG.embedding_timeout_seconds
+    )
+    timer.record("total", timer.elapsed())
+    return JSONResponse({"embedding": embeddings[0]})
+
+@app.post("/rerank")
+async def rerank(request: Request) -> JSONResponse:
+    """
+    Score the relevance of passages to a query with a cross-encoder, in one batched pass.
     
-    # Get embeddings
-    with torch.no_grad():
-        outputs = embed_model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1).squeeze().cpu().numpy()
+    Request:
+        - JSON object with a "query" field containing the query and a "texts" field containing
+          the list of passages to score.
     
-    return jsonify({"embedding": embeddings.tolist()})
+    Response:
+        - JSON object with one relevance score per passage under the "scores" field, higher is more relevant.
+        - 503 while the models are loading or when the reranker is disabled, 429 when too many requests are pending, 504 on timeout.
+    """
+    require_models()
+    if rerank_engine is None:
+        raise HTTPException(status_code=503, detail="The reranker is disabled.")
+    timer = StageTimer("rerank_seconds")
+    data = await request.json()
+    query = data.get("query", "")
+    texts = data.get("texts") or []
+    if not texts:
+        return JSONResponse({"scores": []})
+    scores = await run_with_limits(
+        embedding_limiter,
+        lambda: embedding_executor.submit(timed_call, timer, "compute", rerank_engine.score, query, texts),
+        APP_CONFIG.embedding_timeout_seconds
+    )
+    timer.record("total", timer.elapsed())
+    return JSONResponse({"scores": scores})
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    uvicorn.run(app, host=APP_CONFIG.server_host, port=APP_CONFIG.server_port)
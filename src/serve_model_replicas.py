@@ -0,0 +1,83 @@
+from utils.load_app_config import LoadAppConfig
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from typing import Dict
+import argparse
+import time
+import os
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+ROUTES = {
+    "llm_api_url": "generate",
+    "llm_stream_api_url": "generate_stream",
+    "embed_api_url": "embed",
+    "rerank_api_url": "rerank"
+}
+
+def serve_replica(port: int, intra_op_threads: int) -> None:
+    """
+    Runs one model server replica with its own copy of the models and its own thread budget.
+    Runs in a fresh process; the configuration is overridden before the server module is
+    imported, as the server loads the models and configures torch when imported.
+
+    Args:
+        port (int): Port of the replica.
+        intra_op_threads (int): Number of intra-op threads of the replica.
+    """
+    LoadAppConfig.override({"server": {"port": port, "intra_op_threads": intra_op_threads}})
+    import serve_llm_and_embedding_models as server
+    import uvicorn
+
+    uvicorn.run(server.app, host=APP_CONFIG.server_host, port=port)
+
+def serve_model_replicas(replicas: int, base_port: int, threads_per_replica: int) -> None:
+    """
+    Starts model server replicas on consecutive ports and restarts the ones that exit, until interrupted.
+
+    Args:
+        replicas (int): Number of replicas.
+        base_port (int): Port of the first replica.
+        threads_per_replica (int): Number of intra-op threads of each replica.
+    """
+    context = get_context("spawn")
+    processes: Dict[int, BaseProcess] = {}
+
+    def start(index: int) -> None:
+        process = context.Process(target=serve_replica, args=(base_port + index, threads_per_replica), name=f"model-server-{index}")
+        process.start()
+        processes[index] = process
+
+    for index in range(replicas):
+        start(index)
+    print(f"Started {replicas} replica(s) with {threads_per_replica} thread(s) each. Client configuration:\n\napi_url:")
+    for key, route in ROUTES.items():
+        urls = ", ".join(f'"http://127.0.0.1:{base_port + index}/{route}"' for index in range(replicas))
+        print(f"  {key}: [{urls}]")
+
+    try:
+        while True:
+            time.sleep(5)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    print(f"Replica {index} exited with code {process.exitcode}, restarting it...")
+                    start(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the models from several processes, each with its own copy of the models.")
+    parser.add_argument("--replicas", type=int, default=APP_CONFIG.server_replicas)
+    parser.add_argument("--port", type=int, default=APP_CONFIG.server_port, help="Port of the first replica.")
+    parser.add_argument("--threads-per-replica", type=int, default=0,
+                        help="Intra-op threads of each replica, 0 to share the CPUs between the replicas.")
+    args = parser.parse_args()
+
+    threads_per_replica = args.threads_per_replica or APP_CONFIG.intra_op_threads or max(1, (os.cpu_count() or 1) // args.replicas)
+    serve_model_replicas(args.replicas, args.port, threads_per_replica)
@@ -0,0 +1,126 @@
+from utils.ingestion_manifest import IngestionManifest
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import time
+import os
+
+
+class SemanticAnswerCache:
+    """
+    An in-memory cache of generated answers, looked up by query embedding. A new query hits the
+    cache when its cosine similarity with a cached query of the same namespace reaches the
+    configured threshold.
+
+    Entries expire after `ttl_seconds`, each namespace keeps at most `max_entries` entries (least
+    recently used first out), and a namespace is invalidated when it is re-ingested, which is
+    detected through a change of its ingestion manifest.
+    """
+
+    def __init__(self, manifest_dir: str, similarity_threshold: float, ttl_seconds: float, max_entries: int) -> None:
+        """
+        Initializes the SemanticAnswerCache class.
+
+        Args:
+            manifest_dir (str): Directory of the ingestion manifests, used to detect re-ingestion.
+            similarity_threshold (float): Minimum cosine similarity for a cache hit.
+            ttl_seconds (float): Lifetime of a cache entry in seconds.
+            max_entries (int): Maximum number of entries per namespace.
+        """
+        self.manifest_dir = manifest_dir
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.namespaces: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __manifest_version(self, namespace: str) -> Optional[float]:
+        """
+        Returns the modification time of the namespace manifest, which changes on every ingestion.
+        """
+        path = IngestionManifest.manifest_path(self.manifest_dir, namespace)
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    def __get_namespace(self, namespace: str) -> Dict:
+        """
+        Returns the entries of a namespace, dropping them if the namespace was re-ingested.
+        """
+        version = self.__manifest_version(namespace)
+        entries = self.namespaces.get(namespace)
+        if entries is None or entries["version"] != version:
+            entries = {"version": version, "entries": OrderedDict(), "next_id": 0}
+            self.namespaces[namespace] = entries
+        return entries
+
+    @staticmethod
+    def __normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, namespace: str, query_embedding: List[float]) -> Optional[Tuple[str, str]]:
+        """
+        Looks up the answer of the most similar cached query.
+
+        Args:
+            namespace (str): The namespace the query is asked against.
+            query_embedding (List[float]): Embedding of the query.
+
+        Returns:
+            Optional[Tuple[str, str]]: The cached answer and references, or None on a miss.
+        """
+        query = self.__normalize(query_embedding)
+        now = time.time()
+        with self.lock:
+            entries = self.__get_namespace(namespace)["entries"]
+            for entry_id in [entry_id for entry_id, entry in entries.items() if now - entry["created_at"] > self.ttl_seconds]:
+                del entries[entry_id]
+            if not entries:
+                self.stats["misses"] += 1
+                return None
+
+            entry_ids = list(entries.keys())
+            similarities = np.stack([entries[entry_id]["embedding"] for entry_id in entry_ids]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.stats["misses"] += 1
+                return None
+
+            entries.move_to_end(entry_ids[best])
+            self.stats["hits"] += 1
+            entry = entries[entry_ids[best]]
+            return entry["answer"], entry["references"]
+
+    def store(self, namespace: str, query_embedding: List[float], answer: str, references: str) -> None:
+        """
+        Caches the answer to a query.
+
+        Args:
+            namespace (str): The namespace the query was asked against.
+            query_embedding (List[float]): Embedding of the query.
+            answer (str): The generated answer.
+            references (str): The references shown with the answer.
+        """
+        with self.lock:
+            namespace_entries = self.__get_namespace(namespace)
+            entries = namespace_entries["entries"]
+            entries[namespace_entries["next_id"]] = {
+                "embedding": self.__normalize(query_embedding),
+                "answer": answer,
+                "references": references,
+                "created_at": time.time()
+            }
+            namespace_entries["next_id"] += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters of the cache.
+
+        Returns:
+            Dict[str, int]: The hits and misses.
+        """
+        with self.lock:
+            return dict(self.stats)
@@ -0,0 +1,288 @@
+from langchain_core.documents import Document
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from utils.segmented_index import SegmentedIndex
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import re
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into lowercased terms. Dotted and hyphenated words such as "gemma-3" or
+    "v1.5" are kept whole, so that model names and version numbers match exactly.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        List[str]: The terms.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index(SegmentedIndex):
+    """
+    A keyword index scoring chunks with Okapi BM25, persisted on disk per namespace.
+
+    Each namespace is stored as segments (see SegmentedIndex), so an update only writes the
+    chunks it adds, and an ingestion can index its chunks batch by batch. Each segment holds
+    flat numpy arrays over its own vocabulary, memory-mapped when loaded:
+    - a forward index (the term ids and frequencies of each chunk, in CSR layout), from which
+      merged segments are built;
+    - an inverted index (the chunks and frequencies of each term, in CSR layout).
+    A query only touches the postings of its own terms. The document frequencies and the
+    average chunk length are those of the live chunks of the whole namespace, so the scores
+    do not depend on how the chunks are split into segments.
+    """
+
+    payload_arrays = ("doc_lengths", "doc_offsets", "doc_terms", "doc_tfs", "term_offsets", "posting_docs", "posting_tfs")
+    payload_lists = ("terms",)
+
+    def __init__(self, persist_dir: str, k1: float = 1.2, b: float = 0.75) -> None:
+        """
+        Initializes the BM25Index class.
+
+        Args:
+            persist_dir (str): Directory in which the namespaces are persisted.
+            k1 (float, optional): BM25 term-frequency saturation. Defaults to 1.2.
+            b (float, optional): BM25 length normalization. Defaults to 0.75.
+        """
+        super().__init__(persist_dir)
+        self.k1 = k1
+        self.b = b
+
+    def _prepare_segment(self, segment: Dict[str, Any]) -> None:
+        segment["term_to_id"] = {term: term_id for term_id, term in enumerate(segment["terms"])}
+        segment["total_length"] = int(np.sum(segment["doc_lengths"], dtype=np.int64))
+
+    def _merge_payloads(self, parts: List[Tuple[Dict[str, Any], np.ndarray]]) -> Dict[str, Any]:
+        # The vocabularies of the segments are remapped onto the vocabulary of the merged segment,
+        # keeping only the terms of the live chunks
+        terms: List[str] = []
+        term_to_id: Dict[str, int] = {}
+        doc_terms, doc_tfs, doc_lengths, entry_counts = [], [], [], []
+        for segment, rows in parts:
+            doc_offsets = np.asarray(segment["doc_offsets"])
+            starts, ends = doc_offsets[rows], doc_offsets[rows + 1]
+            lengths = ends - starts
+            entry_rows = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+            local_terms = np.asarray(segment["doc_terms"])[entry_rows]
+            used_terms = np.unique(local_terms)
+            remap = np.zeros(len(segment["terms"]), dtype=np.int32)
+            for term_id in used_terms:
+                term = segment["terms"][term_id]
+                remap[term_id] = term_to_id.setdefault(term, len(terms))
+                if remap[term_id] == len(terms):
+                    terms.append(term)
+            doc_terms.append(remap[local_terms])
+            doc_tfs.append(np.asarray(segment["doc_tfs"])[entry_rows])
+            doc_lengths.append(np.asarray(segment["doc_lengths"])[rows])
+            entry_counts.append(lengths)
+        return self.__payload(terms, np.concatenate(entry_counts), np.concatenate(doc_terms), np.concatenate(doc_tfs), np.concatenate(doc_lengths))
+
+    @staticmethod
+    def __payload(terms: List[str],
+                  entry_counts: np.ndarray,
+                  doc_terms: np.ndarray,
+                  doc_tfs: np.ndarray,
+                  doc_lengths: np.ndarray
+        ) -> Dict[str, Any]:
+        """
+        Builds the arrays of a segment from its forward index: the inverted index holds the
+        postings sorted by term, then by chunk.
+        """
+        doc_offsets = np.zeros(len(entry_counts) + 1, dtype=np.int64)
+        np.cumsum(entry_counts, out=doc_offsets[1:])
+        doc_terms = doc_terms.astype(np.int32)
+        doc_tfs = doc_tfs.astype(np.uint16)
+        doc_of_entry = np.repeat(np.arange(len(entry_counts), dtype=np.int32), entry_counts)
+        order = np.lexsort((doc_of_entry, doc_terms))
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc_terms, minlength=len(terms)), out=term_offsets[1:])
+        return {
+            "terms": terms,
+            "doc_lengths": doc_lengths.astype(np.int32),
+            "doc_offsets": doc_offsets,
+            "doc_terms": doc_terms,
+            "doc_tfs": doc_tfs,
+            "term_offsets": term_offsets,
+            "posting_docs": doc_of_entry[order],
+            "posting_tfs": doc_tfs[order]
+        }
+
+    def update(self,
+               namespace: str,
+               ids: List[str],
+               texts: List[str],
+               metadatas: List[dict],
+               delete_ids: Optional[List[str]] = None
+        ) -> None:
+        """
+        Adds chunks to a namespace, replacing the chunks with the same ids, and deletes chunks.
+
+        Args:
+            namespace (str): The namespace to update.
+            ids (List[str]): The ids of the chunks to add.
+            texts (List[str]): The texts of the chunks to add.
+            metadatas (List[dict]): The metadata of the chunks to add.
+            delete_ids (Optional[List[str]], optional): The ids of the chunks to delete. Defaults to None.
+        """
+        if not ids and not delete_ids:
+            return
+        payload = None
+        if ids:
+            terms: List[str] = []
+            term_to_id: Dict[str, int] = {}
+            doc_terms, doc_tfs, doc_lengths, entry_counts = [], [], [], []
+            for text in texts:
+                counts: Dict[int, int] = {}
+                tokens = tokenize(text)
+                for token in tokens:
+                    term_id = term_to_id.setdefault(token, len(terms))
+                    if term_id == len(terms):
+                        terms.append(token)
+                    counts[term_id] = counts.get(term_id, 0) + 1
+                doc_terms.append(np.fromiter(counts.keys(), dtype=np.int32, count=len(counts)))
+                doc_tfs.append(np.minimum(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)), 65535))
+                doc_lengths.append(len(tokens))
+                entry_counts.append(len(counts))
+            payload = self.__payload(
+                terms,
+                np.array(entry_counts, dtype=np.int64),
+                np.concatenate(doc_terms),
+                np.concatenate(doc_tfs),
+                np.array(doc_lengths, dtype=np.int32)
+            )
+        self._write(namespace, ids, texts, metadatas, payload, delete_ids=delete_ids)
+
+    def delete_namespace(self, namespace: str) -> None:
+        """
+        Deletes a namespace, if it exists.
+
+        Args:
+            namespace (str): The namespace to delete.
+        """
+        self._delete_namespace(namespace)
+
+    def search(self, namespace: str, query: str, k: int) -> List[Tuple[Document, float]]:
+        """
+        Returns the k chunks with the highest BM25 score for a query.
+
+        Args:
+            namespace (str): The namespace to search in.
+            query (str): The query text.
+            k (int): The number of chunks to return.
+
+        Returns:
+            List[Tuple[Document, float]]: The chunks and their scores, best first.
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms or k <= 0:
+            return []
+
+        def search_segments(segments: List[Dict[str, Any]]) -> List[Tuple[Document, float]]:
+            ct_docs = sum(segment["ct_live"] for segment in segments)
+            if not ct_docs:
+                return []
+            total_length = sum(
+                segment["total_length"] if segment["ct_live"] == segment["count"]
+                else int(np.sum(segment["doc_lengths"][segment["live"]], dtype=np.int64))
+                for segment in segments if segment["ct_live"]
+            )
+            avg_length = max(total_length / ct_docs, 1e-9)
+
+            # Gather the live postings of the query terms, and their document frequencies in the namespace
+            postings = []
+            document_frequencies: Dict[str, int] = {}
+            for position, segment in enumerate(segments):
+                for term in query_terms:
+                    term_id = segment["term_to_id"].get(term)
+                    if term_id is None or not segment["ct_live"]:
+                        continue
+                    start, end = segment["term_offsets"][term_id], segment["term_offsets"][term_id + 1]
+                    docs = segment["posting_docs"][start:end]
+                    tfs = segment["posting_tfs"][start:end]
+                    if segment["ct_live"] < segment["count"]:
+                        live = segment["live"][docs]
+                        docs, tfs = docs[live], tfs[live]
+                    if len(docs):
+                        postings.append((position, term, docs, tfs.astype(np.float32)))
+                        document_frequencies[term] = document_frequencies.get(term, 0) + len(docs)
+            if not postings:
+                return []
+
+            # Score only the chunks found in the postings of the query terms, keeping the k best of each segment
+            candidates = []
+            for position, segment in enumerate(segments):
+                segment_postings = [posting for posting in postings if posting[0] == position]
+                if not segment_postings:
+                    continue
+                posting_docs, posting_scores = [], []
+                for _, term, docs, tfs in segment_postings:
+                    df = document_frequencies[term]
+                    idf = np.log(1 + (ct_docs - df + 0.5) / (df + 0.5))
+                    length_norm = self.k1 * (1 - self.b + self.b * segment["doc_lengths"][docs] / avg_length)
+                    posting_docs.append(docs)
+                    posting_scores.append(idf * tfs * (self.k1 + 1) / (tfs + length_norm))
+                rows, inverse = np.unique(np.concatenate(posting_docs), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(posting_scores))
+                top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k - 1)[:k]
+                candidates.extend((float(scores[i]), position, int(rows[i])) for i in top)
+            candidates = sorted(candidates, key=lambda candidate: -candidate[0])[:k]
+
+            records = {}
+            for position in {position for _, position, _ in candidates}:
+                rows = [row for _, candidate_position, row in candidates if candidate_position == position]
+                records.update(((position, row), record) for row, record in zip(rows, self._read_records(segments[position], rows)))
+            return [
+                (Document(id=records[position, row]["id"], page_content=records[position, row]["text"], metadata=records[position, row]["metadata"]), score)
+                for score, position, row in candidates
+            ]
+
+        return self._search(namespace, search_segments)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Fuses several rankings of documents with reciprocal rank fusion: a document scores
+    the sum of 1 / (rrf_k + rank) over the rankings it appears in.
+
+    Args:
+        result_lists (List[List[Document]]): The rankings, best first.
+        k (int): The number of documents to return.
+        rrf_k (int, optional): The rank offset damping the weight of the top ranks. Defaults to 60.
+
+    Returns:
+        List[Document]: The k best fused documents.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            # Chunks are identified by their id, or by their text when the store returns no id
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+
+def get_keyword_index() -> Optional[BM25Index]:
+    """
+    Returns the BM25 index of the application, or None if hybrid search is disabled.
+    The index is created once per process and shared.
+
+    Returns:
+        Optional[BM25Index]: The keyword index.
+    """
+    if not APP_CONFIG.hybrid_search:
+        return None
+    return ResourceRegistry.get_or_create(
+        ("keyword_index", APP_CONFIG.keyword_index_dir),
+        lambda: BM25Index(APP_CONFIG.keyword_index_dir, k1=APP_CONFIG.bm25_k1, b=APP_CONFIG.bm25_b)
+    )
@@ -1,12 +1,7 @@
-from langchain_pinecone import PineconeVectorStore
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from utils.custom_api import CustomAPIEmbeddings, CustomAPILlm
-from utils.load_app_config import LoadAppConfig
-from typing import List
-
-APP_CONFIG = LoadAppConfig()
+from utils.session_manager import SessionManager
+from utils.telemetry import StageTimer, log_event
+from typing import Iterator, List
+import gradio as gr
 
 class Chatbot:
     @staticmethod
@@ -25,61 +20,70 @@ class Chatbot:
         return chat_history
         
     @staticmethod    
-    def bot(user_prompt: str, chat_history: List, type_documents: str) -> tuple[str, str, List]:
+    def bot(user_prompt: str, chat_history: List, type_documents: str, request: gr.Request) -> Iterator[tuple[str, str, List]]:
         """
-        Handles the chatbot's response generation process.
+        Handles the chatbot's response generation process, streaming the answer as it is generated.
         
         Args:
             user_prompt (str): The input provided by the user.
             chat_history (List): The existing chat history.
-            type_documents (str): The namespace defining the type of documents to retrieve.
+            type_documents (str): The type of documents to retrieve, mapped to the session's namespace.
+            request (gr.Request): The Gradio request, identifying the user session.
         
-        Returns:
-            tuple: A string representation of retrieved documents, an empty string (placeholder), and updated chat history.
+        Yields:
+            tuple: A string representation of retrieved documents, an empty string (placeholder), and the chat history
+                with the partial answer generated so far.
         """
-        # Initialize vector store with embeddings
-        vector_store = PineconeVectorStore(
-            embedding=CustomAPIEmbeddings(api_url=APP_CONFIG.embed_api_url),
-            index_name=APP_CONFIG.index_name
-        )
-        
-        # Retrieve relevant documents based on user prompt
-        retriever = vector_store.as_retriever(search_kwargs={"k": APP_CONFIG.k, "namespace": type_documents})
-        retrieved_docs_str = ""
-        retrieved_docs = retriever.invoke(user_prompt)
-        for i, doc in enumerate(retrieved_docs):
-            retrieved_docs_str += f"# Retrieved document {i+1}: \n" + doc.page_content + "\n\n"
+        # Imported on first use, as LangChain is slow to import; the app warms it up in the background
+        from utils.rag_pipeline import RAGPipeline
 
-        # Create the system and human message prompt templates
-        system_message = SystemMessagePromptTemplate.from_template(
-            template=APP_CONFIG.system_prompt
-        )
-        human_message = HumanMessagePromptTemplate.from_template(
-            template="User prompt:\n{input}\n\nRetrieved documents:\n{context}"
-        )          
-        prompt_template = ChatPromptTemplate.from_messages([system_message, human_message])
-        
-        # Initialize LLM with API endpoint
-        llm = CustomAPILlm(api_url=APP_CONFIG.llm_api_url)
-        
-        # Create document chain for combining retrieved docs with the prompt
-        document_chain = create_stuff_documents_chain(
-            llm=llm,
-            prompt=prompt_template
-        )
-        
-        # Create retrieval chain for fetching relevant documents and processing response
-        rag_chain = create_retrieval_chain(
-            retriever=retriever,
-            combine_docs_chain=document_chain
-        )
-        
-        # Generate response from LLM
-        response = rag_chain.invoke({
-            "input": user_prompt,
-            "context": retrieved_docs_str
-        })
+        SessionManager.touch(request.session_hash)
+        namespace = SessionManager.namespace(type_documents, request.session_hash)
+        rag_pipeline = RAGPipeline.get_instance()
+        timer = StageTimer("rag_turn_seconds")
+        with timer.span("query_embedding"):
+            query_embedding = rag_pipeline.embed_query(user_prompt)
+
+        # Answer from the cache when the same or a near-duplicate question was already answered
+        with timer.span("answer_cache"):
+            cached_answer = rag_pipeline.lookup_answer(query_embedding, namespace=namespace)
+        if cached_answer is not None:
+            answer, retrieved_docs_str = cached_answer
+            chat_history.append({"role": "assistant", "content": answer})
+            timer.record("total", timer.elapsed())
+            log_event("chat_turn", session_id=request.session_hash, type_documents=type_documents, cached=True, stages=timer.stages)
+            yield retrieved_docs_str, "", chat_history
+            return
 
-        # Append chatbot's response to chat history
-        chat_history.append({"role": "assistant", "content": response["answer"]})
-        return retrieved_docs_str, "", chat_history
+        # Retrieve relevant documents once, re-rank them and pack them into the prompt-token budget;
+        # they feed both the LLM context and the references panel
+        with timer.span("vector_search"):
+            retrieved_docs = rag_pipeline.retrieve(user_prompt, query_embedding, namespace=namespace)
+        with timer.span("rerank"):
+            retrieved_docs = rag_pipeline.rerank(user_prompt, retrieved_docs)
+        with timer.span("prompt_build"):
+            retrieved_docs = rag_pipeline.build_context(user_prompt, retrieved_docs)
+        retrieved_docs_str = RAGPipeline.format_references(retrieved_docs)
+
+        # Append an empty chatbot message and fill it as the LLM streams its response
+        chat_history.append({"role": "assistant", "content": ""})
+        llm_metadata = {}
+        with timer.span("llm"):
+            for chunk in rag_pipeline.stream_answer(user_prompt, retrieved_docs, llm_metadata):
+                if chunk and "time_to_first_token" not in timer.stages:
+                    timer.record("time_to_first_token", timer.elapsed())
+                chat_history[-1]["content"] += chunk
+                yield retrieved_docs_str, "", chat_history
+
+        rag_pipeline.store_answer(query_embedding, namespace, chat_history[-1]["content"], retrieved_docs_str)
+        timer.record("total", timer.elapsed())
+        log_event(
+            "chat_turn",
+            session_id=request.session_hash,
+            type_documents=type_documents,
+            cached=False,
+            ct_context_docs=len(retrieved_docs),
+            stages=timer.stages,
+            **llm_metadata
+        )
+        yield retrieved_docs_str, "", chat_history
@@ -1,5 +1,7 @@
-from pinecone.grpc import PineconeGRPC as Pinecone
+from utils.ingestion_manifest import IngestionManifest
+from utils.session_manager import SessionManager, UPLOADED_DOCUMENTS
 from utils.load_app_config import LoadAppConfig
+import threading
 import shutil
 import os
 
@@ -10,26 +12,101 @@ class CleanChatbot:
     """
     A utility class for cleaning chatbot-related resources, such as
     uploaded documents and their associated vector database namespaces.
+    Uploads are cleaned per session, by a background sweeper, once the session has expired.
     """
-    
+
+    sweeper = None
+    sweeper_stop = threading.Event()
+
     @staticmethod
-    def remove_uploaded_documents_namespace() -> None:
-        """
-        Removes the namespace associated with uploaded documents from the Pinecone vector database.
-        This effectively deletes all stored embeddings related to uploaded documents.
-        """
-        pc = Pinecone()
-        index = pc.Index(APP_CONFIG.index_name)
-        stats = index.describe_index_stats()
-        
-        if "namespaces" in stats and "Uploaded document(s)" in stats["namespaces"]:
-            index.delete(delete_all=True, namespace="Uploaded document(s)")
-    
+    def remove_uploaded_documents_namespace(session_id: str) -> None:
+        """
+        Removes the namespace associated with a session's uploaded documents from the vector database.
+        This effectively deletes all stored embeddings related to the documents uploaded by the session.
+
+        Args:
+            session_id (str): The session id.
+        """
+        # Imported on first use, as the vector database and keyword index import LangChain, which is slow to import
+        from utils.vectordb_backend import get_vectordb_backend
+        from utils.bm25_index import get_keyword_index
+
+        namespace = SessionManager.namespace(UPLOADED_DOCUMENTS, session_id)
+        get_vectordb_backend().delete_namespace(namespace)
+        keyword_index = get_keyword_index()
+        if keyword_index is not None:
+            keyword_index.delete_namespace(namespace)
+        IngestionManifest.remove(APP_CONFIG.manifest_dir, namespace)
+
+    @staticmethod
+    def remove_uploaded_documents_directory(session_id: str) -> None:
+        """
+        Deletes the directory where a session's uploaded documents are stored.
+        This removes all files uploaded by the session from the local storage.
+
+        Args:
+            session_id (str): The session id.
+        """
+        session_dir = SessionManager.uploaded_documents_dir(session_id)
+        if os.path.exists(session_dir):
+            shutil.rmtree(session_dir)
+
     @staticmethod
-    def remove_uploaded_documents_directory() -> None:
+    def sweep_expired_sessions() -> None:
+        """
+        Removes the uploaded documents and namespaces of expired sessions, as well as upload
+        namespaces that no longer belong to any active session or upload directory. Sessions
+        whose uploads are still being ingested are skipped until their job finishes.
+        """
+        # Imported on first use, as the vector database and the ingestion import LangChain, which is slow to import
+        from utils.vectordb_backend import get_vectordb_backend
+        from utils.ingestion_jobs import IngestionJobManager
+
+        for session_id in SessionManager.expired_sessions():
+            if IngestionJobManager.has_unfinished_job(SessionManager.namespace(UPLOADED_DOCUMENTS, session_id)):
+                continue
+            CleanChatbot.remove_uploaded_documents_namespace(session_id)
+            CleanChatbot.remove_uploaded_documents_directory(session_id)
+            SessionManager.forget(session_id)
+            print(f"Removed the uploaded documents of the expired session '{session_id}'.")
+
+        for namespace in get_vectordb_backend().list_namespaces():
+            session_id = SessionManager.session_from_namespace(namespace)
+            if (session_id
+                    and not SessionManager.is_active(session_id)
+                    and not IngestionJobManager.has_unfinished_job(namespace)
+                    and not os.path.exists(SessionManager.uploaded_documents_dir(session_id))):
+                CleanChatbot.remove_uploaded_documents_namespace(session_id)
+                print(f"Removed the orphaned namespace '{namespace}'.")
+
+    @classmethod
+    def start_session_sweeper(cls) -> None:
+        """
+        Starts the background thread sweeping expired sessions every `sweep_interval_seconds`.
+        Calling it again while the sweeper runs has no effect.
+        """
+        if cls.sweeper is not None:
+            return
+
+        def sweep_forever() -> None:
+            while not cls.sweeper_stop.wait(APP_CONFIG.session_sweep_interval_seconds):
+                try:
+                    cls.sweep_expired_sessions()
+                except Exception as error:
+                    print(f"The session sweep failed: {error}")
+
+        cls.sweeper_stop.clear()
+        cls.sweeper = threading.Thread(target=sweep_forever, name="session-sweeper", daemon=True)
+        cls.sweeper.start()
+
+    @classmethod
+    def stop_session_sweeper(cls) -> None:
         """
-        Deletes the directory where uploaded documents are stored.
-        This removes all uploaded files from the local storage.
+        Stops the background sweeper, waiting for a running sweep to finish.
+        Calling it while no sweeper runs has no effect.
         """
-        if os.path.exists(APP_CONFIG.uploaded_documents_dir):
-            shutil.rmtree(APP_CONFIG.uploaded_documents_dir)
\ No newline at end of file
+        if cls.sweeper is None:
+            return
+        cls.sweeper_stop.set()
+        cls.sweeper.join()
+        cls.sweeper = None
@@ -0,0 +1,120 @@
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+from utils.utilities import count_tokens, get_gen_tokenizer, tokenize_text
+from typing import List, Set
+
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into the prompt up to a token budget, measured with the generation
+    model's tokenizer. Chunks are taken in rank order; text a chunk shares with an already packed
+    chunk (the splitter's overlap) is trimmed, and chunks that nearly duplicate a packed chunk are dropped.
+    """
+
+    def __init__(self,
+                 max_prompt_tokens: int,
+                 near_duplicate_threshold: float,
+                 document_separator: str = "\n\n",
+                 shingle_size: int = 5,
+                 min_overlap_chars: int = 32
+        ) -> None:
+        """
+        Initializes the ContextBuilder class.
+
+        Args:
+            max_prompt_tokens (int): Maximum number of tokens of the whole prompt, context included.
+            near_duplicate_threshold (float): Share of a chunk's word shingles found in a packed chunk
+                from which the chunk is dropped as a near-duplicate.
+            document_separator (str, optional): Separator between the documents of the context. Defaults to "\n\n".
+            shingle_size (int, optional): Number of words per shingle. Defaults to 5.
+            min_overlap_chars (int, optional): Minimum length of a shared prefix/suffix to be trimmed. Defaults to 32.
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.document_separator = document_separator
+        self.shingle_size = shingle_size
+        self.min_overlap_chars = min_overlap_chars
+
+    def __shingles(self, text: str) -> Set[tuple]:
+        """
+        Returns the set of lowercased word n-grams of a text (its words for very short texts).
+        """
+        words = text.lower().split()
+        if len(words) < self.shingle_size:
+            return {(word,) for word in words}
+        return {tuple(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def __overlap_length(self, previous: str, text: str) -> int:
+        """
+        Returns the length of the longest suffix of `previous` that is also a prefix of `text`,
+        or 0 if it is shorter than `min_overlap_chars`.
+        """
+        if len(text) < self.min_overlap_chars:
+            return 0
+        probe = text[:self.min_overlap_chars]
+        start = previous.find(probe, max(0, len(previous) - len(text)))
+        while start != -1:
+            if text.startswith(previous[start:]):
+                return len(previous) - start
+            start = previous.find(probe, start + 1)
+        return 0
+
+    def __trim_overlaps(self, text: str, packed_texts: List[str]) -> str:
+        """
+        Removes from a chunk the text it shares with the end or the start of packed chunks.
+        """
+        for packed_text in packed_texts:
+            text = text[self.__overlap_length(packed_text, text):]
+            ct_suffix = self.__overlap_length(text, packed_text)
+            if ct_suffix:
+                text = text[:len(text) - ct_suffix]
+        return text.strip()
+
+    def __is_near_duplicate(self, shingles: Set[tuple], packed_shingles: List[Set[tuple]]) -> bool:
+        """
+        Whether most of a chunk's shingles already appear in one of the packed chunks.
+        """
+        for other in packed_shingles:
+            ct_smallest = min(len(shingles), len(other))
+            if ct_smallest and len(shingles & other) / ct_smallest >= self.near_duplicate_threshold:
+                return True
+        return False
+
+    def build(self, prompt_messages: List[BaseMessage], retrieved_docs: List[Document]) -> List[Document]:
+        """
+        Selects the retrieved documents that fit in the prompt-token budget.
+
+        Args:
+            prompt_messages (List[BaseMessage]): The prompt messages rendered with an empty context.
+            retrieved_docs (List[Document]): The retrieved documents, most relevant first.
+
+        Returns:
+            List[Document]: The documents to use as context, trimmed of overlapping text.
+        """
+        budget = self.max_prompt_tokens - count_tokens(prompt_messages)
+        ct_separator_tokens = len(tokenize_text(self.document_separator))
+        packed_docs: List[Document] = []
+        packed_shingles: List[Set[tuple]] = []
+        first_candidate = None
+
+        for doc in retrieved_docs:
+            text = self.__trim_overlaps(doc.page_content, [packed_doc.page_content for packed_doc in packed_docs])
+            if not text:
+                continue
+            shingles = self.__shingles(text)
+            if self.__is_near_duplicate(shingles, packed_shingles):
+                continue
+            candidate = Document(page_content=text, metadata=dict(doc.metadata))
+            first_candidate = first_candidate or candidate
+            ct_tokens = len(tokenize_text(text)) + (ct_separator_tokens if packed_docs else 0)
+            if ct_tokens <= budget:
+                packed_docs.append(candidate)
+                packed_shingles.append(shingles)
+                budget -= ct_tokens
+
+        # Rather than answering without context, truncate the best document to the budget
+        if not packed_docs and first_candidate is not None and budget > 0:
+            token_ids = list(tokenize_text(first_candidate.page_content)[:budget])
+            first_candidate.page_content = get_gen_tokenizer().decode(token_ids)
+            packed_docs.append(first_candidate)
+        return packed_docs
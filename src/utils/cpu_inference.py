@@ -0,0 +1,122 @@
+from torch import nn
+from typing import Callable, Optional
+import torch
+import os
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+def configure_torch_threads(intra_op_threads: int, inter_op_threads: int) -> None:
+    """
+    Sets the number of threads torch uses inside an operator (intra-op) and across independent
+    operators (inter-op). Must be called before the first model runs; 0 keeps the torch default.
+
+    Args:
+        intra_op_threads (int): Number of intra-op threads, 0 for the default.
+        inter_op_threads (int): Number of inter-op threads, 0 for the default.
+    """
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # Torch refuses once inter-op parallel work has started
+            print(f"Could not set {inter_op_threads} inter-op threads, keeping {torch.get_num_interop_threads()}.")
+
+def is_bf16_supported() -> bool:
+    """
+    Whether the CPU runs bfloat16 kernels natively (AVX512-BF16 / AMX on x86, BF16 on ARM).
+
+    Returns:
+        bool: True if bf16 is supported.
+    """
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def optimize_model(model: nn.Module, precision: str, compile_model: bool) -> nn.Module:
+    """
+    Applies a CPU inference mode to a model.
+
+    Args:
+        model (nn.Module): The model, in fp32 and in eval mode.
+        precision (str): "fp32", "bf16" (falls back to fp32 when the CPU lacks bf16 support),
+            or "int8" (dynamic int8 quantization of the linear layers).
+        compile_model (bool): Whether to compile the forward pass with torch.compile.
+
+    Returns:
+        nn.Module: The optimized model.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}.")
+
+    if precision == "bf16":
+        if is_bf16_supported():
+            model = model.to(torch.bfloat16)
+        else:
+            print("bf16 is not supported by this CPU, keeping fp32.")
+    elif precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    if compile_model:
+        # Compile the forward pass only, so attributes such as `config` or `generate` stay available
+        model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+def snapshot_path(snapshot_dir: str, model_id: str, precision: str) -> Optional[str]:
+    """
+    Returns the path of the snapshot of a model in an inference mode. Snapshots are pickled
+    modules, so their name includes the torch and transformers versions they were saved with.
+
+    Args:
+        snapshot_dir (str): Directory of the snapshots, empty to disable them.
+        model_id (str): HuggingFace id of the model.
+        precision (str): The precision of the model.
+
+    Returns:
+        Optional[str]: The path of the snapshot, None when snapshots are disabled.
+    """
+    if not snapshot_dir:
+        return None
+    import transformers
+
+    name = f"{model_id.replace('/', '--')}-{precision}-torch{torch.__version__}-transformers{transformers.__version__}.pt"
+    return os.path.join(snapshot_dir, name)
+
+def load_optimized_model(load_model: Callable[[], nn.Module],
+                         precision: str,
+                         compile_model: bool,
+                         snapshot: Optional[str] = None
+    ) -> nn.Module:
+    """
+    Loads a model in a CPU inference mode. With a snapshot path, the first load saves the model
+    after the precision conversion or quantization, and later loads memory-map the snapshot
+    instead: they skip the conversion, and replicas on one machine share its pages read-only.
+    The snapshot is a pickled module, and unpickling it can run arbitrary code: it must only be
+    read from a directory that untrusted users cannot write to.
+
+    Args:
+        load_model (Callable[[], nn.Module]): Loads the model, in fp32 and in eval mode.
+        precision (str): The precision, see `optimize_model`.
+        compile_model (bool): Whether to compile the forward pass; compilation is not saved.
+        snapshot (Optional[str], optional): Path of the snapshot, see `snapshot_path`. Defaults to None.
+
+    Returns:
+        nn.Module: The optimized model.
+    """
+    if snapshot and os.path.exists(snapshot):
+        # A whole module, not a state dict, is saved so that loading skips the quantization;
+        # this needs the full unpickler, hence a trusted snapshot directory
+        model = torch.load(snapshot, mmap=True, weights_only=False)
+    else:
+        model = optimize_model(load_model(), precision, compile_model=False)
+        if snapshot:
+            os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+            # Write then rename, so that a replica never maps a partial snapshot
+            temporary_path = f"{snapshot}.{os.getpid()}.tmp"
+            torch.save(model, temporary_path)
+            os.replace(temporary_path, snapshot)
+    # "fp32" keeps the precision of the loaded model and only compiles it
+    return optimize_model(model, "fp32", compile_model) if compile_model else model
+
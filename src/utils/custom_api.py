@@ -1,12 +1,13 @@
 from langchain_core.embeddings.embeddings import Embeddings
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.outputs import ChatGeneration, ChatResult
-from langchain_core.messages import BaseMessage, AIMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.messages import BaseMessage, AIMessage, AIMessageChunk
 from pydantic import Field
-from utils.utilities import convert_messages_to_dict, count_tokens
+from utils.utilities import convert_messages_to_dict, count_tokens, count_text_tokens
+from utils.endpoint_pool import get_endpoint_pool
 from utils.load_app_config import LoadAppConfig
-import requests
-from typing import Any, List, Optional
+from typing import Any, Iterator, List, Optional, Union
+import time
 import json
 
 
@@ -16,14 +17,18 @@ class CustomAPIEmbeddings(Embeddings):
     """
     A custom embedding model that interacts with an external API to generate embeddings.
     """
-    def __init__(self, api_url: str) -> None:
+    def __init__(self, api_url: Union[str, List[str]], batch_size: int = APP_CONFIG.embed_api_batch_size) -> None:
         """
         Initializes the CustomAPIEmbeddings class.
 
         Args:
-            api_url (str): The URL of the embedding API.
+            api_url (Union[str, List[str]]): The URL of the embedding API, or one URL per replica.
+            batch_size (int, optional): Maximum number of texts sent per API request.
+                Defaults to the configured `embed_api_batch_size`.
         """
         self.api_url = api_url
+        self.batch_size = batch_size
+        self.pool = get_endpoint_pool(api_url)
     
     def embed_query(self, text: str) -> List[float]:
         """
@@ -36,12 +41,12 @@ class CustomAPIEmbeddings(Embeddings):
             List[float]: The embedding vector.
         """
         data = {"text": text}
-        response = requests.post(self.api_url, json=data)
-        return response.json()["embedding"]
+        with self.pool.post(json=data) as response:
+            return response.json()["embedding"]
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """
-        Generates embeddings for multiple documents.
+        Generates embeddings for multiple documents, sending them to the API in batches.
 
         Args:
             texts (List[str]): A list of texts to be embedded.
@@ -49,15 +54,52 @@ class CustomAPIEmbeddings(Embeddings):
         Returns:
             List[List[float]]: A list of embedding vectors.
         """
-        embeddings = [self.embed_query(text) for text in texts]
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            data = {"texts": texts[start:start + self.batch_size]}
+            with self.pool.post(json=data) as response:
+                embeddings.extend(response.json()["embeddings"])
         return embeddings
     
 
+class CustomAPIReranker:
+    """
+    A client of the cross-encoder re-ranking API of the model server.
+    """
+    def __init__(self, api_url: Union[str, List[str]]) -> None:
+        """
+        Initializes the CustomAPIReranker class.
+
+        Args:
+            api_url (Union[str, List[str]]): The URL of the re-ranking API, or one URL per replica.
+        """
+        self.api_url = api_url
+        self.pool = get_endpoint_pool(api_url)
+
+    def score(self, query: str, texts: List[str], timeout: Optional[float] = None) -> List[float]:
+        """
+        Scores the relevance of passages to a query, all in one request. The request is not
+        retried on another replica, as it must fit in the timeout.
+
+        Args:
+            query (str): The query.
+            texts (List[str]): The passages.
+            timeout (Optional[float], optional): Connect and read timeout in seconds. Defaults to None.
+
+        Returns:
+            List[float]: One relevance score per passage, higher is more relevant.
+        """
+        data = {"query": query, "texts": texts}
+        with self.pool.post(json=data, timeout=timeout, max_retries=0) as response:
+            return response.json()["scores"]
+
+
 class CustomAPILlm(BaseChatModel):
     """
     A custom language model that interacts with an external API for generating chat responses.
     """
-    api_url: str = Field(..., description="API URL for the LLM")
+    api_url: Union[str, List[str]] = Field(..., description="API URL for the LLM, or one URL per replica")
+    stream_api_url: Optional[Union[str, List[str]]] = Field(None, description="API URL for the streaming LLM endpoint, or one URL per replica")
 
     def _generate(
         self,
@@ -81,19 +123,22 @@ class CustomAPILlm(BaseChatModel):
         formatted_messages = convert_messages_to_dict(messages)
         data = {"messages": formatted_messages}
             
-        # Send request to API
-        response = requests.post(url=self.api_url, json=data)
-        response_text = response.json()["response"]
+        # Send request to the least loaded replica of the API
+        start = time.perf_counter()
+        with get_endpoint_pool(self.api_url).post(json=data) as response:
+            response_json = response.json()
+        response_text = response_json["response"]
+        http_round_trip_seconds = time.perf_counter() - start
 
-        # Calculate token usage
+        # Calculate token usage with the generation model's tokenizer
         ct_input_tokens = count_tokens(messages)
-        ct_output_tokens = len(response_text)
+        ct_output_tokens = count_text_tokens(response_text)
 
-        # Create AIMessage object with metadata
+        # Create AIMessage object with the measured timings and the server generation metrics
         message = AIMessage(
             content=response_text,
             additional_kwargs={},
-            response_metadata={"time_in_seconds": 3},
+            response_metadata=self.__response_metadata(http_round_trip_seconds, None, response_json.get("metrics")),
             usage_metadata={
                 "input_tokens": ct_input_tokens,
                 "output_tokens": ct_output_tokens,
@@ -104,6 +149,98 @@ class CustomAPILlm(BaseChatModel):
         generation = ChatGeneration(message=message)
         return ChatResult(generations=[generation])
     
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """
+        Streams a chat completion from the external streaming API, token by token.
+
+        Falls back to a single chunk holding the full answer when no streaming URL is configured.
+
+        Args:
+            messages (List[BaseMessage]): A list of messages in the conversation.
+            stop (Optional[List[str]], optional): List of stop words. Defaults to None.
+            run_manager (Optional[Any], optional): Internal runtime manager. Defaults to None.
+
+        Yields:
+            ChatGenerationChunk: The next piece of the generated chat response.
+        """
+        if self.stream_api_url is None:
+            result = self._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            message = result.generations[0].message
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=message.content,
+                response_metadata=message.response_metadata,
+                usage_metadata=message.usage_metadata
+            ))
+            return
+
+        # Convert messages to API-compatible format
+        formatted_messages = convert_messages_to_dict(messages)
+        data = {"messages": formatted_messages}
+
+        # Read the server-sent events as they arrive
+        response_text = ""
+        server_metrics = None
+        time_to_first_token_seconds = None
+        start = time.perf_counter()
+        with get_endpoint_pool(self.stream_api_url).post(json=data, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                payload = line[len("data: "):]
+                if payload == "[DONE]":
+                    break
+                event = json.loads(payload)
+                if "metrics" in event:
+                    server_metrics = event["metrics"]
+                    continue
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                token = event["token"]
+                if time_to_first_token_seconds is None:
+                    time_to_first_token_seconds = time.perf_counter() - start
+                response_text += token
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+
+        http_round_trip_seconds = time.perf_counter() - start
+
+        # Report the timings and token usage of the whole answer in a last, empty chunk
+        ct_input_tokens = count_tokens(messages)
+        ct_output_tokens = count_text_tokens(response_text)
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            response_metadata=self.__response_metadata(http_round_trip_seconds, time_to_first_token_seconds, server_metrics),
+            usage_metadata={
+                "input_tokens": ct_input_tokens,
+                "output_tokens": ct_output_tokens,
+                "total_tokens": ct_input_tokens + ct_output_tokens,
+            }
+        ))
+
+    @staticmethod
+    def __response_metadata(http_round_trip_seconds: float,
+                            time_to_first_token_seconds: Optional[float],
+                            server_metrics: Optional[dict]
+        ) -> dict:
+        """
+        Builds the response metadata of a generation: the timings measured by the client and
+        the queue wait, prefill, decode and throughput reported by the model server.
+        """
+        metadata = {"model_name": APP_CONFIG.gen_model_id, "http_round_trip_seconds": round(http_round_trip_seconds, 6)}
+        if time_to_first_token_seconds is not None:
+            metadata["time_to_first_token_seconds"] = round(time_to_first_token_seconds, 6)
+        if server_metrics:
+            metadata["server"] = server_metrics
+        return metadata
+
     @property
     def _llm_type(self) -> str:
         """
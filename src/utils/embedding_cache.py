@@ -0,0 +1,255 @@
+from langchain_core.embeddings.embeddings import Embeddings
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+import unicodedata
+import threading
+import hashlib
+import sqlite3
+import time
+import os
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+class EmbeddingCache:
+    """
+    A two-tier embedding cache keyed by (model id, normalized text hash): an in-memory LRU tier
+    in front of a persistent SQLite tier. Both tiers have a maximum number of entries and evict
+    the least recently used ones.
+    """
+
+    def __init__(self, model_id: str, cache_dir: str, memory_max_entries: int, disk_max_entries: int) -> None:
+        """
+        Initializes the EmbeddingCache class.
+
+        Args:
+            model_id (str): Identifier of the embedding model, part of every cache key.
+            cache_dir (str): Directory of the SQLite cache file.
+            memory_max_entries (int): Maximum number of embeddings kept in memory.
+            disk_max_entries (int): Maximum number of embeddings kept on disk.
+        """
+        self.model_id = model_id
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self.memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.ct_inserts_since_eviction = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(cache_dir, "embeddings.sqlite"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self.connection.commit()
+
+    def key(self, text: str) -> str:
+        """
+        Computes the cache key of a text: whitespace and unicode normalization, then SHA-256.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            str: The cache key.
+        """
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{self.model_id}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Looks up the embeddings of several texts.
+
+        Args:
+            texts (List[str]): The texts.
+
+        Returns:
+            List[Optional[List[float]]]: The cached embedding of each text, or None on a miss.
+        """
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        with self.lock:
+            disk_keys = []
+            for i, key in enumerate(keys):
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    results[i] = self.memory[key]
+                    self.stats["memory_hits"] += 1
+                else:
+                    disk_keys.append(key)
+
+            disk_vectors: Dict[str, List[float]] = {}
+            unique_disk_keys = list(dict.fromkeys(disk_keys))
+            for start in range(0, len(unique_disk_keys), 500):
+                chunk = unique_disk_keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, vector in rows:
+                    disk_vectors[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+            if disk_vectors:
+                now = time.time()
+                self.connection.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in disk_vectors]
+                )
+                self.connection.commit()
+
+            for i, key in enumerate(keys):
+                if results[i] is not None:
+                    continue
+                if key in disk_vectors:
+                    results[i] = disk_vectors[key]
+                    self.__put_memory(key, disk_vectors[key])
+                    self.stats["disk_hits"] += 1
+                else:
+                    self.stats["misses"] += 1
+        return results
+
+    def put_many(self, texts: List[str], embeddings: List[List[float]]) -> None:
+        """
+        Stores the embeddings of several texts in both tiers.
+
+        Args:
+            texts (List[str]): The texts.
+            embeddings (List[List[float]]): The embedding of each text.
+        """
+        now = time.time()
+        rows = []
+        with self.lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                self.__put_memory(key, embedding)
+                rows.append((key, np.asarray(embedding, dtype=np.float32).tobytes(), now))
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self.ct_inserts_since_eviction += len(rows)
+            if self.ct_inserts_since_eviction >= 1000:
+                self.__evict_disk()
+            self.connection.commit()
+
+    def __put_memory(self, key: str, embedding: List[float]) -> None:
+        """
+        Inserts an embedding in the memory tier, evicting the least recently used one if full.
+        """
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_max_entries:
+            self.memory.popitem(last=False)
+
+    def __evict_disk(self) -> None:
+        """
+        Deletes the least recently used embeddings from the disk tier beyond its maximum size.
+        """
+        self.ct_inserts_since_eviction = 0
+        ct_entries = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if ct_entries > self.disk_max_entries:
+            self.connection.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (ct_entries - self.disk_max_entries,)
+            )
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters of the cache.
+
+        Returns:
+            Dict[str, int]: The memory hits, disk hits and misses.
+        """
+        with self.lock:
+            return dict(self.stats)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    An embedding model wrapper that serves repeated texts from an EmbeddingCache and only
+    embeds the texts it has never seen.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache) -> None:
+        """
+        Initializes the CachedEmbeddings class.
+
+        Args:
+            embeddings (Embeddings): The wrapped embedding model.
+            cache (EmbeddingCache): The cache.
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates embeddings for multiple documents, embedding only the cache misses.
+
+        Args:
+            texts (List[str]): A list of texts to be embedded.
+
+        Returns:
+            List[List[float]]: A list of embedding vectors.
+        """
+        embeddings = self.cache.get_many(texts)
+        missing_texts = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing_texts:
+            missing_embeddings = self.embeddings.embed_documents(missing_texts)
+            self.cache.put_many(missing_texts, missing_embeddings)
+            computed = dict(zip(missing_texts, missing_embeddings))
+            embeddings = [embedding if embedding is not None else computed[text] for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Generates an embedding for a single query text, unless it is cached.
+
+        Args:
+            text (str): The input text to be embedded.
+
+        Returns:
+            List[float]: The embedding vector.
+        """
+        embedding = self.cache.get_many([text])[0]
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.cache.put_many([text], [embedding])
+        return embedding
+
+
+def embedding_space_id() -> str:
+    """
+    Identifies the configured embedding space: the model, the precision it runs in (bf16 and int8
+    produce slightly different vectors than fp32) and the pooling and normalization applied to it.
+    The model server and the ingestion produce the same vectors, so they share it.
+
+    Returns:
+        str: The embedding space id.
+    """
+    normalization = "normalized" if APP_CONFIG.embed_normalize else "raw"
+    return f"{APP_CONFIG.embed_model_id}:{APP_CONFIG.embed_precision}:{APP_CONFIG.embed_pooling}:{normalization}"
+
+def with_embedding_cache(embeddings: Embeddings, model_id: Optional[str] = None) -> Embeddings:
+    """
+    Wraps an embedding model with the process-wide cache of its model id, if the cache is enabled.
+
+    Args:
+        embeddings (Embeddings): The embedding model.
+        model_id (Optional[str], optional): Identifier of the embeddings produced by the model, used in
+            the cache keys. Defaults to the configured embedding space.
+
+    Returns:
+        Embeddings: The cached embedding model, or the model itself when caching is disabled.
+    """
+    model_id = model_id or embedding_space_id()
+    if not APP_CONFIG.embed_cache_enabled:
+        return embeddings
+    cache = ResourceRegistry.get_or_create(
+        ("embedding_cache", model_id),
+        lambda: EmbeddingCache(
+            model_id,
+            APP_CONFIG.embed_cache_dir,
+            APP_CONFIG.embed_cache_memory_max_entries,
+            APP_CONFIG.embed_cache_disk_max_entries
+        )
+    )
+    return CachedEmbeddings(embeddings, cache)
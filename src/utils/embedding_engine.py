@@ -0,0 +1,162 @@
+from langchain_core.embeddings.embeddings import Embeddings
+from transformers import AutoModel, AutoTokenizer
+from utils.cpu_inference import load_optimized_model, snapshot_path
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from typing import List
+import torch
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+POOLINGS = ("cls", "mean")
+
+class EmbeddingEngine:
+    """
+    Computes sentence embeddings with a HuggingFace encoder. The same engine backs the `/embed`
+    route and the ingestion, so query and document vectors always live in the same space.
+    """
+
+    def __init__(self,
+                 model_id: str,
+                 batch_size: int,
+                 pooling: str = "cls",
+                 normalize: bool = True,
+                 precision: str = "fp32",
+                 compile_model: bool = False,
+                 snapshot_dir: str = ""
+        ) -> None:
+        """
+        Initializes the EmbeddingEngine class and loads the model.
+
+        Args:
+            model_id (str): HuggingFace id of the encoder.
+            batch_size (int): Maximum number of texts per forward pass.
+            pooling (str, optional): "cls" (first token, recommended for BGE models) or "mean"
+                (mean of the non-padding tokens). Defaults to "cls".
+            normalize (bool, optional): Whether to L2-normalize the embeddings. Defaults to True.
+            precision (str, optional): CPU inference precision, see `optimize_model`. Defaults to "fp32".
+            compile_model (bool, optional): Whether to compile the model. Defaults to False.
+            snapshot_dir (str, optional): Directory of the model snapshots, see `load_optimized_model`.
+                Defaults to "" (no snapshots).
+        """
+        if pooling not in POOLINGS:
+            raise ValueError(f"Unknown pooling '{pooling}', expected one of {POOLINGS}.")
+        self.model_id = model_id
+        self.batch_size = batch_size
+        self.pooling = pooling
+        self.normalize = normalize
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = load_optimized_model(
+            lambda: AutoModel.from_pretrained(model_id).eval(),
+            precision,
+            compile_model,
+            snapshot_path(snapshot_dir, model_id, precision)
+        )
+
+    @property
+    def dimension(self) -> int:
+        """
+        The dimension of the embeddings, as the vector index must be created with.
+        """
+        return self.model.config.hidden_size
+
+    def pool(self, last_hidden_state: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """
+        Pools the token states of a padded batch into one vector per text, ignoring padding.
+
+        Args:
+            last_hidden_state (torch.Tensor): The (batch, tokens, hidden) token states.
+            attention_mask (torch.Tensor): The (batch, tokens) mask of the real tokens.
+
+        Returns:
+            torch.Tensor: The (batch, hidden) embeddings.
+        """
+        if self.pooling == "cls":
+            embeddings = last_hidden_state[:, 0]
+        else:
+            mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+            embeddings = (last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        if self.normalize:
+            embeddings = torch.nn.functional.normalize(embeddings.float(), p=2, dim=-1)
+        return embeddings.float()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Computes the embeddings of a list of texts in micro-batches.
+
+        Texts are sorted by token length before batching so that each micro-batch
+        is padded only to the length of its longest member, then the embeddings are
+        returned in the original input order.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding vector per input text.
+        """
+        if not texts:
+            return []
+        encodings = self.tokenizer(texts, truncation=True)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]), reverse=True)
+        embeddings = [None] * len(texts)
+
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            batch = self.tokenizer.pad(
+                [{key: encodings[key][i] for key in encodings.keys()} for i in batch_ids],
+                return_tensors="pt"
+            )
+            with torch.no_grad():
+                outputs = self.model(**batch)
+                batch_embeddings = self.pool(outputs.last_hidden_state, batch["attention_mask"]).cpu().numpy()
+
+            for i, embedding in zip(batch_ids, batch_embeddings):
+                embeddings[i] = embedding.tolist()
+        return embeddings
+
+
+class EngineEmbeddings(Embeddings):
+    """
+    A LangChain embeddings adapter running an EmbeddingEngine in the current process.
+    """
+
+    def __init__(self, engine: EmbeddingEngine) -> None:
+        """
+        Initializes the EngineEmbeddings class.
+
+        Args:
+            engine (EmbeddingEngine): The embedding engine.
+        """
+        self.engine = engine
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.engine.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.engine.embed([text])[0]
+
+
+def get_embedding_engine(model_id: str) -> EmbeddingEngine:
+    """
+    Returns the process-wide embedding engine of a model, loading it with the configured
+    batch size, pooling and inference mode on first use.
+
+    Args:
+        model_id (str): HuggingFace id of the encoder.
+
+    Returns:
+        EmbeddingEngine: The embedding engine.
+    """
+    return ResourceRegistry.get_or_create(
+        ("embedding_engine", model_id),
+        lambda: EmbeddingEngine(
+            model_id,
+            batch_size=APP_CONFIG.embed_batch_size,
+            pooling=APP_CONFIG.embed_pooling,
+            normalize=APP_CONFIG.embed_normalize,
+            precision=APP_CONFIG.embed_precision,
+            compile_model=APP_CONFIG.embed_compile,
+            snapshot_dir=APP_CONFIG.model_snapshot_dir
+        )
+    )
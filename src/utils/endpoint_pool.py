@@ -0,0 +1,215 @@
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from typing import Iterator, List, Optional, Union
+import threading
+import requests
+import time
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+# Statuses after which a request is retried on another replica
+RETRY_STATUSES = (429, 502, 503, 504)
+# Status of a replica that is up but has too many pending requests
+BUSY_STATUS = 429
+
+
+class Endpoint:
+    """
+    One replica of a model server route, with its number of outstanding requests and health.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        parts = urlsplit(url)
+        self.ready_url = f"{parts.scheme}://{parts.netloc}/ready"
+        self.outstanding = 0
+        self.down_until = 0.0
+
+
+class EndpointPool:
+    """
+    Routes the requests of a model server route across its replicas. Each request goes to the
+    healthy replica with the fewest outstanding requests; a replica that cannot be reached or
+    answers 502/503/504 is set aside for a cooldown, and the request is retried on another one.
+    A replica rejecting a request with 429 is set aside for the time its Retry-After header asks
+    for (or an exponential back-off without the header); once every replica has been tried, the
+    retry waits for that time instead of hitting a busy replica again right away. With several
+    replicas, a background thread checks their `/ready` route and sets aside the ones that are
+    down or still loading their models.
+    """
+
+    def __init__(self,
+                 urls: Union[str, List[str]],
+                 max_retries: int,
+                 failure_cooldown_seconds: float,
+                 health_check_interval_seconds: float,
+                 busy_backoff_seconds: float
+        ) -> None:
+        """
+        Initializes the EndpointPool class.
+
+        Args:
+            urls (Union[str, List[str]]): The URL of the route on each replica.
+            max_retries (int): Number of other replicas tried after a failed request.
+            failure_cooldown_seconds (float): Time a failed replica is set aside.
+            health_check_interval_seconds (float): Time between health checks, 0 to disable them.
+            busy_backoff_seconds (float): First back-off after a 429 without a Retry-After header,
+                doubled at each further 429 of the request.
+        """
+        self.endpoints = [Endpoint(url) for url in ([urls] if isinstance(urls, str) else urls)]
+        if not self.endpoints:
+            raise ValueError("An endpoint pool needs at least one URL.")
+        self.max_retries = max_retries
+        self.failure_cooldown_seconds = failure_cooldown_seconds
+        self.health_check_interval_seconds = health_check_interval_seconds
+        self.busy_backoff_seconds = busy_backoff_seconds
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.next_index = 0
+        if len(self.endpoints) > 1 and health_check_interval_seconds > 0:
+            threading.Thread(target=self.__check_health, name="endpoint-health", daemon=True).start()
+
+    def __acquire(self, excluded: List[Endpoint]) -> Endpoint:
+        """
+        Picks the healthy replica with the fewest outstanding requests, rotating between ties.
+        When every replica is set aside, the one set aside the earliest is tried.
+        """
+        with self.lock:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in excluded] or self.endpoints
+            healthy = [endpoint for endpoint in candidates if endpoint.down_until <= now]
+            if healthy:
+                offset = self.next_index
+                self.next_index += 1
+                endpoint = min(
+                    healthy,
+                    key=lambda endpoint: (endpoint.outstanding, (self.endpoints.index(endpoint) - offset) % len(self.endpoints))
+                )
+            else:
+                endpoint = min(candidates, key=lambda endpoint: endpoint.down_until)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def __release(self, endpoint: Endpoint) -> None:
+        with self.lock:
+            endpoint.outstanding -= 1
+
+    def __set_aside(self, endpoint: Endpoint, seconds: Optional[float] = None) -> None:
+        with self.lock:
+            endpoint.down_until = time.monotonic() + (self.failure_cooldown_seconds if seconds is None else seconds)
+
+    def __busy_backoff(self, response: requests.Response, ct_busy: int) -> float:
+        """
+        Returns the time to wait before sending a request again to a replica that rejected it with
+        429: its Retry-After header, in seconds or as an HTTP date, or else an exponential back-off.
+        """
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return self.busy_backoff_seconds * 2 ** (ct_busy - 1)
+
+    def __check_health(self) -> None:
+        """
+        Periodically checks the `/ready` route of every replica.
+        """
+        while True:
+            time.sleep(self.health_check_interval_seconds)
+            for endpoint in self.endpoints:
+                try:
+                    healthy = requests.get(endpoint.ready_url, timeout=self.health_check_interval_seconds).ok
+                except requests.RequestException:
+                    healthy = False
+                with self.lock:
+                    if healthy:
+                        endpoint.down_until = 0.0
+                    else:
+                        endpoint.down_until = max(endpoint.down_until, time.monotonic() + self.failure_cooldown_seconds)
+
+    @contextmanager
+    def post(self,
+             json: dict,
+             timeout: Optional[float] = None,
+             stream: bool = False,
+             max_retries: Optional[int] = None
+        ) -> Iterator[requests.Response]:
+        """
+        Posts a request to the least loaded replica, retrying on another one when it cannot be
+        reached or is overloaded. The replica counts the request as outstanding until the block
+        exits, so streamed responses must be read inside it.
+
+        Args:
+            json (dict): The JSON body.
+            timeout (Optional[float], optional): Connect and read timeout in seconds. Defaults to None.
+            stream (bool, optional): Whether to stream the response. Defaults to False.
+            max_retries (Optional[int], optional): Overrides the number of retries, e.g. 0 for
+                requests bound by a latency budget. Defaults to None.
+
+        Yields:
+            requests.Response: The successful response.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        tried: List[Endpoint] = []
+        ct_busy = 0
+        while True:
+            endpoint = self.__acquire(tried)
+            tried.append(endpoint)
+            try:
+                try:
+                    response = self.session.post(endpoint.url, json=json, timeout=timeout, stream=stream)
+                except (requests.ConnectionError, requests.Timeout):
+                    self.__set_aside(endpoint)
+                    if len(tried) > max_retries:
+                        raise
+                    continue
+                if response.status_code in RETRY_STATUSES and len(tried) <= max_retries:
+                    response.close()
+                    if response.status_code != BUSY_STATUS:
+                        self.__set_aside(endpoint)
+                        continue
+                    ct_busy += 1
+                    backoff = self.__busy_backoff(response, ct_busy)
+                    self.__set_aside(endpoint, backoff)
+                    # Another replica is tried right away; once all of them were, the retry waits
+                    if len(set(tried)) >= len(self.endpoints):
+                        time.sleep(backoff)
+                    continue
+                response.raise_for_status()
+                with response:
+                    yield response
+                return
+            finally:
+                self.__release(endpoint)
+
+
+def get_endpoint_pool(urls: Union[str, List[str]]) -> EndpointPool:
+    """
+    Returns the endpoint pool of a route, shared by every client of the process so that the
+    outstanding requests of all of them are counted together.
+
+    Args:
+        urls (Union[str, List[str]]): The URL of the route on each replica.
+
+    Returns:
+        EndpointPool: The endpoint pool.
+    """
+    key = tuple([urls] if isinstance(urls, str) else urls)
+    return ResourceRegistry.get_or_create(
+        ("endpoint_pool", key),
+        lambda: EndpointPool(
+            list(key),
+            APP_CONFIG.client_max_retries,
+            APP_CONFIG.client_failure_cooldown_seconds,
+            APP_CONFIG.client_health_check_interval_seconds,
+            APP_CONFIG.client_busy_backoff_seconds
+        )
+    )
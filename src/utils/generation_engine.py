@@ -0,0 +1,306 @@
+from transformers import DynamicCache, PreTrainedModel, PreTrainedTokenizerBase, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+from typing import Any, List, Optional, Tuple
+import threading
+import torch
+import copy
+import time
+
+
+class TimingStreamer(BaseStreamer):
+    """
+    A streamer timing the prefill and decode phases of a generation, forwarding the tokens
+    to an optional inner streamer. `generate` first puts the prompt, then the generated tokens,
+    so the second call marks the end of the prefill.
+    """
+
+    def __init__(self, inner: Optional[BaseStreamer] = None) -> None:
+        self.inner = inner
+        self.start = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.ct_puts = 0
+
+    def put(self, value: torch.Tensor) -> None:
+        self.ct_puts += 1
+        if self.ct_puts == 2:
+            self.first_token_time = time.perf_counter()
+        if self.inner is not None:
+            self.inner.put(value)
+
+    def end(self) -> None:
+        # Called by `generate` on success and again on failure, so that the inner streamer always ends once
+        if self.end_time is not None:
+            return
+        self.end_time = time.perf_counter()
+        if self.inner is not None:
+            self.inner.end()
+
+    def stats(self, ct_prompt_tokens: int, ct_cached_tokens: int, ct_generated_tokens: int) -> dict:
+        """
+        Returns the token counts and phase durations of the generation.
+
+        Args:
+            ct_prompt_tokens (int): Number of prompt tokens.
+            ct_cached_tokens (int): Number of prompt tokens served from a prefix cache.
+            ct_generated_tokens (int): Number of generated tokens.
+
+        Returns:
+            dict: The generation statistics.
+        """
+        end_time = self.end_time or time.perf_counter()
+        first_token_time = self.first_token_time or end_time
+        decode_seconds = end_time - first_token_time
+        return {
+            "prompt_tokens": ct_prompt_tokens,
+            "cached_prompt_tokens": ct_cached_tokens,
+            "generated_tokens": ct_generated_tokens,
+            "prefill_seconds": round(first_token_time - self.start, 6),
+            "decode_seconds": round(decode_seconds, 6),
+            "generation_seconds": round(end_time - self.start, 6),
+            "tokens_per_second": round((ct_generated_tokens - 1) / decode_seconds, 3) if decode_seconds > 0 and ct_generated_tokens > 1 else 0.0
+        }
+
+
+class BatchStreamer(BaseStreamer):
+    """
+    Forwards the tokens of a batched generation to one streamer per row, so that streamed requests
+    can share a batch. Rows without a streamer are skipped.
+    """
+
+    def __init__(self, streamers: List[Optional[BaseStreamer]]) -> None:
+        self.streamers = streamers
+
+    def put(self, value: torch.Tensor) -> None:
+        for row, streamer in enumerate(self.streamers):
+            if streamer is not None:
+                streamer.put(value[row:row + 1])
+
+    def end(self) -> None:
+        for streamer in self.streamers:
+            if streamer is not None:
+                streamer.end()
+
+
+class CancelledCriteria(StoppingCriteria):
+    """
+    Stops generating the rows whose request was cancelled, e.g. because its client disconnected.
+    The generation ends once every row is finished.
+    """
+
+    def __init__(self, cancel_events: List[Optional[threading.Event]]) -> None:
+        self.cancel_events = cancel_events
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.tensor(
+            [event is not None and event.is_set() for event in self.cancel_events],
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
+
+class GenerationRequest:
+    """
+    A request queued on the generation scheduler: its chat messages and, for a streamed request,
+    the streamer receiving its tokens and the event cancelling it.
+    """
+
+    def __init__(self,
+                 messages: List[dict],
+                 streamer: Optional[BaseStreamer] = None,
+                 cancel_event: Optional[threading.Event] = None
+        ) -> None:
+        self.messages = messages
+        self.streamer = streamer
+        self.cancel_event = cancel_event
+
+
+class GenerationEngine:
+    """
+    Runs chat generation directly on a causal LM, reusing the precomputed key/value cache of the
+    constant system-prompt prefix shared by every request. Prefill then only runs over the tokens
+    that follow the cached prefix.
+    """
+
+    def __init__(self,
+                 model: PreTrainedModel,
+                 tokenizer: PreTrainedTokenizerBase,
+                 system_prompt: str,
+                 temperature: float,
+                 max_new_tokens: int,
+                 prefix_cache: bool = True
+        ) -> None:
+        """
+        Initializes the GenerationEngine class and precomputes the system-prompt prefix cache.
+
+        Args:
+            model (PreTrainedModel): The causal language model.
+            tokenizer (PreTrainedTokenizerBase): Its tokenizer, with a chat template.
+            system_prompt (str): The system prompt sent with every request.
+            temperature (float): Sampling temperature.
+            max_new_tokens (int): Maximum number of generated tokens.
+            prefix_cache (bool, optional): Whether to reuse the system-prompt prefix cache. Defaults to True.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.temperature = temperature
+        self.max_new_tokens = max_new_tokens
+
+        self.prefix_ids: Optional[torch.Tensor] = None
+        self.prefix_cache: Optional[DynamicCache] = None
+        if prefix_cache:
+            self.prefix_ids = self.__system_prefix_ids(system_prompt)
+            self.prefix_cache = self.__prefill(self.prefix_ids)
+
+    def __system_prefix_ids(self, system_prompt: str) -> torch.Tensor:
+        """
+        Returns the tokens every prompt with this system prompt starts with: the longest common
+        token prefix of two prompts that only differ by their user message, minus its last token
+        (which may merge with the user message when tokenized).
+        """
+        prompts = [
+            self.tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}],
+                add_generation_prompt=True,
+                return_tensors="pt"
+            )[0]
+            for user_content in ("A", "Z")
+        ]
+        ct_common = 0
+        for token_a, token_b in zip(prompts[0].tolist(), prompts[1].tolist()):
+            if token_a != token_b:
+                break
+            ct_common += 1
+        return prompts[0][:max(0, ct_common - 1)].unsqueeze(0)
+
+    def __prefill(self, input_ids: torch.Tensor) -> DynamicCache:
+        """
+        Runs the model over a prompt prefix and returns its key/value cache.
+        """
+        cache = DynamicCache()
+        with torch.no_grad():
+            self.model(input_ids=input_ids.to(self.model.device), past_key_values=cache, use_cache=True)
+        return cache
+
+    @staticmethod
+    def __starts_with(input_ids: torch.Tensor, prefix_ids: Optional[torch.Tensor]) -> bool:
+        """
+        Whether a (1, n) token tensor starts with a (1, m) token tensor, with m < n.
+        """
+        if prefix_ids is None or prefix_ids.shape[1] == 0 or prefix_ids.shape[1] >= input_ids.shape[1]:
+            return False
+        return torch.equal(input_ids[:, :prefix_ids.shape[1]], prefix_ids.to(input_ids.device))
+
+    def __find_cache(self, input_ids: torch.Tensor) -> Optional[DynamicCache]:
+        """
+        Returns a private copy of the system-prompt prefix cache if the prompt starts with it, or None.
+        """
+        if self.__starts_with(input_ids, self.prefix_ids):
+            return copy.deepcopy(self.prefix_cache)
+        return None
+
+    def __generation_kwargs(self) -> dict:
+        return {
+            "do_sample": True,
+            "temperature": self.temperature,
+            "max_new_tokens": self.max_new_tokens
+        }
+
+    def tokenize(self, messages: List[dict]) -> torch.Tensor:
+        """
+        Applies the chat template to a conversation and tokenizes it.
+
+        Args:
+            messages (List[dict]): The chat messages.
+
+        Returns:
+            torch.Tensor: The (1, n) prompt tokens.
+        """
+        return self.tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_tensors="pt")
+
+    def generate(self,
+                 messages: List[dict],
+                 streamer: Optional[Any] = None,
+                 stats: Optional[dict] = None,
+                 cancel_event: Optional[threading.Event] = None
+        ) -> str:
+        """
+        Generates the reply to one conversation, reusing the system-prompt prefix cache.
+
+        Args:
+            messages (List[dict]): The chat messages.
+            streamer (Optional[Any], optional): A transformers streamer receiving the tokens. Defaults to None.
+            stats (Optional[dict], optional): Filled with the token counts and the prefill and decode
+                durations of the generation. Defaults to None.
+            cancel_event (Optional[threading.Event], optional): When set, decoding stops. Defaults to None.
+
+        Returns:
+            str: The generated reply.
+        """
+        input_ids = self.tokenize(messages).to(self.model.device)
+        past_key_values = self.__find_cache(input_ids)
+        ct_cached_tokens = past_key_values.get_seq_length() if past_key_values is not None else 0
+        timing_streamer = TimingStreamer(streamer)
+        try:
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    streamer=timing_streamer,
+                    stopping_criteria=StoppingCriteriaList([CancelledCriteria([cancel_event])]),
+                    return_dict_in_generate=True,
+                    **self.__generation_kwargs()
+                )
+        finally:
+            timing_streamer.end()
+        generated_ids = outputs.sequences[0, input_ids.shape[1]:]
+        if stats is not None:
+            stats.update(timing_streamer.stats(input_ids.shape[1], ct_cached_tokens, len(generated_ids)))
+        return self.tokenizer.decode(generated_ids, skip_special_tokens=True)
+
+    def generate_batch(self, requests: List[GenerationRequest]) -> List[Tuple[str, dict]]:
+        """
+        Generates the replies to several conversations in one left-padded call, streaming the
+        tokens of each streamed request to its own streamer. A batch of one goes through
+        `generate` to benefit from the prefix cache.
+
+        Args:
+            requests (List[GenerationRequest]): The requests.
+
+        Returns:
+            List[Tuple[str, dict]]: The generated reply and the generation statistics of each request, in order.
+        """
+        if len(requests) == 1:
+            request = requests[0]
+            stats = {"batch_size": 1}
+            reply = self.generate(request.messages, streamer=request.streamer, stats=stats, cancel_event=request.cancel_event)
+            return [(reply, stats)]
+
+        inputs = self.tokenizer.apply_chat_template(
+            [request.messages for request in requests],
+            add_generation_prompt=True,
+            padding=True,
+            return_tensors="pt",
+            return_dict=True
+        ).to(self.model.device)
+        timing_streamer = TimingStreamer(BatchStreamer([request.streamer for request in requests]))
+        try:
+            with torch.no_grad():
+                sequences = self.model.generate(
+                    **inputs,
+                    streamer=timing_streamer,
+                    stopping_criteria=StoppingCriteriaList([CancelledCriteria([request.cancel_event for request in requests])]),
+                    **self.__generation_kwargs()
+                )
+        finally:
+            timing_streamer.end()
+        generated_ids = sequences[:, inputs["input_ids"].shape[1]:]
+        replies = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+
+        results = []
+        for row, reply in enumerate(replies):
+            ct_generated_tokens = int((generated_ids[row] != self.tokenizer.pad_token_id).sum())
+            stats = timing_streamer.stats(int(inputs["attention_mask"][row].sum()), 0, ct_generated_tokens)
+            results.append((reply, {**stats, "batch_size": len(requests)}))
+        return results
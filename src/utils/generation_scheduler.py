@@ -0,0 +1,86 @@
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+import threading
+import queue
+import time
+
+
+class GenerationScheduler:
+    """
+    A dynamic batching scheduler that groups concurrent generation requests
+    into a single batched call of the underlying model.
+    """
+
+    def __init__(self,
+                 run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int,
+                 batch_wait_ms: float
+        ) -> None:
+        """
+        Initializes the GenerationScheduler class and starts its worker thread.
+
+        Args:
+            run_batch (Callable[[List[Any]], List[Any]]): Function running one batched generation.
+                It receives a list of requests and must return one result per request, in order.
+            max_batch_size (int): Maximum number of requests grouped into one batch.
+            batch_wait_ms (float): Maximum time in milliseconds to wait for more requests
+                once the first request of a batch has arrived.
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_wait_s = max(0.0, batch_wait_ms) / 1000
+        self.requests: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self.worker = threading.Thread(target=self.__run, daemon=True)
+        self.worker.start()
+
+    def submit(self, request: Any) -> Future:
+        """
+        Queues a generation request.
+
+        Args:
+            request (Any): The request passed to `run_batch` (e.g. a list of chat messages).
+
+        Returns:
+            Future: A future resolved with the result of this request.
+        """
+        future = Future()
+        self.requests.put((request, future))
+        return future
+
+    def __collect_batch(self) -> List[Tuple[Any, Future]]:
+        """
+        Blocks until a request is available, then gathers more requests until
+        either the batch is full or the wait window has elapsed.
+
+        Returns:
+            List[Tuple[Any, Future]]: The requests of the next batch with their futures.
+        """
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def __run(self) -> None:
+        """
+        Worker loop: collects batches, runs them and dispatches the results to their callers.
+        """
+        while True:
+            batch = self.__collect_batch()
+            batch = [(request, future) for request, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.run_batch([request for request, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
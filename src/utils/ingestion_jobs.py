@@ -0,0 +1,209 @@
+from utils.prepare_vectordb import PrepareVectorDB, IngestionCancelled
+from utils.load_app_config import LoadAppConfig
+from utils.bm25_index import get_keyword_index
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+import threading
+import uuid
+import time
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+class IngestionJob:
+    """
+    A background ingestion of a documents directory into a namespace, with its progress and status.
+    """
+
+    def __init__(self, documents_dir: str, namespace: str) -> None:
+        """
+        Initializes the IngestionJob class.
+
+        Args:
+            documents_dir (str): Directory containing the documents to ingest.
+            namespace (str): Namespace the documents are stored in.
+        """
+        self.job_id = uuid.uuid4().hex[:8]
+        self.documents_dir = documents_dir
+        self.namespace = namespace
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self.progress = {"files_total": 0, "files_done": 0, "chunks_total": 0, "chunks_embedded": 0, "chunks_saved": 0}
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the job has completed, failed or been cancelled.
+        """
+        return self.status in ("done", "failed", "cancelled")
+
+    def finish(self, status: str) -> None:
+        """
+        Records the final status of the job.
+
+        Args:
+            status (str): "done", "failed" or "cancelled".
+        """
+        self.finished_at = time.monotonic()
+        self.status = status
+
+    def update_progress(self, progress: dict) -> None:
+        """
+        Records the latest progress counters reported by the ingestion.
+        """
+        self.progress = progress
+
+    def describe(self) -> str:
+        """
+        Returns a human-readable summary of the job status and progress.
+
+        Returns:
+            str: The summary.
+        """
+        progress = self.progress
+        if self.status == "queued":
+            return f"Upload job `{self.job_id}` is waiting for a free ingestion worker..."
+        if self.status == "running":
+            return (f"Upload job `{self.job_id}` is indexing: "
+                    f"{progress['files_done']}/{progress['files_total']} file(s) parsed, "
+                    f"{progress['chunks_embedded']}/{progress['chunks_total']} chunk(s) embedded, "
+                    f"{progress['chunks_saved']}/{progress['chunks_total']} chunk(s) saved.")
+        if self.status == "done":
+            return f"Upload job `{self.job_id}`: the document(s) have been successfully uploaded!"
+        if self.status == "cancelled":
+            return f"Upload job `{self.job_id}` has been cancelled."
+        return f"Upload job `{self.job_id}` failed: {self.error}"
+
+
+class IngestionJobManager:
+    """
+    Runs ingestion jobs on a shared pool of worker threads, so uploads never block a UI request
+    thread and concurrent uploads share the ingestion capacity. Jobs targeting the same namespace
+    run one after the other, as they share its ingestion manifest. Finished jobs are forgotten
+    after `upload_job_ttl_seconds`.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=APP_CONFIG.upload_workers, thread_name_prefix="ingestion")
+    jobs: Dict[str, IngestionJob] = {}
+    namespace_locks: Dict[str, threading.Lock] = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def submit(cls, documents_dir: str, namespace: str) -> IngestionJob:
+        """
+        Queues the ingestion of a documents directory.
+
+        Args:
+            documents_dir (str): Directory containing the documents to ingest.
+            namespace (str): Namespace the documents are stored in.
+
+        Returns:
+            IngestionJob: The queued job.
+        """
+        job = IngestionJob(documents_dir, namespace)
+        with cls.lock:
+            cls.__forget_expired_jobs()
+            cls.jobs[job.job_id] = job
+            cls.namespace_locks.setdefault(namespace, threading.Lock())
+        cls.executor.submit(cls.__run, job)
+        return job
+
+    @classmethod
+    def __forget_expired_jobs(cls) -> None:
+        """
+        Forgets the jobs finished for longer than the TTL, and the locks of the namespaces
+        without unfinished jobs. Called with the manager lock held.
+        """
+        now = time.monotonic()
+        for job_id, job in list(cls.jobs.items()):
+            if job.finished and now - job.finished_at > APP_CONFIG.upload_job_ttl_seconds:
+                del cls.jobs[job_id]
+        active_namespaces = {job.namespace for job in cls.jobs.values() if not job.finished}
+        for namespace in list(cls.namespace_locks):
+            if namespace not in active_namespaces:
+                del cls.namespace_locks[namespace]
+
+    @classmethod
+    def get(cls, job_id: str) -> Optional[IngestionJob]:
+        """
+        Returns a job by id.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            Optional[IngestionJob]: The job, or None if unknown.
+        """
+        return cls.jobs.get(job_id)
+
+    @classmethod
+    def has_unfinished_job(cls, namespace: str) -> bool:
+        """
+        Checks whether a job targeting a namespace is queued or running.
+
+        Args:
+            namespace (str): The namespace.
+
+        Returns:
+            bool: True if a job of the namespace has not finished.
+        """
+        with cls.lock:
+            return any(job.namespace == namespace and not job.finished for job in cls.jobs.values())
+
+    @classmethod
+    def cancel(cls, job_id: str) -> Optional[IngestionJob]:
+        """
+        Requests the cancellation of a job. A queued job is cancelled before it starts;
+        a running job stops at its next batch.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            Optional[IngestionJob]: The job, or None if unknown.
+        """
+        job = cls.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+        return job
+
+    @classmethod
+    def __run(cls, job: IngestionJob) -> None:
+        """
+        Runs a job on an ingestion worker.
+        """
+        with cls.namespace_locks[job.namespace]:
+            if job.cancel_event.is_set():
+                job.finish("cancelled")
+                return
+            job.status = "running"
+            try:
+                prepare_vectordb = PrepareVectorDB(
+                    job.documents_dir,
+                    APP_CONFIG.chunk_size,
+                    APP_CONFIG.chunk_overlap,
+                    APP_CONFIG.embed_model_id,
+                    APP_CONFIG.index_name,
+                    APP_CONFIG.cloud,
+                    APP_CONFIG.region,
+                    APP_CONFIG.vectordb_backend,
+                    APP_CONFIG.manifest_dir,
+                    APP_CONFIG.incremental_ingestion,
+                    APP_CONFIG.parse_workers,
+                    APP_CONFIG.ingestion_batch_size,
+                    APP_CONFIG.ingestion_queue_size,
+                    get_keyword_index()
+                )
+                prepare_vectordb.prepare_and_save_vectordb(
+                    namespace=job.namespace,
+                    progress_callback=job.update_progress,
+                    cancel_event=job.cancel_event
+                )
+                job.finish("done")
+            except IngestionCancelled:
+                job.finish("cancelled")
+            except Exception as error:
+                job.error = str(error)
+                job.finish("failed")
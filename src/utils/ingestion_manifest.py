@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+
+
+class IngestionManifest:
+    """
+    A local record of what has been ingested into a namespace: for every file, the hash
+    of its content and the ids of the chunks stored in the vector database.
+    """
+
+    def __init__(self, manifest_dir: str, namespace: str) -> None:
+        """
+        Initializes the IngestionManifest class by loading the manifest of a namespace, if any.
+
+        Args:
+            manifest_dir (str): Directory in which the manifests are stored.
+            namespace (str): Namespace described by the manifest.
+        """
+        self.namespace = namespace
+        self.path = self.manifest_path(manifest_dir, namespace)
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as file:
+                self.files = json.load(file)["files"]
+
+    @staticmethod
+    def manifest_path(manifest_dir: str, namespace: str) -> str:
+        """
+        Returns the path of the manifest of a namespace.
+
+        Args:
+            manifest_dir (str): Directory in which the manifests are stored.
+            namespace (str): The namespace.
+
+        Returns:
+            str: The manifest path.
+        """
+        slug = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(manifest_dir, f"{slug}.json")
+
+    @staticmethod
+    def remove(manifest_dir: str, namespace: str) -> None:
+        """
+        Deletes the manifest of a namespace, e.g. after the namespace was wiped.
+
+        Args:
+            manifest_dir (str): Directory in which the manifests are stored.
+            namespace (str): The namespace.
+        """
+        path = IngestionManifest.manifest_path(manifest_dir, namespace)
+        if os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """
+        Computes the SHA-256 hash of a file's content.
+
+        Args:
+            file_path (str): Path of the file.
+
+        Returns:
+            str: The hex digest.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def chunk_id(namespace: str, file_name: str, page: Optional[int], text: str, occurrence: int) -> str:
+        """
+        Computes the deterministic id of a chunk, so re-ingesting the same chunk overwrites
+        its vector instead of duplicating it.
+
+        Args:
+            namespace (str): Namespace of the chunk.
+            file_name (str): Name of the file the chunk comes from.
+            page (Optional[int]): Page of the chunk in the file.
+            text (str): Content of the chunk.
+            occurrence (int): Index of this chunk among identical chunks of the same file.
+
+        Returns:
+            str: The chunk id.
+        """
+        key = "\0".join([namespace, file_name, str(page), str(occurrence), text])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_file(self, file_name: str) -> Optional[dict]:
+        """
+        Returns the manifest entry of a file, or None if the file was never ingested.
+        """
+        return self.files.get(file_name)
+
+    def set_file(self, file_name: str, file_hash: str, chunk_ids: List[str]) -> None:
+        """
+        Records the content hash and chunk ids of an ingested file.
+        """
+        self.files[file_name] = {"file_hash": file_hash, "chunk_ids": chunk_ids}
+
+    def remove_file(self, file_name: str) -> None:
+        """
+        Forgets a file that is no longer part of the corpus.
+        """
+        self.files.pop(file_name, None)
+
+    def save(self) -> None:
+        """
+        Atomically writes the manifest to disk.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"namespace": self.namespace, "files": self.files}, file)
+        os.replace(tmp_path, self.path)
@@ -1,20 +1,23 @@
 from dotenv import load_dotenv
+from utils.resource_registry import ResourceRegistry
 import yaml
 
+CONFIG_KEY = ("app_config", "configs/app_config.yaml")
+
 # Load environment variables
 load_dotenv()
 
 class LoadAppConfig:
     """
     A class to load application configuration from a YAML file.
+    The file is read and parsed once per process and shared through the ResourceRegistry.
     """
     
     def __init__(self) -> None:
         """
-        Initializes the LoadAppConfig class by loading the configuration file.
+        Initializes the LoadAppConfig class from the parsed configuration file.
         """
-        with open("configs/app_config.yaml") as file:
-            app_config = yaml.safe_load(file)
+        app_config = ResourceRegistry.get_or_create(CONFIG_KEY, self.__read_config)
         
         # Directories
         self.documents_dir = app_config["directories"]["documents_dir"]
@@ -23,21 +26,142 @@ class LoadAppConfig:
         # VectorDB Configuration
         self.chunk_size = app_config["vectordb_config"]["text_splitter"]["chunk_size"]
         self.chunk_overlap = app_config["vectordb_config"]["text_splitter"]["chunk_overlap"]
+        self.vectordb_backend = app_config["vectordb_config"]["index"]["backend"]
         self.index_name = app_config["vectordb_config"]["index"]["index_name"]
         self.cloud = app_config["vectordb_config"]["index"]["cloud"]
         self.region = app_config["vectordb_config"]["index"]["region"]
+        self.local_index_dir = app_config["vectordb_config"]["index"]["local"]["index_dir"]
+        self.ivf_min_vectors = app_config["vectordb_config"]["index"]["local"]["ivf_min_vectors"]
+        self.ivf_nlist = app_config["vectordb_config"]["index"]["local"]["ivf_nlist"]
+        self.ivf_nprobe = app_config["vectordb_config"]["index"]["local"]["ivf_nprobe"]
+        self.incremental_ingestion = app_config["vectordb_config"]["ingestion"]["incremental"]
+        self.manifest_dir = app_config["vectordb_config"]["ingestion"]["manifest_dir"]
+        self.parse_workers = app_config["vectordb_config"]["ingestion"]["parse_workers"]
+        self.ingestion_batch_size = app_config["vectordb_config"]["ingestion"]["batch_size"]
+        self.ingestion_queue_size = app_config["vectordb_config"]["ingestion"]["queue_size"]
+        self.upload_workers = app_config["vectordb_config"]["ingestion"]["upload_workers"]
+        self.upload_progress_interval = app_config["vectordb_config"]["ingestion"]["upload_progress_interval"]
+        self.upload_job_ttl_seconds = app_config["vectordb_config"]["ingestion"]["upload_job_ttl_seconds"]
+        self.hybrid_search = app_config["vectordb_config"]["hybrid_search"]["enabled"]
+        self.keyword_index_dir = app_config["vectordb_config"]["hybrid_search"]["index_dir"]
+        self.keyword_k = app_config["vectordb_config"]["hybrid_search"]["keyword_k"]
+        self.rrf_k = app_config["vectordb_config"]["hybrid_search"]["rrf_k"]
+        self.bm25_k1 = app_config["vectordb_config"]["hybrid_search"]["bm25_k1"]
+        self.bm25_b = app_config["vectordb_config"]["hybrid_search"]["bm25_b"]
         self.k = app_config["vectordb_config"]["retrieved_docs"]["k"]
 
+        # Context Configuration
+        self.max_prompt_tokens = app_config["context"]["max_prompt_tokens"]
+        self.near_duplicate_threshold = app_config["context"]["near_duplicate_threshold"]
+        self.tokenization_cache_size = app_config["context"]["tokenization_cache_size"]
+
         # Embedding Model Configuration
         self.embed_model_id = app_config["embeddings"]["embed_model_id"]
+        self.embed_batch_size = app_config["embeddings"]["embed_batch_size"]
+        self.embed_api_batch_size = app_config["embeddings"]["embed_api_batch_size"]
+        self.embed_pooling = app_config["embeddings"]["pooling"]
+        self.embed_normalize = app_config["embeddings"]["normalize"]
+        self.embed_cache_enabled = app_config["embeddings"]["cache"]["enabled"]
+        self.embed_cache_dir = app_config["embeddings"]["cache"]["cache_dir"]
+        self.embed_cache_memory_max_entries = app_config["embeddings"]["cache"]["memory_max_entries"]
+        self.embed_cache_disk_max_entries = app_config["embeddings"]["cache"]["disk_max_entries"]
+        self.embed_precision = app_config["embeddings"]["inference"]["precision"]
+        self.embed_compile = app_config["embeddings"]["inference"]["compile"]
+
+        # Session Configuration
+        self.session_ttl_seconds = app_config["sessions"]["ttl_seconds"]
+        self.session_sweep_interval_seconds = app_config["sessions"]["sweep_interval_seconds"]
+
+        # UI Configuration
+        self.chat_concurrency_limit = app_config["ui"]["chat_concurrency_limit"]
+        self.default_concurrency_limit = app_config["ui"]["default_concurrency_limit"]
+        self.max_queue_size = app_config["ui"]["max_queue_size"]
+        self.ui_warm_up = app_config["ui"]["warm_up"]
+
+        # Reranker Configuration
+        self.reranker_enabled = app_config["reranker"]["enabled"]
+        self.rerank_model_id = app_config["reranker"]["rerank_model_id"]
+        self.rerank_batch_size = app_config["reranker"]["batch_size"]
+        self.rerank_candidate_k = app_config["reranker"]["candidate_k"]
+        self.rerank_top_n = app_config["reranker"]["top_n"]
+        self.rerank_latency_budget_ms = app_config["reranker"]["latency_budget_ms"]
+        self.rerank_cache_max_entries = app_config["reranker"]["cache_max_entries"]
+        self.rerank_precision = app_config["reranker"]["inference"]["precision"]
+        self.rerank_compile = app_config["reranker"]["inference"]["compile"]
+
+        # Answer Cache Configuration
+        self.answer_cache_enabled = app_config["answer_cache"]["enabled"]
+        self.answer_cache_similarity_threshold = app_config["answer_cache"]["similarity_threshold"]
+        self.answer_cache_ttl_seconds = app_config["answer_cache"]["ttl_seconds"]
+        self.answer_cache_max_entries = app_config["answer_cache"]["max_entries"]
+
+        # Telemetry Configuration
+        self.structured_logs = app_config["telemetry"]["structured_logs"]
+        self.metrics_quantile_window = app_config["telemetry"]["quantile_window"]
 
         # LLM Configuration
         self.gen_model_id = app_config["llm"]["gen_model_id"]
         self.temperature = app_config["llm"]["temperature"]
         self.device_map = app_config["llm"]["device_map"]
         self.max_new_tokens = app_config["llm"]["max_new_tokens"]
+        self.max_batch_size = app_config["llm"]["max_batch_size"]
+        self.batch_wait_ms = app_config["llm"]["batch_wait_ms"]
+        self.prefix_cache = app_config["llm"]["prefix_cache"]
+        self.gen_precision = app_config["llm"]["inference"]["precision"]
+        self.gen_compile = app_config["llm"]["inference"]["compile"]
         self.system_prompt = app_config["llm"]["system_prompt"]
 
+        # Model Server Configuration
+        self.server_host = app_config["server"]["host"]
+        self.server_port = app_config["server"]["port"]
+        self.server_replicas = app_config["server"]["replicas"]
+        self.embed_workers = app_config["server"]["embed_workers"]
+        self.intra_op_threads = app_config["server"]["intra_op_threads"]
+        self.inter_op_threads = app_config["server"]["inter_op_threads"]
+        self.max_pending_generations = app_config["server"]["max_pending_generations"]
+        self.max_pending_embeddings = app_config["server"]["max_pending_embeddings"]
+        self.generation_timeout_seconds = app_config["server"]["generation_timeout_seconds"]
+        self.embedding_timeout_seconds = app_config["server"]["embedding_timeout_seconds"]
+        self.model_snapshot_dir = app_config["server"]["model_snapshot_dir"]
+
         # API URLs
         self.llm_api_url = app_config["api_url"]["llm_api_url"]
-        self.embed_api_url = app_config["api_url"]["embed_api_url"]
\ No newline at end of file
+        self.llm_stream_api_url = app_config["api_url"]["llm_stream_api_url"]
+        self.embed_api_url = app_config["api_url"]["embed_api_url"]
+        self.rerank_api_url = app_config["api_url"]["rerank_api_url"]
+
+        # Model Client Configuration
+        self.client_max_retries = app_config["model_client"]["max_retries"]
+        self.client_failure_cooldown_seconds = app_config["model_client"]["failure_cooldown_seconds"]
+        self.client_health_check_interval_seconds = app_config["model_client"]["health_check_interval_seconds"]
+        self.client_busy_backoff_seconds = app_config["model_client"]["busy_backoff_seconds"]
+
+    @classmethod
+    def override(cls, overrides: dict) -> None:
+        """
+        Overrides values of the parsed configuration for the rest of the process, e.g. to point
+        a benchmark at local stand-ins. Nested sections are merged. Only modules importing the
+        configuration afterwards see the new values, so call it before importing them.
+
+        Args:
+            overrides (dict): The values to override, nested like the configuration file.
+        """
+        def merge(target: dict, values: dict) -> None:
+            for key, value in values.items():
+                if isinstance(value, dict) and isinstance(target.get(key), dict):
+                    merge(target[key], value)
+                else:
+                    target[key] = value
+
+        merge(ResourceRegistry.get_or_create(CONFIG_KEY, cls.__read_config), overrides)
+
+    @staticmethod
+    def __read_config() -> dict:
+        """
+        Reads and parses the configuration file.
+
+        Returns:
+            dict: The parsed configuration.
+        """
+        with open("configs/app_config.yaml") as file:
+            return yaml.safe_load(file)
@@ -0,0 +1,390 @@
+from langchain_core.vectorstores import VectorStore
+from langchain_core.embeddings.embeddings import Embeddings
+from langchain_core.documents import Document
+from utils.segmented_index import SegmentedIndex
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import threading
+import uuid
+import os
+
+
+class LocalVectorIndex(SegmentedIndex):
+    """
+    An embedded vector index persisted on disk. Each namespace is stored as segments (see
+    SegmentedIndex) holding a float32 matrix of L2-normalized vectors, memory-mapped when loaded.
+
+    Small segments are searched exactly with one vectorized dot product. Segments with at least
+    `ivf_min_vectors` vectors are searched through an inverted-file (IVF) index: their vectors
+    are clustered with k-means and only the `ivf_nprobe` clusters closest to the query are
+    scanned. Segments never change, so the IVF index of a segment is built once, in the
+    background, and the segment is searched exactly until it is ready.
+    """
+
+    payload_arrays = ("vectors",)
+
+    def __init__(self,
+                 persist_dir: str,
+                 ivf_min_vectors: int = 20000,
+                 ivf_nlist: int = 0,
+                 ivf_nprobe: int = 8
+        ) -> None:
+        """
+        Initializes the LocalVectorIndex class.
+
+        Args:
+            persist_dir (str): Directory in which the namespaces are persisted.
+            ivf_min_vectors (int, optional): Segment size from which the IVF index is used. Defaults to 20000.
+            ivf_nlist (int, optional): Number of IVF clusters, 0 for sqrt(number of vectors). Defaults to 0.
+            ivf_nprobe (int, optional): Number of IVF clusters scanned per query. Defaults to 8.
+        """
+        super().__init__(persist_dir)
+        self.ivf_min_vectors = ivf_min_vectors
+        self.ivf_nlist = ivf_nlist
+        self.ivf_nprobe = ivf_nprobe
+        self.ivf_builds = set()
+
+    def _prepare_segment(self, segment: Dict[str, Any]) -> None:
+        ivf_path = os.path.join(segment["dir"], "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf_file:
+                segment["ivf"] = {"centroids": ivf_file["centroids"], "assignments": ivf_file["assignments"]}
+
+    def _merge_payloads(self, parts: List[Tuple[Dict[str, Any], np.ndarray]]) -> Dict[str, Any]:
+        return {"vectors": np.concatenate([segment["vectors"][rows] for segment, rows in parts])}
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """
+        L2-normalizes row vectors so that a dot product equals the cosine similarity.
+
+        Args:
+            vectors (np.ndarray): A 1-D vector or a 2-D matrix of row vectors.
+
+        Returns:
+            np.ndarray: The normalized float32 vectors.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def upsert(self, namespace: str, ids: List[str], texts: List[str], metadatas: List[dict], vectors: List[List[float]]) -> None:
+        """
+        Inserts records, replacing the existing records with the same ids.
+
+        Args:
+            namespace (str): The namespace to write to.
+            ids (List[str]): The record ids.
+            texts (List[str]): The record texts.
+            metadatas (List[dict]): The record metadata.
+            vectors (List[List[float]]): The record embeddings.
+        """
+        if not ids:
+            return
+        self._write(namespace, ids, texts, metadatas, {"vectors": self.normalize(vectors)})
+
+    def delete(self, namespace: str, ids: Optional[List[str]] = None, delete_all: bool = False) -> None:
+        """
+        Deletes records from a namespace.
+
+        Args:
+            namespace (str): The namespace to delete from.
+            ids (Optional[List[str]], optional): The ids of the records to delete. Defaults to None.
+            delete_all (bool, optional): Whether to delete the whole namespace. Defaults to False.
+        """
+        if delete_all:
+            self._delete_namespace(namespace)
+        elif ids:
+            self._write(namespace, [], [], [], None, delete_ids=ids)
+
+    def __build_ivf(self, segment: Dict[str, Any], n_iter: int = 10, seed: int = 0) -> None:
+        """
+        Clusters the vectors of a segment with spherical k-means and persists the IVF index.
+        Runs in a background thread.
+        """
+        try:
+            vectors = segment["vectors"]
+            n_vectors = len(vectors)
+            nlist = self.ivf_nlist or int(np.sqrt(n_vectors))
+            nlist = max(1, min(nlist, n_vectors))
+            rng = np.random.default_rng(seed)
+
+            # Train the centroids on a sample, then assign every vector
+            sample = vectors[rng.choice(n_vectors, size=min(n_vectors, nlist * 64), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(n_iter):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = sample[labels == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                centroids = self.normalize(centroids)
+
+            assignments = np.empty(n_vectors, dtype=np.int32)
+            for start in range(0, n_vectors, 65536):
+                assignments[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+
+            ivf_tmp = os.path.join(segment["dir"], "ivf.tmp.npz")
+            np.savez(ivf_tmp, centroids=centroids, assignments=assignments)
+            os.replace(ivf_tmp, os.path.join(segment["dir"], "ivf.npz"))
+            segment["ivf"] = {"centroids": centroids, "assignments": assignments}
+        except OSError:
+            # The segment was merged away meanwhile
+            pass
+        finally:
+            with self.lock:
+                self.ivf_builds.discard(segment["dir"])
+
+    def __ivf(self, segment: Dict[str, Any]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Returns the IVF index of a large segment, starting to build it in the background if it
+        does not exist yet. Returns None while the segment is small or its index is being built.
+        """
+        if segment["count"] < self.ivf_min_vectors:
+            return None
+        if "ivf" in segment:
+            return segment["ivf"]
+        with self.lock:
+            if segment["dir"] not in self.ivf_builds:
+                self.ivf_builds.add(segment["dir"])
+                threading.Thread(target=self.__build_ivf, args=(segment,), name="ivf-build", daemon=True).start()
+        return None
+
+    @staticmethod
+    def __top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Returns the positions of the k highest scores, sorted by decreasing score.
+        """
+        if k >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def __search_segment(self, segment: Dict[str, Any], query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows and scores of the k live records of a segment most similar to a query.
+        """
+        vectors, live = segment["vectors"], segment["live"]
+        ivf = self.__ivf(segment)
+        if ivf is not None:
+            probes = self.__top_k(ivf["centroids"] @ query, self.ivf_nprobe)
+            rows = np.flatnonzero(np.isin(ivf["assignments"], probes) & live)
+            scores = vectors[rows] @ query
+        else:
+            rows = np.arange(segment["count"])
+            scores = vectors @ query
+            if segment["ct_live"] < segment["count"]:
+                rows, scores = rows[live], scores[live]
+        top = self.__top_k(scores, k)
+        return rows[top], scores[top]
+
+    def search(self, namespace: str, vector: List[float], k: int) -> List[Tuple[str, str, dict, float]]:
+        """
+        Searches the k records most similar to a query vector.
+
+        Args:
+            namespace (str): The namespace to search in.
+            vector (List[float]): The query embedding.
+            k (int): The number of records to return.
+
+        Returns:
+            List[Tuple[str, str, dict, float]]: The id, text, metadata and cosine similarity of each record.
+        """
+        query = self.normalize(vector)
+        if k <= 0:
+            return []
+
+        def search_segments(segments: List[Dict[str, Any]]) -> List[Tuple[str, str, dict, float]]:
+            # Keep the k best records of each segment, then the k best overall
+            candidates = []
+            for position, segment in enumerate(segments):
+                rows, scores = self.__search_segment(segment, query, k)
+                candidates.extend((float(score), position, int(row)) for row, score in zip(rows, scores))
+            candidates = sorted(candidates, key=lambda candidate: -candidate[0])[:k]
+            records = {}
+            for position in {position for _, position, _ in candidates}:
+                rows = [row for _, candidate_position, row in candidates if candidate_position == position]
+                records.update(((position, row), record) for row, record in zip(rows, self._read_records(segments[position], rows)))
+            return [
+                (records[position, row]["id"], records[position, row]["text"], records[position, row]["metadata"], score)
+                for score, position, row in candidates
+            ]
+
+        return self._search(namespace, search_segments)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    A LangChain vector store backed by a LocalVectorIndex. Its methods accept the same
+    `namespace` keyword argument as PineconeVectorStore.
+    """
+
+    def __init__(self, index: LocalVectorIndex, embedding: Embeddings, namespace: str = "") -> None:
+        """
+        Initializes the LocalVectorStore class.
+
+        Args:
+            index (LocalVectorIndex): The underlying index.
+            embedding (Embeddings): The embedding model.
+            namespace (str, optional): Default namespace. Defaults to "", the default namespace of Pinecone.
+        """
+        self.index = index
+        self.embedding = embedding
+        self.namespace = namespace
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __namespace(self, namespace: Optional[str]) -> str:
+        """
+        Returns the namespace of a call, the store namespace when none is given.
+        """
+        return self.namespace if namespace is None else namespace
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  namespace: Optional[str] = None,
+                  **kwargs: Any
+        ) -> List[str]:
+        """
+        Embeds and stores texts.
+
+        Args:
+            texts (Iterable[str]): The texts to store.
+            metadatas (Optional[List[dict]], optional): Metadata of each text. Defaults to None.
+            ids (Optional[List[str]], optional): Ids of each text. Defaults to random ids.
+            namespace (Optional[str], optional): Namespace to write to. Defaults to the store namespace.
+
+        Returns:
+            List[str]: The ids of the stored texts.
+        """
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        vectors = self.embedding.embed_documents(texts)
+        self.index.upsert(self.__namespace(namespace), ids, texts, metadatas, vectors)
+        return ids
+
+    def add_embeddings(self,
+                       texts: List[str],
+                       embeddings: List[List[float]],
+                       metadatas: List[dict],
+                       ids: List[str],
+                       namespace: Optional[str] = None
+        ) -> List[str]:
+        """
+        Stores texts whose embeddings were already computed.
+
+        Args:
+            texts (List[str]): The texts to store.
+            embeddings (List[List[float]]): The embedding of each text.
+            metadatas (List[dict]): Metadata of each text.
+            ids (List[str]): Ids of each text.
+            namespace (Optional[str], optional): Namespace to write to. Defaults to the store namespace.
+
+        Returns:
+            List[str]: The ids of the stored texts.
+        """
+        self.index.upsert(self.__namespace(namespace), ids, texts, metadatas, embeddings)
+        return ids
+
+    def delete(self,
+               ids: Optional[List[str]] = None,
+               delete_all: bool = False,
+               namespace: Optional[str] = None,
+               **kwargs: Any
+        ) -> None:
+        """
+        Deletes records by id, or a whole namespace.
+
+        Args:
+            ids (Optional[List[str]], optional): Ids of the records to delete. Defaults to None.
+            delete_all (bool, optional): Whether to delete the whole namespace. Defaults to False.
+            namespace (Optional[str], optional): Namespace to delete from. Defaults to the store namespace.
+        """
+        self.index.delete(self.__namespace(namespace), ids=ids, delete_all=delete_all)
+
+    def similarity_search_by_vector_with_score(self,
+                                               embedding: List[float],
+                                               k: int = 4,
+                                               namespace: Optional[str] = None
+        ) -> List[Tuple[Document, float]]:
+        """
+        Searches the documents most similar to a query embedding.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            k (int, optional): Number of documents to return. Defaults to 4.
+            namespace (Optional[str], optional): Namespace to search in. Defaults to the store namespace.
+
+        Returns:
+            List[Tuple[Document, float]]: The documents with their cosine similarity.
+        """
+        results = self.index.search(self.__namespace(namespace), embedding, k)
+        return [
+            (Document(id=record_id, page_content=text, metadata=metadata), score)
+            for record_id, text, metadata, score in results
+        ]
+
+    def similarity_search_with_score(self,
+                                     query: str,
+                                     k: int = 4,
+                                     namespace: Optional[str] = None,
+                                     **kwargs: Any
+        ) -> List[Tuple[Document, float]]:
+        """
+        Searches the documents most similar to a query text, with their cosine similarity.
+        """
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, namespace=namespace)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, namespace: Optional[str] = None, **kwargs: Any) -> List[Document]:
+        """
+        Searches the documents most similar to a query embedding.
+        """
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, namespace=namespace)]
+
+    def similarity_search(self, query: str, k: int = 4, namespace: Optional[str] = None, **kwargs: Any) -> List[Document]:
+        """
+        Searches the documents most similar to a query text.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, namespace=namespace)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None,
+                   index: Optional[LocalVectorIndex] = None,
+                   persist_dir: Optional[str] = None,
+                   namespace: str = "",
+                   **kwargs: Any
+        ) -> "LocalVectorStore":
+        """
+        Creates a store and adds texts to it.
+
+        Args:
+            texts (List[str]): The texts to store.
+            embedding (Embeddings): The embedding model.
+            metadatas (Optional[List[dict]], optional): Metadata of each text. Defaults to None.
+            ids (Optional[List[str]], optional): Ids of each text. Defaults to None.
+            index (Optional[LocalVectorIndex], optional): Existing index to use. Defaults to None.
+            persist_dir (Optional[str], optional): Directory for a new index when `index` is None. Defaults to None.
+            namespace (str, optional): Namespace to write to. Defaults to "".
+
+        Returns:
+            LocalVectorStore: The created vector store.
+        """
+        if index is None and persist_dir is None:
+            raise ValueError("LocalVectorStore.from_texts needs an `index` or a `persist_dir`.")
+        if index is None:
+            index = LocalVectorIndex(persist_dir)
+        store = cls(index=index, embedding=embedding, namespace=namespace)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
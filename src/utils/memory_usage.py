@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator
+import threading
+import os
+
+def current_rss_mb() -> float:
+    """
+    Returns the resident memory of the current process.
+
+    Returns:
+        float: The resident set size in MiB.
+    """
+    import psutil
+
+    return psutil.Process(os.getpid()).memory_info().rss / (1024 ** 2)
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident memory of the current process since it started.
+
+    Returns:
+        float: The peak resident set size in MiB.
+    """
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        return peak / (1024 ** 2) if os.uname().sysname == "Darwin" else peak / 1024
+    except ImportError:
+        import psutil
+
+        # Windows reports the peak working set
+        return psutil.Process(os.getpid()).memory_info().peak_wset / (1024 ** 2)
+
+def process_tree_rss_mb() -> float:
+    """
+    Returns the resident memory of the current process and of all its child processes,
+    such as the document parsing workers.
+
+    Returns:
+        float: The summed resident set size in MiB.
+    """
+    import psutil
+
+    process = psutil.Process(os.getpid())
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            # The child exited in the meantime
+            pass
+    return rss / (1024 ** 2)
+
+@contextmanager
+def track_process_tree_rss(interval_seconds: float = 0.1) -> Iterator[Dict[str, float]]:
+    """
+    Samples the resident memory of the current process and its children in a background thread
+    while the block runs. Unlike `peak_rss_mb`, the peak covers only the block, and includes the
+    child processes. The value is process-wide: it includes everything else the process tree does
+    meanwhile, and the pages shared between processes are counted once per process, so it only
+    measures one task in a process dedicated to it, such as a benchmark or a command-line ingestion.
+
+    Args:
+        interval_seconds (float, optional): Time between two samples. Defaults to 0.1.
+
+    Yields:
+        Dict[str, float]: Filled with "start_rss_mb" at once, and with "peak_rss_mb" and
+            "peak_rss_delta_mb" (the peak minus the start) when the block exits.
+    """
+    stop = threading.Event()
+    usage = {"start_rss_mb": process_tree_rss_mb()}
+    peak = [usage["start_rss_mb"]]
+
+    def sample() -> None:
+        while not stop.wait(interval_seconds):
+            peak[0] = max(peak[0], process_tree_rss_mb())
+
+    sampler = threading.Thread(target=sample, name="rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield usage
+    finally:
+        stop.set()
+        sampler.join()
+        peak[0] = max(peak[0], process_tree_rss_mb())
+        usage["peak_rss_mb"] = peak[0]
+        usage["peak_rss_delta_mb"] = peak[0] - usage["start_rss_mb"]
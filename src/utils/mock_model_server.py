@@ -0,0 +1,216 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+import numpy as np
+import threading
+import hashlib
+import json
+import time
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class MockTokenizer:
+    """
+    A word-level stand-in for the generation model's tokenizer, so that prompt packing and
+    token counting run offline without downloading the real tokenizer.
+    """
+
+    def __init__(self) -> None:
+        self.vocabulary: Dict[str, int] = {}
+        self.words: List[str] = []
+        self.lock = threading.Lock()
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> List[int]:
+        with self.lock:
+            ids = []
+            for word in text.split():
+                if word not in self.vocabulary:
+                    self.vocabulary[word] = len(self.words)
+                    self.words.append(word)
+                ids.append(self.vocabulary[word])
+            return ids
+
+    def decode(self, ids: List[int], skip_special_tokens: bool = True) -> str:
+        return " ".join(self.words[i] for i in ids)
+
+    def apply_chat_template(self, messages: List[dict], add_generation_prompt: bool = True, tokenize: bool = True, **kwargs):
+        text = "".join(f"<{message['role']}> {message['content']} " for message in messages)
+        if add_generation_prompt:
+            text += "<assistant> "
+        return self.encode(text) if tokenize else text
+
+
+class MockModelServer:
+    """
+    A stand-in for `serve_llm_and_embedding_models.py` speaking the same HTTP API, for offline
+    benchmarks and load tests. Embeddings are hashed bag-of-words vectors, so texts sharing
+    words are close; generation echoes words of the prompt after a simulated prefill delay and
+    at a simulated decode rate, a limited number at a time; re-ranking scores word overlap.
+    """
+
+    def __init__(self,
+                 dimension: int = 384,
+                 prefill_ms: float = 50,
+                 token_ms: float = 5,
+                 max_new_tokens: int = 64,
+                 generation_slots: int = 1,
+                 host: str = "127.0.0.1",
+                 port: int = 0
+        ) -> None:
+        """
+        Initializes the MockModelServer class.
+
+        Args:
+            dimension (int, optional): Dimension of the embeddings. Defaults to 384.
+            prefill_ms (float, optional): Simulated prefill time per generation. Defaults to 50.
+            token_ms (float, optional): Simulated decode time per generated token. Defaults to 5.
+            max_new_tokens (int, optional): Number of generated tokens. Defaults to 64.
+            generation_slots (int, optional): Number of generations running at once, like the batch
+                of one model copy; further requests wait. Defaults to 1.
+            host (str, optional): Host to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on, 0 for a free port. Defaults to 0.
+        """
+        self.dimension = dimension
+        self.prefill_s = prefill_ms / 1000
+        self.token_s = token_ms / 1000
+        self.max_new_tokens = max_new_tokens
+        self.generation_slots = threading.Semaphore(generation_slots)
+        self.httpd = ThreadingHTTPServer((host, port), self.__handler_class())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def api_urls(self) -> Dict[str, str]:
+        """
+        Returns the `api_url` configuration section pointing at this server.
+
+        Returns:
+            Dict[str, str]: The API URLs.
+        """
+        return {
+            "llm_api_url": f"{self.base_url}/generate",
+            "llm_stream_api_url": f"{self.base_url}/generate_stream",
+            "embed_api_url": f"{self.base_url}/embed",
+            "rerank_api_url": f"{self.base_url}/rerank"
+        }
+
+    def start(self) -> "MockModelServer":
+        """
+        Starts serving in a background thread.
+
+        Returns:
+            MockModelServer: The server itself.
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-model-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops the server.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Computes the hashed bag-of-words embedding of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            List[float]: The L2-normalized embedding.
+        """
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm).tolist() if norm > 0 else vector.tolist()
+
+    def answer_tokens(self, messages: List[dict]) -> List[str]:
+        """
+        Returns the tokens of the mock answer: the first words of the last message.
+        """
+        words = messages[-1]["content"].split() if messages else []
+        words = words or ["Sorry,", "I", "don't", "have", "enough", "information", "about", "this."]
+        return [f"{word} " for word in (words * self.max_new_tokens)[:self.max_new_tokens]]
+
+    def generation_metrics(self, messages: List[dict], ct_tokens: int) -> dict:
+        decode_seconds = self.token_s * ct_tokens
+        return {
+            "prompt_tokens": sum(len(message["content"].split()) for message in messages),
+            "cached_prompt_tokens": 0,
+            "generated_tokens": ct_tokens,
+            "prefill_seconds": self.prefill_s,
+            "decode_seconds": decode_seconds,
+            "generation_seconds": self.prefill_s + decode_seconds,
+            "tokens_per_second": ct_tokens / decode_seconds if decode_seconds > 0 else 0.0,
+            "batch_size": 1
+        }
+
+    def __handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+            def __send_json(self, payload: dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                if self.path in ("/health", "/ready"):
+                    self.__send_json({"status": "ok"})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self) -> None:
+                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/embed":
+                    if "texts" in data:
+                        self.__send_json({"embeddings": [server.embed(text) for text in data["texts"]]})
+                    else:
+                        self.__send_json({"embedding": server.embed(data.get("text", ""))})
+                elif self.path == "/rerank":
+                    query_words = set(WORD_PATTERN.findall(data.get("query", "").lower()))
+                    scores = [float(len(query_words & set(WORD_PATTERN.findall(text.lower())))) for text in data.get("texts", [])]
+                    self.__send_json({"scores": scores})
+                elif self.path == "/generate":
+                    messages = data.get("messages", [])
+                    tokens = server.answer_tokens(messages)
+                    with server.generation_slots:
+                        time.sleep(server.prefill_s + server.token_s * len(tokens))
+                    self.__send_json({"response": "".join(tokens), "metrics": server.generation_metrics(messages, len(tokens))})
+                elif self.path == "/generate_stream":
+                    messages = data.get("messages", [])
+                    tokens = server.answer_tokens(messages)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    with server.generation_slots:
+                        time.sleep(server.prefill_s)
+                        for token in tokens:
+                            self.wfile.write(f"data: {json.dumps({'token': token})}\n\n".encode("utf-8"))
+                            self.wfile.flush()
+                            time.sleep(server.token_s)
+                    metrics = server.generation_metrics(messages, len(tokens))
+                    self.wfile.write(f"data: {json.dumps({'metrics': metrics})}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                else:
+                    self.send_error(404)
+
+        return Handler
@@ -1,16 +1,74 @@
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from pinecone import Pinecone, ServerlessSpec, Index
-from langchain_pinecone import PineconeVectorStore
+from langchain_core.embeddings.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
 from langchain_core.documents import Document
-from typing import List
-import time
+from utils.vectordb_backend import create_vectordb_backend
+from utils.ingestion_manifest import IngestionManifest
+from utils.embedding_cache import with_embedding_cache
+from utils.bm25_index import BM25Index
+from utils.resource_registry import ResourceRegistry
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import multiprocessing
+import threading
+import queue
 import os
 
+
+def stream_document_chunks(document_path: str,
+                           document: str,
+                           chunk_size: int,
+                           chunk_overlap: int,
+                           window_size: int,
+                           chunk_queue: Any,
+                           stop_event: Any
+    ) -> None:
+    """
+    Reads a PDF document page by page and splits each page as soon as it is read, sending the
+    chunks to `chunk_queue` in windows of `window_size` chunks, then an end marker. Only one page
+    and one window are held at once, whatever the length of the document. Runs in a worker
+    process of the parsing pool.
+    
+    Args:
+        document_path (str): Path of the document.
+        document (str): Name of the document, tagging its windows.
+        chunk_size (int): Size of text chunks for splitting documents.
+        chunk_overlap (int): Overlap size between chunks.
+        window_size (int): Number of chunks per window.
+        chunk_queue (queue.Queue): Bounded queue (a manager proxy) receiving the (document, chunks)
+            windows, then (document, None).
+        stop_event (threading.Event): Event (a manager proxy) set when the ingestion stops early.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    window = []
+    # Pages are split one at a time, which yields the same chunks as splitting the loaded document
+    for page in PyPDFLoader(document_path).lazy_load():
+        if stop_event.is_set():
+            return
+        window.extend(text_splitter.split_documents([page]))
+        while len(window) >= window_size:
+            chunk_queue.put((document, window[:window_size]))
+            window = window[window_size:]
+    if window:
+        chunk_queue.put((document, window))
+    chunk_queue.put((document, None))
+
+
+class IngestionCancelled(Exception):
+    """
+    Raised when an ingestion is cancelled through its cancel event.
+    """
+
+
 class PrepareVectorDB:
     """
-    A class for preparing and storing documents in a Pinecone vector database.
+    A class for preparing and storing documents in a vector database (Pinecone or the local index).
     """
     
     def __init__(self,
@@ -20,7 +78,15 @@ class PrepareVectorDB:
                  embeddings_model_name: str,
                  index_name: str,
                  cloud: str,
-                 region: str
+                 region: str,
+                 backend: str = "pinecone",
+                 manifest_dir: str = "./data/manifests",
+                 incremental: bool = True,
+                 parse_workers: int = 0,
+                 embed_batch_size: int = 64,
+                 queue_size: int = 8,
+                 keyword_index: Optional[BM25Index] = None,
+                 embeddings: Optional[Embeddings] = None
         ) -> None:
         """
         Initializes the PrepareVectorDB class.
@@ -29,96 +95,351 @@ class PrepareVectorDB:
             documents_dir (str): Directory containing the documents to process.
             chunk_size (int): Size of text chunks for splitting documents.
             chunk_overlap (int): Overlap size between chunks.
-            embeddings_model_name (str): Name of the HuggingFace embeddings model.
+            embeddings_model_name (str): HuggingFace id of the embeddings model.
             index_name (str): Name of the Pinecone index.
             cloud (str): Cloud provider for Pinecone.
             region (str): Region of the Pinecone server.
+            backend (str, optional): Vector database backend, "pinecone" or "local". Defaults to "pinecone".
+            manifest_dir (str, optional): Directory of the ingestion manifests. Defaults to "./data/manifests".
+            incremental (bool, optional): Whether to skip unchanged files and chunks. Defaults to True.
+            parse_workers (int, optional): Number of processes parsing documents, 0 for one per CPU. Defaults to 0.
+            embed_batch_size (int, optional): Number of chunks embedded and upserted together. Defaults to 64.
+            queue_size (int, optional): Maximum number of batches waiting between two stages. Defaults to 8.
+            keyword_index (Optional[BM25Index], optional): BM25 index kept in sync with the vector database
+                for hybrid search, None to disable it. Defaults to None.
+            embeddings (Optional[Embeddings], optional): Embeddings used instead of the local embedding
+                engine, e.g. a model server or a stand-in for benchmarks. Defaults to None.
         """
         self.documents_dir = documents_dir
-        self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size, 
-                chunk_overlap=chunk_overlap
-        )
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embeddings_model_name
-        )
-        self.index_name = index_name
-        self.__create_index(index_name, cloud, region)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        if embeddings is None:
+            # Imported here, as torch and transformers are slow to import and only needed by local embedding
+            from utils.embedding_engine import EngineEmbeddings, get_embedding_engine
+
+            # The embedding engine is loaded once per process and shared by every ingestion; it pools
+            # and normalizes like the model server, so documents and queries share one embedding space
+            embedding_engine = get_embedding_engine(embeddings_model_name)
+            self.embeddings = ResourceRegistry.get_or_create(
+                ("ingestion_embeddings", embeddings_model_name),
+                lambda: with_embedding_cache(EngineEmbeddings(embedding_engine))
+            )
+            self.dimension = embedding_engine.dimension
+        else:
+            self.embeddings = embeddings
+            self.dimension = len(embeddings.embed_query("dimension"))
+        self.manifest_dir = manifest_dir
+        self.incremental = incremental
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.keyword_index = keyword_index
+        self.progress_lock = threading.Lock()
+        self.vectordb = create_vectordb_backend(backend, index_name, cloud, region)
+        print("1- Creating the vectordb index...")
+        self.vectordb.create_index(self.dimension)
 
-    def __create_index(self, index_name: str, cloud: str, region: str) -> Index:
+    def __iter_document_chunks(self, documents: List[str]) -> Iterator[Tuple[str, Optional[List[Document]]]]:
         """
-        Creates a Pinecone index if it does not already exist.
+        Reads and splits documents concurrently in a process pool, yielding their chunks in windows
+        of `embed_batch_size` chunks as soon as they are ready, and (document, None) once a document
+        is complete. The windows of one document arrive in order; those of different documents
+        interleave. At most two documents per worker are read at once, and at most `queue_size`
+        windows wait, so memory does not grow with the length or number of documents.
         
         Args:
-            index_name (str): Name of the Pinecone index.
-            cloud (str): Cloud provider.
-            region (str): Server region.
+            documents (List[str]): Names of the documents to load.
         
-        Returns:
-            Index: The created or retrieved Pinecone index.
+        Yields:
+            Tuple[str, Optional[List[Document]]]: The document name and a window of its chunks,
+                or None once all its chunks have been yielded.
         """
-        print("1- Creating the vectordb index...")
-        pc = Pinecone()
-        existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
-        if index_name not in existing_indexes:
-            pc.create_index(
-                name=index_name,
-                dimension=1024,
-                metric="cosine",
-                spec=ServerlessSpec(cloud=cloud, region=region),
-            )
-            while not pc.describe_index(index_name).status["ready"]:
-                time.sleep(1)
-        index = pc.Index(index_name)
-        return index
+        if not documents:
+            return
+        # The parsing pool and the manager of the queues between the processes are shared by every ingestion
+        # of the process, until a worker dies
+        pool_key = ("parse_pool", self.parse_workers)
+        executor = ResourceRegistry.get_or_create(pool_key, lambda: ProcessPoolExecutor(max_workers=self.parse_workers))
+        manager = ResourceRegistry.get_or_create("parse_manager", multiprocessing.Manager)
+        chunk_queue = manager.Queue(maxsize=self.queue_size)
+        stop_event = manager.Event()
+        pending_documents = list(documents)
+        futures = {}
+        try:
+            while pending_documents or futures:
+                while pending_documents and len(futures) < 2 * self.parse_workers:
+                    document = pending_documents.pop(0)
+                    futures[document] = executor.submit(
+                        stream_document_chunks,
+                        os.path.join(self.documents_dir, document),
+                        document,
+                        self.chunk_size,
+                        self.chunk_overlap,
+                        self.embed_batch_size,
+                        chunk_queue,
+                        stop_event
+                    )
+                try:
+                    document, chunks = chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    # A failed document never sends its end marker
+                    for future in futures.values():
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+                    continue
+                if chunks is None:
+                    futures.pop(document).result()
+                    print(f"\t- The document '{document}' has been loaded successfully!")
+                yield document, chunks
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for lack of memory: the pool is unusable, so the next
+            # ingestion starts a new one
+            ResourceRegistry.discard(pool_key, executor)
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            # Stop the workers early, draining the queue so that none stays blocked on it
+            stop_event.set()
+            for future in futures.values():
+                future.cancel()
+            while any(not future.done() for future in futures.values()):
+                try:
+                    chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
 
-    def __get_all_docs(self) -> List[Document]:
+    @staticmethod
+    def __assign_chunk_ids(namespace: str,
+                           document: str,
+                           splits: List[Document],
+                           occurrences: Dict[tuple, int]
+        ) -> List[Tuple[str, Document]]:
         """
-        Loads all documents from the specified directory.
+        Assigns each chunk of a window of a document its deterministic id.
+        
+        Args:
+            namespace (str): Namespace the chunks are stored in.
+            document (str): Name of the document the chunks come from.
+            splits (List[Document]): The chunks of the window.
+            occurrences (Dict[tuple, int]): Occurrence counts of the (page, text) pairs already
+                seen in the document, updated in place.
         
         Returns:
-            List[Document]: A list of loaded documents.
+            List[Tuple[str, Document]]: The (id, chunk) pairs.
         """
-        print("2- Loading all documents...")
-        all_docs = []
-        for document in os.listdir(self.documents_dir):
-            print(f"\t- The document '{document}' has been loaded successfully!")
-            document_path = os.path.join(self.documents_dir, document)
-            loader = PyPDFLoader(document_path)
-            all_docs.extend(loader.load())
-        return all_docs
+        id_splits = []
+        for split in splits:
+            page = split.metadata.get("page")
+            key = (page, split.page_content)
+            occurrences[key] = occurrences.get(key, -1) + 1
+            chunk_id = IngestionManifest.chunk_id(namespace, document, page, split.page_content, occurrences[key])
+            id_splits.append((chunk_id, split))
+        return id_splits
 
-    def __get_all_splits(self, all_docs: List[Document]) -> List[Document]:
+    @staticmethod
+    def __check_cancelled(cancel_event: Optional[threading.Event], errors: List[Exception]) -> None:
         """
-        Splits all loaded documents into smaller text chunks.
-        
-        Args:
-            all_docs (List[Document]): List of loaded documents.
-        
-        Returns:
-            List[Document]: A list of text chunks.
+        Records an IngestionCancelled error once the cancel event is set.
+        """
+        if cancel_event is not None and cancel_event.is_set() and not errors:
+            errors.append(IngestionCancelled("The ingestion has been cancelled."))
+
+    def __report_progress(self, progress: dict, progress_callback: Optional[Callable[[dict], None]], **updates: int) -> None:
+        """
+        Updates the progress counters and forwards a snapshot to the progress callback.
+        """
+        with self.progress_lock:
+            for key, value in updates.items():
+                progress[key] += value
+            snapshot = dict(progress)
+        if progress_callback is not None:
+            progress_callback(snapshot)
+
+    def __embed_stage(self,
+                      embed_queue: queue.Queue,
+                      upsert_queue: queue.Queue,
+                      errors: List[Exception],
+                      progress: dict,
+                      progress_callback: Optional[Callable[[dict], None]],
+                      cancel_event: Optional[threading.Event]
+        ) -> None:
+        """
+        Embeds batches of chunks taken from `embed_queue` and passes them on to `upsert_queue`.
+        After an error or a cancellation, the remaining batches are drained so that producers never block.
+        """
+        while True:
+            batch = embed_queue.get()
+            if batch is None:
+                upsert_queue.put(None)
+                return
+            self.__check_cancelled(cancel_event, errors)
+            if errors:
+                continue
+            try:
+                embeddings = self.embeddings.embed_documents([split.page_content for _, split in batch])
+                upsert_queue.put((batch, embeddings))
+                self.__report_progress(progress, progress_callback, chunks_embedded=len(batch))
+            except Exception as error:
+                errors.append(error)
+
+    def __upsert_stage(self,
+                       namespace: str,
+                       upsert_queue: queue.Queue,
+                       errors: List[Exception],
+                       progress: dict,
+                       progress_callback: Optional[Callable[[dict], None]],
+                       cancel_event: Optional[threading.Event]
+        ) -> None:
         """
-        print("3- Splitting all documents into chunks...")
-        all_splits = self.text_splitter.split_documents(all_docs)
-        return all_splits
+        Upserts embedded batches taken from `upsert_queue` into the vector database, and adds them
+        to the keyword index.
+        After an error or a cancellation, the remaining batches are drained so that producers never block.
+        """
+        while True:
+            item = upsert_queue.get()
+            if item is None:
+                return
+            self.__check_cancelled(cancel_event, errors)
+            if errors:
+                continue
+            batch, embeddings = item
+            try:
+                ids = [chunk_id for chunk_id, _ in batch]
+                texts = [split.page_content for _, split in batch]
+                metadatas = [split.metadata for _, split in batch]
+                self.vectordb.upsert_embeddings(namespace, ids, texts, metadatas, embeddings)
+                if self.keyword_index is not None:
+                    self.keyword_index.update(namespace, ids, texts, metadatas)
+                self.__report_progress(progress, progress_callback, chunks_saved=len(batch))
+            except Exception as error:
+                errors.append(error)
 
-    def prepare_and_save_vectordb(self, namespace: str) -> PineconeVectorStore:
+    def prepare_and_save_vectordb(self,
+                                  namespace: str,
+                                  progress_callback: Optional[Callable[[dict], None]] = None,
+                                  cancel_event: Optional[threading.Event] = None
+        ) -> VectorStore:
         """
-        Prepares and saves document embeddings into the Pinecone vector database.
+        Prepares and saves document embeddings into the vector database.
+        
+        Documents are read page by page and split concurrently in a process pool; their chunks
+        flow in windows of `embed_batch_size` chunks through bounded queues into a batched
+        embedding stage and a batched upsert stage, so all three stages run at the same time.
+        The chunks and embeddings in memory are bounded by the window and queue sizes, whatever
+        the size of the corpus.
+        
+        In incremental mode, files whose content hash matches the ingestion manifest are skipped,
+        only chunks that are not already stored are embedded, and the vectors of deleted files
+        and of chunks that disappeared from changed files are removed.
+        
+        When a keyword index is given, it receives the same chunks as the vector database, batch
+        by batch, and the same deletions.
         
         Args:
             namespace (str): Namespace in the vector database for storing embeddings.
+            progress_callback (Optional[Callable[[dict], None]], optional): Called with the file and chunk
+                counters every time they change. Defaults to None.
+            cancel_event (Optional[threading.Event], optional): When set, the ingestion stops and raises
+                IngestionCancelled; the manifest is left unchanged. Defaults to None.
         
         Returns:
-            PineconeVectorStore: The created vector store.
-        """
-        all_docs = self.__get_all_docs()
-        all_splits = self.__get_all_splits(all_docs)
-        print("4- Saving the chunks in the vectordb...\n")
-        vector_store = PineconeVectorStore.from_documents(
-            all_splits,
-            embedding=self.embeddings,
-            index_name=self.index_name,
-            namespace=namespace
+            VectorStore: The vector store holding the embeddings.
+        """
+        manifest = IngestionManifest(self.manifest_dir, namespace)
+        # A namespace ingested before the keyword index was enabled is ingested again in full, to index
+        # its existing chunks; their embeddings then mostly come from the embedding cache
+        incremental = self.incremental and (
+            self.keyword_index is None or not manifest.files or self.keyword_index.namespace_exists(namespace)
         )
+        file_hashes = {
+            document: IngestionManifest.file_hash(os.path.join(self.documents_dir, document))
+            for document in sorted(os.listdir(self.documents_dir))
+        }
+        changed_documents = [
+            document for document, file_hash in file_hashes.items()
+            if not incremental or (manifest.get_file(document) or {}).get("file_hash") != file_hash
+        ]
+        removed_documents = [document for document in manifest.files if document not in file_hashes]
+        if incremental:
+            print(f"\t- {len(file_hashes) - len(changed_documents)} unchanged document(s) skipped, "
+                  f"{len(changed_documents)} new or changed, {len(removed_documents)} removed.")
+
+        progress = {
+            "files_total": len(changed_documents),
+            "files_done": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_saved": 0
+        }
+        self.__report_progress(progress, progress_callback)
+
+        # Start the embedding and upsert stages
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        upsert_queue = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        stage_args = (errors, progress, progress_callback, cancel_event)
+        embed_thread = threading.Thread(target=self.__embed_stage, args=(embed_queue, upsert_queue, *stage_args), daemon=True)
+        upsert_thread = threading.Thread(target=self.__upsert_stage, args=(namespace, upsert_queue, *stage_args), daemon=True)
+        embed_thread.start()
+        upsert_thread.start()
+
+        print("2- Loading, splitting, embedding and saving the new or changed documents...")
+        stale_ids = []
+        ct_new_chunks = 0
+        batch = []
+        # Per document being read: its previous chunk ids, the occurrences of its chunks and its chunk ids
+        document_states = {}
+        try:
+            for document, splits in self.__iter_document_chunks(changed_documents):
+                self.__check_cancelled(cancel_event, errors)
+                if errors:
+                    break
+                state = document_states.setdefault(document, {
+                    "old_ids": set((manifest.get_file(document) or {}).get("chunk_ids", [])),
+                    "occurrences": {},
+                    "chunk_ids": []
+                })
+                if splits is None:
+                    # The document is complete
+                    stale_ids.extend(state["old_ids"].difference(state["chunk_ids"]))
+                    manifest.set_file(document, file_hashes[document], state["chunk_ids"])
+                    del document_states[document]
+                    self.__report_progress(progress, progress_callback, files_done=1)
+                    continue
+                id_splits = self.__assign_chunk_ids(namespace, document, splits, state["occurrences"])
+                state["chunk_ids"].extend(chunk_id for chunk_id, _ in id_splits)
+                new_id_splits = [
+                    (chunk_id, split) for chunk_id, split in id_splits
+                    if not incremental or chunk_id not in state["old_ids"]
+                ]
+                ct_new_chunks += len(new_id_splits)
+                self.__report_progress(progress, progress_callback, chunks_total=len(new_id_splits))
+                for chunk_id, split in new_id_splits:
+                    batch.append((chunk_id, split))
+                    if len(batch) >= self.embed_batch_size:
+                        embed_queue.put(batch)
+                        batch = []
+            if batch and not errors:
+                embed_queue.put(batch)
+        finally:
+            embed_queue.put(None)
+            embed_thread.join()
+            upsert_thread.join()
+        if errors:
+            raise errors[0]
+
+        for document in removed_documents:
+            stale_ids.extend(manifest.get_file(document)["chunk_ids"])
+            manifest.remove_file(document)
+
+        print(f"3- Saved {ct_new_chunks} new chunk(s), "
+              f"deleting {len(stale_ids)} stale chunk(s)...\n")
+        vector_store = self.vectordb.get_vector_store(self.embeddings)
+        for start in range(0, len(stale_ids), 1000):
+            vector_store.delete(ids=stale_ids[start:start + 1000], namespace=namespace)
+
+        if self.keyword_index is not None:
+            self.keyword_index.update(namespace, [], [], [], delete_ids=stale_ids)
+
+        manifest.save()
         return vector_store
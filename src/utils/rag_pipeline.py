@@ -0,0 +1,248 @@
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.documents import Document
+from utils.custom_api import CustomAPIEmbeddings, CustomAPILlm
+from utils.vectordb_backend import get_vectordb_backend
+from utils.embedding_cache import with_embedding_cache
+from utils.answer_cache import SemanticAnswerCache
+from utils.context_builder import ContextBuilder
+from utils.bm25_index import get_keyword_index, reciprocal_rank_fusion
+from utils.reranker import Reranker
+from utils.load_app_config import LoadAppConfig
+from typing import Any, Iterator, List, Optional, Tuple
+import threading
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+class ResponseMetadataCollector(BaseCallbackHandler):
+    """
+    Keeps the response and usage metadata of the LLM call of a chain, which the chain's
+    string output parser would otherwise drop.
+    """
+
+    def __init__(self) -> None:
+        self.response_metadata: dict = {}
+        self.usage_metadata: dict = {}
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        message = getattr(response.generations[0][0], "message", None)
+        if message is not None:
+            self.response_metadata = dict(message.response_metadata or {})
+            self.usage_metadata = dict(message.usage_metadata or {})
+
+
+class RAGPipeline:
+    """
+    A long-lived RAG pipeline. The vector store, prompt template, LLM client and document chain
+    are built once and reused, so a chat turn only retrieves once and generates once.
+    """
+
+    _instance: Optional["RAGPipeline"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        """
+        Initializes the RAGPipeline class by building every input-independent component.
+        """
+        # Initialize vector store with embeddings
+        self.embeddings = with_embedding_cache(CustomAPIEmbeddings(api_url=APP_CONFIG.embed_api_url))
+        self.vector_store = get_vectordb_backend().get_vector_store(self.embeddings)
+        # Optional BM25 index, fused with the dense results for exact-term queries
+        self.keyword_index = get_keyword_index()
+
+        # Optional cross-encoder re-ranking of a larger candidate set
+        self.reranker = None
+        if APP_CONFIG.reranker_enabled:
+            self.reranker = Reranker(
+                APP_CONFIG.rerank_api_url,
+                APP_CONFIG.rerank_top_n,
+                APP_CONFIG.rerank_latency_budget_ms,
+                APP_CONFIG.rerank_cache_max_entries
+            )
+
+        # Optional cache of answers to repeated or near-duplicate questions
+        self.answer_cache = None
+        if APP_CONFIG.answer_cache_enabled:
+            self.answer_cache = SemanticAnswerCache(
+                APP_CONFIG.manifest_dir,
+                APP_CONFIG.answer_cache_similarity_threshold,
+                APP_CONFIG.answer_cache_ttl_seconds,
+                APP_CONFIG.answer_cache_max_entries
+            )
+
+        # Create the system and human message prompt templates
+        system_message = SystemMessagePromptTemplate.from_template(
+            template=APP_CONFIG.system_prompt
+        )
+        human_message = HumanMessagePromptTemplate.from_template(
+            template="User prompt:\n{input}\n\nRetrieved documents:\n{context}"
+        )
+        self.prompt_template = ChatPromptTemplate.from_messages([system_message, human_message])
+
+        # Pack the retrieved documents into the prompt up to the prompt-token budget
+        self.context_builder = ContextBuilder(APP_CONFIG.max_prompt_tokens, APP_CONFIG.near_duplicate_threshold)
+
+        # Initialize LLM with API endpoint
+        llm = CustomAPILlm(api_url=APP_CONFIG.llm_api_url, stream_api_url=APP_CONFIG.llm_stream_api_url)
+
+        # Create document chain for combining retrieved docs with the prompt
+        self.document_chain = create_stuff_documents_chain(
+            llm=llm,
+            prompt=self.prompt_template
+        )
+
+    @classmethod
+    def get_instance(cls) -> "RAGPipeline":
+        """
+        Returns the process-wide pipeline, building it on first use.
+
+        Returns:
+            RAGPipeline: The shared pipeline instance.
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def embed_query(self, user_prompt: str) -> List[float]:
+        """
+        Embeds the user prompt once, for both the answer cache and the retrieval.
+
+        Args:
+            user_prompt (str): The input provided by the user.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        return self.embeddings.embed_query(user_prompt)
+
+    def retrieve(self, user_prompt: str, query_embedding: List[float], namespace: str) -> List[Document]:
+        """
+        Retrieves the documents most relevant to the user prompt. With hybrid search enabled, the
+        dense results and the BM25 results are fused with reciprocal rank fusion. With re-ranking
+        enabled, `candidate_k` documents are retrieved instead of `k`.
+
+        Args:
+            user_prompt (str): The input provided by the user.
+            query_embedding (List[float]): The embedding of the user prompt.
+            namespace (str): The namespace to search in.
+
+        Returns:
+            List[Document]: The retrieved documents, most relevant first.
+        """
+        k = APP_CONFIG.rerank_candidate_k if self.reranker is not None else APP_CONFIG.k
+        docs_and_scores = self.vector_store.similarity_search_by_vector_with_score(
+            query_embedding,
+            k=k,
+            namespace=namespace
+        )
+        dense_docs = [doc for doc, _ in docs_and_scores]
+        if self.keyword_index is None:
+            return dense_docs
+
+        keyword_k = max(APP_CONFIG.keyword_k, k) if self.reranker is not None else APP_CONFIG.keyword_k
+        keyword_docs = [doc for doc, _ in self.keyword_index.search(namespace, user_prompt, keyword_k)]
+        return reciprocal_rank_fusion([dense_docs, keyword_docs], k=k, rrf_k=APP_CONFIG.rrf_k)
+
+    def rerank(self, user_prompt: str, retrieved_docs: List[Document]) -> List[Document]:
+        """
+        Keeps the `top_n` retrieved documents the cross-encoder finds most relevant, if re-ranking is enabled.
+
+        Args:
+            user_prompt (str): The input provided by the user.
+            retrieved_docs (List[Document]): The retrieved documents.
+
+        Returns:
+            List[Document]: The re-ranked documents, most relevant first.
+        """
+        if self.reranker is None:
+            return retrieved_docs
+        return self.reranker.rerank(user_prompt, retrieved_docs)
+
+    def build_context(self, user_prompt: str, retrieved_docs: List[Document]) -> List[Document]:
+        """
+        Keeps the retrieved documents that fit in the prompt-token budget, dropping near-duplicates
+        and trimming text shared by overlapping chunks.
+
+        Args:
+            user_prompt (str): The input provided by the user.
+            retrieved_docs (List[Document]): The retrieved documents, most relevant first.
+
+        Returns:
+            List[Document]: The documents to use as context.
+        """
+        prompt_messages = self.prompt_template.format_messages(input=user_prompt, context="")
+        return self.context_builder.build(prompt_messages, retrieved_docs)
+
+    def lookup_answer(self, query_embedding: List[float], namespace: str) -> Optional[Tuple[str, str]]:
+        """
+        Looks up a cached answer to the same or a near-duplicate question.
+
+        Args:
+            query_embedding (List[float]): The embedding of the user prompt.
+            namespace (str): The namespace the question is asked against.
+
+        Returns:
+            Optional[Tuple[str, str]]: The cached answer and references, or None.
+        """
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.lookup(namespace, query_embedding)
+
+    def store_answer(self, query_embedding: List[float], namespace: str, answer: str, references: str) -> None:
+        """
+        Caches a generated answer, if the answer cache is enabled.
+
+        Args:
+            query_embedding (List[float]): The embedding of the user prompt.
+            namespace (str): The namespace the question was asked against.
+            answer (str): The generated answer.
+            references (str): The references shown with the answer.
+        """
+        if self.answer_cache is not None:
+            self.answer_cache.store(namespace, query_embedding, answer, references)
+
+    @staticmethod
+    def format_references(retrieved_docs: List[Document]) -> str:
+        """
+        Formats the retrieved documents for the references panel.
+
+        Args:
+            retrieved_docs (List[Document]): The retrieved documents.
+
+        Returns:
+            str: A string representation of the retrieved documents.
+        """
+        retrieved_docs_str = ""
+        for i, doc in enumerate(retrieved_docs):
+            retrieved_docs_str += f"# Retrieved document {i+1}: \n" + doc.page_content + "\n\n"
+        return retrieved_docs_str
+
+    def stream_answer(self,
+                      user_prompt: str,
+                      retrieved_docs: List[Document],
+                      llm_metadata: Optional[dict] = None
+        ) -> Iterator[str]:
+        """
+        Streams the LLM answer grounded on already retrieved documents.
+
+        Args:
+            user_prompt (str): The input provided by the user.
+            retrieved_docs (List[Document]): The documents used as context.
+            llm_metadata (Optional[dict], optional): Filled, once the answer is complete, with the
+                response metadata (timings) and usage metadata (token counts) of the LLM call. Defaults to None.
+
+        Yields:
+            str: The next piece of the generated answer.
+        """
+        collector = ResponseMetadataCollector()
+        yield from self.document_chain.stream(
+            {"input": user_prompt, "context": retrieved_docs},
+            config={"callbacks": [collector]}
+        )
+        if llm_metadata is not None:
+            llm_metadata.update({"response_metadata": collector.response_metadata, "usage_metadata": collector.usage_metadata})
@@ -0,0 +1,39 @@
+import threading
+
+
+class RequestLimiter:
+    """
+    A non-blocking bound on the number of requests pending in a worker pool. Requests beyond
+    the bound are rejected right away instead of queueing without limit.
+    """
+
+    def __init__(self, max_pending: int) -> None:
+        """
+        Initializes the RequestLimiter class.
+
+        Args:
+            max_pending (int): Maximum number of requests queued or running at once.
+        """
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """
+        Reserves a slot for a request.
+
+        Returns:
+            bool: True if a slot was reserved, False if the pool is full.
+        """
+        with self.lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self) -> None:
+        """
+        Frees the slot of a finished request.
+        """
+        with self.lock:
+            self.pending = max(0, self.pending - 1)
@@ -0,0 +1,71 @@
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from utils.cpu_inference import load_optimized_model, snapshot_path
+from typing import List
+import torch
+
+
+class RerankEngine:
+    """
+    Scores (query, passage) pairs with a cross-encoder. All pairs of a request are scored in
+    length-sorted micro-batches, so that each forward pass is only padded to its longest pair.
+    """
+
+    def __init__(self,
+                 model_id: str,
+                 batch_size: int,
+                 precision: str = "fp32",
+                 compile_model: bool = False,
+                 snapshot_dir: str = ""
+        ) -> None:
+        """
+        Initializes the RerankEngine class and loads the model.
+
+        Args:
+            model_id (str): HuggingFace id of the cross-encoder.
+            batch_size (int): Maximum number of pairs per forward pass.
+            precision (str, optional): CPU inference precision, see `optimize_model`. Defaults to "fp32".
+            compile_model (bool, optional): Whether to compile the model. Defaults to False.
+            snapshot_dir (str, optional): Directory of the model snapshots, see `load_optimized_model`.
+                Defaults to "" (no snapshots).
+        """
+        self.model_id = model_id
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = load_optimized_model(
+            lambda: AutoModelForSequenceClassification.from_pretrained(model_id).eval(),
+            precision,
+            compile_model,
+            snapshot_path(snapshot_dir, model_id, precision)
+        )
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Scores the relevance of passages to a query.
+
+        Args:
+            query (str): The query.
+            texts (List[str]): The passages.
+
+        Returns:
+            List[float]: One relevance score (logit) per passage, higher is more relevant.
+        """
+        if not texts:
+            return []
+        encodings = self.tokenizer([query] * len(texts), texts, truncation=True)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]), reverse=True)
+        scores = [0.0] * len(texts)
+
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            batch = self.tokenizer.pad(
+                [{key: encodings[key][i] for key in encodings.keys()} for i in batch_ids],
+                return_tensors="pt"
+            )
+            with torch.no_grad():
+                logits = self.model(**batch).logits
+            # Single-logit cross-encoders score with their logit, two-class ones with the positive class
+            batch_scores = logits[:, -1].float().cpu().tolist()
+
+            for i, score in zip(batch_ids, batch_scores):
+                scores[i] = score
+        return scores
@@ -0,0 +1,112 @@
+from langchain_core.documents import Document
+from utils.custom_api import CustomAPIReranker
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+import threading
+import hashlib
+import time
+
+
+class Reranker:
+    """
+    Re-orders retrieved chunks with the cross-encoder of the model server and keeps the best ones.
+
+    Scores of (query, chunk) pairs are cached, so a repeated question only sends the new pairs.
+    The remote scoring must fit in a latency budget; when it does not, or fails, the chunks keep
+    their retrieval order, so re-ranking can only ever cost the budget.
+    """
+
+    def __init__(self, api_url: Union[str, List[str]], top_n: int, latency_budget_ms: float, cache_max_entries: int) -> None:
+        """
+        Initializes the Reranker class.
+
+        Args:
+            api_url (Union[str, List[str]]): The URL of the re-ranking API, or one URL per replica.
+            top_n (int): Number of chunks kept after re-ranking.
+            latency_budget_ms (float): Maximum time spent waiting for the scores, in milliseconds.
+            cache_max_entries (int): Maximum number of cached pair scores.
+        """
+        self.client = CustomAPIReranker(api_url)
+        self.top_n = top_n
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_max_entries = cache_max_entries
+        self.cache: "OrderedDict[str, float]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "fallbacks": 0}
+
+    @staticmethod
+    def __pair_key(query: str, doc: Document) -> str:
+        """
+        Computes the cache key of a (query, chunk) pair.
+        """
+        normalized_query = " ".join(query.lower().split())
+        chunk_key = doc.id or doc.page_content
+        return hashlib.sha256(f"{normalized_query}\0{chunk_key}".encode("utf-8")).hexdigest()
+
+    def __get_cached(self, keys: List[str]) -> List[Optional[float]]:
+        with self.lock:
+            scores = []
+            for key in keys:
+                score = self.cache.get(key)
+                if score is not None:
+                    self.cache.move_to_end(key)
+                scores.append(score)
+            ct_hits = sum(score is not None for score in scores)
+            self.stats["cache_hits"] += ct_hits
+            self.stats["cache_misses"] += len(keys) - ct_hits
+            return scores
+
+    def __put_cached(self, keys: List[str], scores: List[float]) -> None:
+        with self.lock:
+            for key, score in zip(keys, scores):
+                self.cache[key] = score
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_max_entries:
+                self.cache.popitem(last=False)
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """
+        Keeps the `top_n` chunks most relevant to the query according to the cross-encoder.
+
+        Args:
+            query (str): The user prompt.
+            docs (List[Document]): The retrieved chunks, in retrieval order.
+
+        Returns:
+            List[Document]: The best chunks, most relevant first.
+        """
+        if len(docs) <= 1:
+            return docs
+        start = time.perf_counter()
+        keys = [self.__pair_key(query, doc) for doc in docs]
+        scores = self.__get_cached(keys)
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            try:
+                missing_scores = self.client.score(
+                    query,
+                    [docs[i].page_content for i in missing],
+                    timeout=self.latency_budget_ms / 1000
+                )
+            except Exception as error:
+                with self.lock:
+                    self.stats["fallbacks"] += 1
+                print(f"Re-ranking skipped after {(time.perf_counter() - start) * 1000:.0f} ms: {error}")
+                return docs[:self.top_n]
+            self.__put_cached([keys[i] for i in missing], missing_scores)
+            for i, score in zip(missing, missing_scores):
+                scores[i] = score
+
+        ranked: List[Tuple[float, int]] = sorted(((score, i) for i, score in enumerate(scores)), key=lambda pair: (-pair[0], pair[1]))
+        return [docs[i] for _, i in ranked[:self.top_n]]
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the cache hit, miss and fallback counters.
+
+        Returns:
+            Dict[str, int]: The counters.
+        """
+        with self.lock:
+            return dict(self.stats)
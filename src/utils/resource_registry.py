@@ -0,0 +1,59 @@
+from typing import Any, Callable, Dict, Hashable
+import threading
+
+
+class ResourceRegistry:
+    """
+    A process-wide registry of expensive resources (parsed configuration, embedding models,
+    vector database clients and index handles). Each resource is created once, on first use,
+    and then shared by every upload, chat turn and cleanup of the process.
+    """
+
+    _resources: Dict[Hashable, Any] = {}
+    _key_locks: Dict[Hashable, threading.Lock] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_or_create(cls, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Returns the resource registered under a key, creating it with `factory` on first use.
+        Concurrent callers of the same key wait for a single creation; other keys are not blocked.
+
+        Args:
+            key (Hashable): Identifier of the resource.
+            factory (Callable[[], Any]): Function creating the resource.
+
+        Returns:
+            Any: The shared resource.
+        """
+        if key in cls._resources:
+            return cls._resources[key]
+        with cls._lock:
+            key_lock = cls._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in cls._resources:
+                cls._resources[key] = factory()
+        return cls._resources[key]
+
+    @classmethod
+    def discard(cls, key: Hashable, resource: Any) -> None:
+        """
+        Forgets a resource that can no longer be used, so that it is created again on next use.
+        Nothing is forgotten if another resource was registered under the key meanwhile.
+
+        Args:
+            key (Hashable): Identifier of the resource.
+            resource (Any): The unusable resource.
+        """
+        with cls._lock:
+            if cls._resources.get(key) is resource:
+                del cls._resources[key]
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Forgets every registered resource, so that they are created again on next use.
+        """
+        with cls._lock:
+            cls._resources.clear()
+            cls._key_locks.clear()
@@ -0,0 +1,428 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import threading
+import hashlib
+import shutil
+import json
+import os
+
+# Files of a segment other than the index arrays and lists of the subclass
+RECORDS_FILE = "records.jsonl"
+IDS_FILE = "ids.json"
+OFFSETS_FILE = "offsets.npy"
+
+
+class SegmentedIndex:
+    """
+    Base class of the on-disk indexes storing each namespace as append-only, immutable segments.
+
+    A write appends one segment holding the new records: their ids, a JSON-lines file of their
+    texts and metadata, read back only for the returned results, and the index arrays and lists
+    of the subclass, memory-mapped when loaded. The records a write replaces or deletes are only
+    masked out of their segments. Segments are merged as they accumulate, each into the next one
+    once it is no larger, so a namespace of N records has O(log N) segments and each record is
+    rewritten O(log N) times. Dead records are dropped when their segment is merged, and every
+    segment is merged once the namespace holds more dead records than live ones.
+
+    A small manifest lists the segments of a namespace with their live masks. Replacing it
+    commits a write, and it is reloaded when another process replaces it. Writers are serialized.
+    Searches only take the lock to get the current segments, so they do not wait for writes.
+    """
+
+    # Names of the numpy arrays and of the JSON lists each segment of the subclass holds
+    payload_arrays: Tuple[str, ...] = ()
+    payload_lists: Tuple[str, ...] = ()
+
+    def __init__(self, persist_dir: str) -> None:
+        """
+        Initializes the SegmentedIndex class.
+
+        Args:
+            persist_dir (str): Directory in which the namespaces are persisted.
+        """
+        self.persist_dir = persist_dir
+        self.namespaces: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        os.makedirs(self.persist_dir, exist_ok=True)
+
+    def _prepare_segment(self, segment: Dict[str, Any]) -> None:
+        """
+        Adds the derived data of a segment when it is loaded. Overridden by the subclasses.
+        """
+
+    def _merge_payloads(self, parts: List[Tuple[Dict[str, Any], np.ndarray]]) -> Dict[str, Any]:
+        """
+        Returns the arrays and lists of the segment merging the given rows of several segments.
+        Implemented by the subclasses.
+
+        Args:
+            parts (List[Tuple[Dict[str, Any], np.ndarray]]): Each merged segment with its live rows, in order.
+
+        Returns:
+            Dict[str, Any]: The arrays and lists of the merged segment.
+        """
+        raise NotImplementedError
+
+    def __namespace_dir(self, namespace: str) -> str:
+        """
+        Returns the directory of a namespace. Namespace names may contain characters
+        that are not valid in paths, so the directory name is derived from a hash.
+        """
+        slug = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.persist_dir, slug)
+
+    def __manifest_path(self, namespace: str) -> str:
+        return os.path.join(self.__namespace_dir(namespace), "manifest.json")
+
+    def __open_segment(self, namespace_dir: str, name: str) -> Dict[str, Any]:
+        """
+        Loads a segment: its ids and record offsets, and its arrays and lists. The arrays
+        are memory-mapped, so their pages are only read when searched.
+        """
+        segment_dir = os.path.join(namespace_dir, name)
+        with open(os.path.join(segment_dir, IDS_FILE), encoding="utf-8") as file:
+            ids = json.load(file)
+        segment = {
+            "name": name,
+            "dir": segment_dir,
+            "ids": ids,
+            "count": len(ids),
+            "offsets": np.load(os.path.join(segment_dir, OFFSETS_FILE)),
+            "live": np.ones(len(ids), dtype=bool),
+            "live_file": None,
+            "ct_live": len(ids)
+        }
+        for array_name in self.payload_arrays:
+            # Plain ndarray views of the memory maps: pages are still read lazily, without the memmap slicing overhead
+            segment[array_name] = np.asarray(np.load(os.path.join(segment_dir, f"{array_name}.npy"), mmap_mode="r"))
+        for list_name in self.payload_lists:
+            with open(os.path.join(segment_dir, f"{list_name}.json"), encoding="utf-8") as file:
+                segment[list_name] = json.load(file)
+        self._prepare_segment(segment)
+        return segment
+
+    @staticmethod
+    def __with_live(segment: Dict[str, Any], live: np.ndarray, live_file: Optional[str]) -> Dict[str, Any]:
+        """
+        Returns a copy of a segment with another live mask. Segments are never modified in
+        place, so that searches keep a consistent view while a write is in progress.
+        """
+        return {**segment, "live": live, "live_file": live_file, "ct_live": int(live.sum())}
+
+    def _load(self, namespace: str) -> Dict[str, Any]:
+        """
+        Returns a namespace, (re)loading it from disk if another process modified it. The segments
+        that are still listed are kept, so that only new segments and live masks are read.
+        """
+        manifest_path = self.__manifest_path(namespace)
+        mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+        cached = self.namespaces.get(namespace)
+        if cached is not None and cached["mtime"] == mtime:
+            return cached
+
+        manifest = {"generation": 0, "next_segment": 0, "segments": []}
+        if mtime is not None:
+            with open(manifest_path, encoding="utf-8") as file:
+                manifest = json.load(file)
+        namespace_dir = self.__namespace_dir(namespace)
+        previous = {segment["name"]: segment for segment in cached["segments"]} if cached is not None else {}
+        segments = []
+        for entry in manifest["segments"]:
+            segment = previous.get(entry["name"]) or self.__open_segment(namespace_dir, entry["name"])
+            if segment["live_file"] != entry["live"]:
+                live = np.load(os.path.join(segment["dir"], entry["live"])) if entry["live"] else np.ones(segment["count"], dtype=bool)
+                segment = self.__with_live(segment, live, entry["live"])
+            segments.append(segment)
+
+        data = {
+            "segments": segments,
+            "generation": manifest["generation"],
+            "next_segment": manifest["next_segment"],
+            # Built on the first write only, so that processes which only search do not hold it
+            "id_to_location": None,
+            "mtime": mtime
+        }
+        self.namespaces[namespace] = data
+        return data
+
+    def _snapshot(self, namespace: str) -> List[Dict[str, Any]]:
+        """
+        Returns the current segments of a namespace.
+
+        Args:
+            namespace (str): The namespace.
+
+        Returns:
+            List[Dict[str, Any]]: The segments, oldest first.
+        """
+        with self.lock:
+            return self._load(namespace)["segments"]
+
+    def _search(self, namespace: str, search: Callable[[List[Dict[str, Any]]], Any]) -> Any:
+        """
+        Runs a search on the current segments of a namespace. A merge may remove the files of the
+        segments a search started with; the search is then run again on the new segments.
+
+        Args:
+            namespace (str): The namespace.
+            search (Callable[[List[Dict[str, Any]]], Any]): The search, given the segments.
+
+        Returns:
+            Any: The result of the search.
+        """
+        for attempt in range(2):
+            try:
+                return search(self._snapshot(namespace))
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    @staticmethod
+    def _read_records(segment: Dict[str, Any], rows: Iterable[int]) -> List[dict]:
+        """
+        Reads the id, text and metadata of some records of a segment.
+
+        Args:
+            segment (Dict[str, Any]): The segment.
+            rows (Iterable[int]): The rows of the records.
+
+        Returns:
+            List[dict]: The records, with "id", "text" and "metadata" fields.
+        """
+        records = []
+        with open(os.path.join(segment["dir"], RECORDS_FILE), "rb") as file:
+            for row in rows:
+                file.seek(int(segment["offsets"][row]))
+                records.append(json.loads(file.readline()))
+        return records
+
+    def __write_segment(self,
+                        namespace_dir: str,
+                        name: str,
+                        ids: List[str],
+                        lines: Iterable[bytes],
+                        payload: Dict[str, Any]
+        ) -> Dict[str, Any]:
+        """
+        Writes a new segment and loads it.
+        """
+        segment_dir = os.path.join(namespace_dir, name)
+        # A directory left behind by an interrupted write is overwritten
+        os.makedirs(segment_dir, exist_ok=True)
+        offsets = np.empty(len(ids), dtype=np.int64)
+        with open(os.path.join(segment_dir, RECORDS_FILE), "wb") as file:
+            for row, line in enumerate(lines):
+                offsets[row] = file.tell()
+                file.write(line)
+        np.save(os.path.join(segment_dir, OFFSETS_FILE), offsets)
+        for array_name in self.payload_arrays:
+            np.save(os.path.join(segment_dir, f"{array_name}.npy"), np.ascontiguousarray(payload[array_name]))
+        for list_name in self.payload_lists:
+            with open(os.path.join(segment_dir, f"{list_name}.json"), "w", encoding="utf-8") as file:
+                json.dump(payload[list_name], file)
+        # The ids are written last: a segment without them is incomplete
+        with open(os.path.join(segment_dir, IDS_FILE), "w", encoding="utf-8") as file:
+            json.dump(ids, file)
+        return self.__open_segment(namespace_dir, name)
+
+    def __merge(self, namespace_dir: str, name: str, segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Writes the live records of several segments into a new segment. The record lines are
+        copied as they are, without being decoded.
+        """
+        parts = [(segment, np.flatnonzero(segment["live"])) for segment in segments]
+        ids = [segment["ids"][row] for segment, rows in parts for row in rows]
+
+        def lines() -> Iterable[bytes]:
+            for segment, rows in parts:
+                with open(os.path.join(segment["dir"], RECORDS_FILE), "rb") as file:
+                    for row in rows:
+                        file.seek(int(segment["offsets"][row]))
+                        yield file.readline()
+
+        return self.__write_segment(namespace_dir, name, ids, lines(), self._merge_payloads(parts))
+
+    @staticmethod
+    def __id_to_location(data: Dict[str, Any]) -> Dict[str, Tuple[str, int]]:
+        """
+        Returns the segment and row of each live record of a namespace.
+        """
+        if data["id_to_location"] is None:
+            data["id_to_location"] = {
+                segment["ids"][row]: (segment["name"], int(row))
+                for segment in data["segments"]
+                for row in np.flatnonzero(segment["live"])
+            }
+        return data["id_to_location"]
+
+    def _write(self,
+               namespace: str,
+               ids: List[str],
+               texts: List[str],
+               metadatas: List[dict],
+               payload: Optional[Dict[str, Any]],
+               delete_ids: Optional[List[str]] = None
+        ) -> None:
+        """
+        Adds records to a namespace, replacing the records with the same ids, and deletes records.
+
+        Args:
+            namespace (str): The namespace to write to.
+            ids (List[str]): The ids of the records to add, unique within the write.
+            texts (List[str]): The texts of the records to add.
+            metadatas (List[dict]): The metadata of the records to add.
+            payload (Optional[Dict[str, Any]]): The arrays and lists of the subclass for the added records.
+            delete_ids (Optional[List[str]], optional): The ids of the records to delete. Defaults to None.
+        """
+        with self.write_lock:
+            with self.lock:
+                data = self._load(namespace)
+            try:
+                self.__apply_write(namespace, data, ids, texts, metadatas, payload, delete_ids or [])
+            except BaseException:
+                # The in-memory state may be partially updated; reload it from the last commit
+                with self.lock:
+                    self.namespaces.pop(namespace, None)
+                raise
+
+    def __apply_write(self,
+                      namespace: str,
+                      data: Dict[str, Any],
+                      ids: List[str],
+                      texts: List[str],
+                      metadatas: List[dict],
+                      payload: Optional[Dict[str, Any]],
+                      delete_ids: List[str]
+        ) -> None:
+        namespace_dir = self.__namespace_dir(namespace)
+        id_to_location = self.__id_to_location(data)
+        generation = data["generation"] + 1
+        next_segment = data["next_segment"]
+
+        # Mask out the replaced and deleted records
+        dead_rows: Dict[str, List[int]] = {}
+        for record_id in list(ids) + list(delete_ids):
+            location = id_to_location.pop(record_id, None)
+            if location is not None:
+                dead_rows.setdefault(location[0], []).append(location[1])
+        if not ids and not dead_rows:
+            return
+        live_file = f"live-{generation:08d}.npy"
+        segments = []
+        for segment in data["segments"]:
+            if segment["name"] in dead_rows:
+                live = segment["live"].copy()
+                live[dead_rows[segment["name"]]] = False
+                segment = self.__with_live(segment, live, live_file)
+            segments.append(segment)
+
+        # Append the new records as a segment
+        os.makedirs(namespace_dir, exist_ok=True)
+        if ids:
+            lines = (
+                (json.dumps({"id": record_id, "text": text, "metadata": metadata}) + "\n").encode("utf-8")
+                for record_id, text, metadata in zip(ids, texts, metadatas)
+            )
+            segment = self.__write_segment(namespace_dir, f"{next_segment:08d}", list(ids), lines, payload)
+            id_to_location.update((record_id, (segment["name"], row)) for row, record_id in enumerate(segment["ids"]))
+            segments.append(segment)
+            next_segment += 1
+
+        # Merge the last segment into the previous one while it is no larger, and every segment
+        # once the dead records outnumber the live ones
+        segments = [segment for segment in segments if segment["ct_live"] > 0]
+        ct_live = sum(segment["ct_live"] for segment in segments)
+        ct_dead = sum(segment["count"] - segment["ct_live"] for segment in segments)
+        merge_all = len(segments) > 1 and ct_dead > ct_live
+        while len(segments) > 1 and (merge_all or segments[-2]["ct_live"] <= segments[-1]["ct_live"]):
+            count = len(segments) if merge_all else 2
+            merged = self.__merge(namespace_dir, f"{next_segment:08d}", segments[-count:])
+            id_to_location.update((record_id, (merged["name"], row)) for row, record_id in enumerate(merged["ids"]))
+            segments[-count:] = [merged]
+            next_segment += 1
+            merge_all = False
+
+        # Write the new live masks, then commit the manifest
+        for segment in segments:
+            if segment["live_file"] == live_file:
+                np.save(os.path.join(segment["dir"], live_file), segment["live"])
+        manifest = {
+            "namespace": namespace,
+            "generation": generation,
+            "next_segment": next_segment,
+            "segments": [{"name": segment["name"], "count": segment["count"], "live": segment["live_file"]} for segment in segments]
+        }
+        manifest_tmp = os.path.join(namespace_dir, "manifest.tmp.json")
+        with open(manifest_tmp, "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(manifest_tmp, self.__manifest_path(namespace))
+
+        with self.lock:
+            self.namespaces[namespace] = {
+                "segments": segments,
+                "generation": generation,
+                "next_segment": next_segment,
+                "id_to_location": id_to_location,
+                "mtime": os.path.getmtime(self.__manifest_path(namespace))
+            }
+        self.__remove_unlisted(namespace_dir, manifest)
+
+    @staticmethod
+    def __remove_unlisted(namespace_dir: str, manifest: dict) -> None:
+        """
+        Removes the segments and live masks the manifest no longer lists. Files still mapped
+        by another process may not be removable on Windows; they are removed after a later write.
+        """
+        listed = {entry["name"]: entry["live"] for entry in manifest["segments"]}
+        for name in os.listdir(namespace_dir):
+            path = os.path.join(namespace_dir, name)
+            if not os.path.isdir(path):
+                continue
+            if name not in listed:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            for file_name in os.listdir(path):
+                if file_name.startswith("live-") and file_name != listed[name]:
+                    try:
+                        os.remove(os.path.join(path, file_name))
+                    except OSError:
+                        pass
+
+    def _delete_namespace(self, namespace: str) -> None:
+        """
+        Deletes a namespace, if it exists.
+
+        Args:
+            namespace (str): The namespace to delete.
+        """
+        with self.write_lock, self.lock:
+            shutil.rmtree(self.__namespace_dir(namespace), ignore_errors=True)
+            self.namespaces.pop(namespace, None)
+
+    def namespace_exists(self, namespace: str) -> bool:
+        """
+        Checks whether a namespace holds any records.
+
+        Args:
+            namespace (str): The namespace to check.
+
+        Returns:
+            bool: True if the namespace exists and is not empty.
+        """
+        return any(segment["ct_live"] for segment in self._snapshot(namespace))
+
+    def list_namespaces(self) -> List[str]:
+        """
+        Lists the persisted namespaces.
+
+        Returns:
+            List[str]: The namespace names.
+        """
+        namespaces = []
+        for slug in os.listdir(self.persist_dir):
+            manifest_path = os.path.join(self.persist_dir, slug, "manifest.json")
+            if os.path.exists(manifest_path):
+                with open(manifest_path, encoding="utf-8") as file:
+                    namespaces.append(json.load(file)["namespace"])
+        return namespaces
@@ -0,0 +1,122 @@
+from utils.load_app_config import LoadAppConfig
+from typing import Dict, List
+import threading
+import time
+import os
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+UPLOADED_DOCUMENTS = "Uploaded document(s)"
+
+class SessionManager:
+    """
+    Tracks the chat sessions and maps each of them to its own upload namespace and directory,
+    so that a session only ever retrieves from and cleans up its own uploaded documents.
+    """
+
+    last_activity: Dict[str, float] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def namespace(type_documents: str, session_id: str) -> str:
+        """
+        Returns the vector database namespace of a document type for a session. Pre-processed
+        documents are shared by every session; uploaded documents are private to each session.
+
+        Args:
+            type_documents (str): The document type selected in the UI.
+            session_id (str): The session id.
+
+        Returns:
+            str: The namespace.
+        """
+        if type_documents == UPLOADED_DOCUMENTS:
+            return f"{UPLOADED_DOCUMENTS}-{session_id}"
+        return type_documents
+
+    @staticmethod
+    def session_from_namespace(namespace: str) -> str:
+        """
+        Returns the session id of an upload namespace, or an empty string for other namespaces.
+
+        Args:
+            namespace (str): The namespace.
+
+        Returns:
+            str: The session id.
+        """
+        prefix = f"{UPLOADED_DOCUMENTS}-"
+        return namespace[len(prefix):] if namespace.startswith(prefix) else ""
+
+    @staticmethod
+    def uploaded_documents_dir(session_id: str) -> str:
+        """
+        Returns the directory holding the documents uploaded by a session.
+
+        Args:
+            session_id (str): The session id.
+
+        Returns:
+            str: The directory path.
+        """
+        return os.path.join(APP_CONFIG.uploaded_documents_dir, session_id)
+
+    @classmethod
+    def touch(cls, session_id: str) -> None:
+        """
+        Records activity of a session, postponing its expiration.
+
+        Args:
+            session_id (str): The session id.
+        """
+        with cls.lock:
+            cls.last_activity[session_id] = time.time()
+
+    @classmethod
+    def forget(cls, session_id: str) -> None:
+        """
+        Stops tracking a session.
+
+        Args:
+            session_id (str): The session id.
+        """
+        with cls.lock:
+            cls.last_activity.pop(session_id, None)
+
+    @classmethod
+    def is_active(cls, session_id: str) -> bool:
+        """
+        Whether a session had activity within the session TTL.
+
+        Args:
+            session_id (str): The session id.
+
+        Returns:
+            bool: True if the session is active.
+        """
+        with cls.lock:
+            last_activity = cls.last_activity.get(session_id)
+        return last_activity is not None and time.time() - last_activity <= APP_CONFIG.session_ttl_seconds
+
+    @classmethod
+    def expired_sessions(cls) -> List[str]:
+        """
+        Lists the sessions whose uploads have expired: tracked sessions idle for longer than the TTL,
+        and upload directories left by earlier runs whose last modification is older than the TTL.
+
+        Returns:
+            List[str]: The expired session ids.
+        """
+        now = time.time()
+        with cls.lock:
+            expired = {session_id for session_id, last_activity in cls.last_activity.items()
+                       if now - last_activity > APP_CONFIG.session_ttl_seconds}
+            tracked = set(cls.last_activity)
+
+        if os.path.isdir(APP_CONFIG.uploaded_documents_dir):
+            for session_id in os.listdir(APP_CONFIG.uploaded_documents_dir):
+                session_dir = cls.uploaded_documents_dir(session_id)
+                if session_id not in tracked and now - os.path.getmtime(session_dir) > APP_CONFIG.session_ttl_seconds:
+                    expired.add(session_id)
+        return sorted(expired)
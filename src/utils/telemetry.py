@@ -0,0 +1,224 @@
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from contextlib import contextmanager
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
+import logging
+import bisect
+import json
+import time
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+# Upper bounds of the histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """
+    A latency histogram with cumulative Prometheus buckets, plus a window of the latest samples
+    from which the p50/p95/p99 quantiles are computed.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, window: int = 1024) -> None:
+        """
+        Initializes the LatencyHistogram class.
+
+        Args:
+            buckets (Tuple[float, ...], optional): Upper bounds of the buckets. Defaults to LATENCY_BUCKETS.
+            window (int, optional): Number of latest samples kept for the quantiles. Defaults to 1024.
+        """
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        """
+        Records a sample.
+
+        Args:
+            value (float): The sample.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns a quantile of the latest samples, 0 when there are none.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The quantile.
+        """
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class MetricsRegistry:
+    """
+    The latency histograms of a process, labelled by name and stage, rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self, window: int) -> None:
+        """
+        Initializes the MetricsRegistry class.
+
+        Args:
+            window (int): Number of latest samples kept per histogram for the quantiles.
+        """
+        self.window = window
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, stage: str, value: float) -> None:
+        """
+        Records a sample in the histogram of a metric and stage.
+
+        Args:
+            name (str): The metric name, e.g. "generation_seconds".
+            stage (str): The stage label, e.g. "prefill".
+            value (float): The sample.
+        """
+        with self.lock:
+            histogram = self.histograms.get((name, stage))
+            if histogram is None:
+                histogram = self.histograms[(name, stage)] = LatencyHistogram(window=self.window)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        """
+        Renders every histogram in the Prometheus text exposition format, followed by the
+        p50/p95/p99 of its latest samples as a summary.
+
+        Returns:
+            str: The metrics.
+        """
+        lines: List[str] = []
+        with self.lock:
+            names = sorted({name for name, _ in self.histograms})
+            for name in names:
+                stages = sorted(stage for metric_name, stage in self.histograms if metric_name == name)
+                lines.append(f"# TYPE {name} histogram")
+                for stage in stages:
+                    histogram = self.histograms[(name, stage)]
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+                lines.append(f"# TYPE {name}_recent summary")
+                for stage in stages:
+                    histogram = self.histograms[(name, stage)]
+                    for q in QUANTILES:
+                        lines.append(f'{name}_recent{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q):.6f}')
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the metrics registry of the process.
+
+    Returns:
+        MetricsRegistry: The metrics registry.
+    """
+    return ResourceRegistry.get_or_create("metrics", lambda: MetricsRegistry(APP_CONFIG.metrics_quantile_window))
+
+
+def get_logger() -> logging.Logger:
+    """
+    Returns the logger of the structured (JSON lines) logs, configured on first use.
+
+    Returns:
+        logging.Logger: The logger.
+    """
+    def create_logger() -> logging.Logger:
+        logger = logging.getLogger("rag_gemma3")
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        return logger
+
+    return ResourceRegistry.get_or_create("structured_logger", create_logger)
+
+
+def log_event(event: str, **fields) -> None:
+    """
+    Writes one structured log line, if structured logs are enabled.
+
+    Args:
+        event (str): The event name.
+        **fields: The event fields, JSON-serializable.
+    """
+    if APP_CONFIG.structured_logs:
+        get_logger().info(json.dumps({"event": event, "timestamp": round(time.time(), 3), **fields}))
+
+
+class StageTimer:
+    """
+    Measures the stages of one request. Each stage duration is kept for the request's own
+    report and recorded in the histogram `metric_name` of the process metrics.
+    """
+
+    def __init__(self, metric_name: str) -> None:
+        """
+        Initializes the StageTimer class.
+
+        Args:
+            metric_name (str): The histogram the stage durations are recorded in.
+        """
+        self.metric_name = metric_name
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """
+        Times the enclosed block as a stage.
+
+        Args:
+            stage (str): The stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: Optional[float]) -> None:
+        """
+        Records the duration of a stage measured elsewhere.
+
+        Args:
+            stage (str): The stage name.
+            seconds (Optional[float]): The duration in seconds, None if unknown.
+        """
+        if seconds is None:
+            return
+        self.stages[stage] = round(seconds, 6)
+        get_metrics().observe(self.metric_name, stage, seconds)
+
+    def elapsed(self) -> float:
+        """
+        Returns the time elapsed since the timer was created, in seconds.
+        """
+        return time.perf_counter() - self.start
@@ -1,49 +1,89 @@
-from utils.prepare_vectordb import PrepareVectorDB
-from utils.load_app_config import LoadAppConfig
+from utils.session_manager import SessionManager
 from typing import List, Tuple
 import shutil
+import gradio as gr
 import os
 
-# Load application configuration
-APP_CONFIG = LoadAppConfig()
-
 class UploadDocuemnt():
     """
     A class for handling document uploads and processing them into a vector database.
+    Ingestion runs as a background job, so the UI stays responsive while documents are indexed.
     """
     
     @staticmethod
-    def process_uploaded_documents(uploaded_documents: List[str], type_documents: str, chat_history: List[dict]) -> Tuple[str, List[dict]]:
+    def process_uploaded_documents(uploaded_documents: List[str], type_documents: str, chat_history: List[dict], request: gr.Request) -> Tuple[str, List[dict], str]:
         """
-        Process and store uploaded documents in a vector database.
+        Store uploaded documents and start their ingestion into the vector database as a background job.
         
         Args:
             uploaded_documents (List[str]): List of file paths for uploaded documents.
             type_documents (str): Specifies the type of documents (should be "Uploaded document(s)").
             chat_history (List[dict]): List representing the chat history.
+            request (gr.Request): The Gradio request, identifying the user session.
         
         Returns:
-            Tuple[str, List[dict]]: An empty string and the updated chat history.
+            Tuple[str, List[dict], str]: An empty string, the updated chat history and the id of the
+                ingestion job (empty if no job was started).
         """
+        # Imported on first use, as the ingestion imports LangChain, which is slow to import
+        from utils.ingestion_jobs import IngestionJobManager
+
         if type_documents == "Uploaded document(s)":
-            os.makedirs(APP_CONFIG.uploaded_documents_dir, exist_ok=True)
+            # Each session uploads into its own directory and namespace
+            session_id = request.session_hash
+            SessionManager.touch(session_id)
+            session_dir = SessionManager.uploaded_documents_dir(session_id)
+            os.makedirs(session_dir, exist_ok=True)
             for uploaded_docuemnt in uploaded_documents:
-                shutil.move(uploaded_docuemnt, APP_CONFIG.uploaded_documents_dir)
-
-            # Prepare and store documents in the vector database
-            prepare_vectordb = PrepareVectorDB(
-                APP_CONFIG.uploaded_documents_dir,
-                APP_CONFIG.chunk_size,
-                APP_CONFIG.chunk_overlap,
-                APP_CONFIG.embed_model_id,
-                APP_CONFIG.index_name,
-                APP_CONFIG.cloud,
-                APP_CONFIG.region
-            )
-            prepare_vectordb.prepare_and_save_vectordb(namespace="Uploaded document(s)")
+                shutil.move(uploaded_docuemnt, os.path.join(session_dir, os.path.basename(uploaded_docuemnt)))
+
+            # Prepare and store documents in the vector database in the background
+            job = IngestionJobManager.submit(session_dir, namespace=SessionManager.namespace(type_documents, session_id))
             
-            chat_history.append({"role": "assistant", "content": "The document(s) have been successfully uploaded!"})
-        else:
-            chat_history.append({"role": "assistant", "content": "You should first click on 'Upload Document(s)' in the rag dropdown to upload document(s)."})
+            chat_history.append({"role": "assistant", "content": f"The document(s) are being indexed in the background (job `{job.job_id}`). You can keep chatting meanwhile."})
+            return "", chat_history, job.job_id
+
+        chat_history.append({"role": "assistant", "content": "You should first click on 'Upload Document(s)' in the rag dropdown to upload document(s)."})
+        return "", chat_history, ""
+
+    @staticmethod
+    def track_upload(job_id: str, request: gr.Request) -> Tuple[str, gr.Timer]:
+        """
+        Reports the progress of an ingestion job. Called by the upload timer, without waiting,
+        so that no worker thread is held while the job runs; the timer stops once the job finishes.
+        Each call counts as activity of the session, so that it does not expire while it waits.
+        
+        Args:
+            job_id (str): The id of the ingestion job.
+            request (gr.Request): The Gradio request, identifying the user session.
         
-        return "", chat_history
+        Returns:
+            Tuple[str, gr.Timer]: The current status of the job, and the upload timer, active until the job finishes.
+        """
+        # Imported on first use, as the ingestion imports LangChain, which is slow to import
+        from utils.ingestion_jobs import IngestionJobManager
+
+        job = IngestionJobManager.get(job_id) if job_id else None
+        if job is None:
+            return "", gr.Timer(active=False)
+        SessionManager.touch(request.session_hash)
+        return job.describe(), gr.Timer(active=not job.finished)
+
+    @staticmethod
+    def cancel_upload(job_id: str) -> str:
+        """
+        Cancels an ingestion job.
+        
+        Args:
+            job_id (str): The id of the ingestion job.
+        
+        Returns:
+            str: The status of the job after the cancellation request.
+        """
+        # Imported on first use, as the ingestion imports LangChain, which is slow to import
+        from utils.ingestion_jobs import IngestionJobManager
+
+        job = IngestionJobManager.cancel(job_id) if job_id else None
+        if job is None:
+            return "There is no upload to cancel."
+        return job.describe() if job.finished else f"Cancelling upload job `{job.job_id}`..."
@@ -1,6 +1,8 @@
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 from utils.load_app_config import LoadAppConfig
-from typing import List
+from utils.resource_registry import ResourceRegistry
+from functools import lru_cache
+from typing import Any, List, Tuple
 
 # Load application configuration
 APP_CONFIG = LoadAppConfig()
@@ -22,17 +24,61 @@ def convert_messages_to_dict(messages: List[BaseMessage]) -> List[dict]:
     return formatted_messages
 
 
+def get_gen_tokenizer() -> Any:
+    """
+    Returns the tokenizer of the generation model, loading it once per process.
+
+    Returns:
+        PreTrainedTokenizerBase: The tokenizer.
+    """
+    def load_tokenizer() -> Any:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(APP_CONFIG.gen_model_id)
+
+    return ResourceRegistry.get_or_create(("gen_tokenizer", APP_CONFIG.gen_model_id), load_tokenizer)
+
+
+@lru_cache(maxsize=APP_CONFIG.tokenization_cache_size)
+def tokenize_text(text: str) -> Tuple[int, ...]:
+    """
+    Tokenize a text with the generation model's tokenizer, without special tokens.
+    Results are cached, since the same retrieved chunks come back across many questions.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        Tuple[int, ...]: The token ids.
+    """
+    return tuple(get_gen_tokenizer().encode(text, add_special_tokens=False))
+
+
+def count_text_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the generation model's tokenizer, without special tokens.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return len(get_gen_tokenizer().encode(text, add_special_tokens=False))
+
+
 def count_tokens(messages: List[BaseMessage]) -> int:
     """
-    Count the total number of tokens in a list of messages using a specified tokenizer.
+    Count the tokens of the prompt the model server builds from a list of messages, that is
+    the messages rendered with the generation model's chat template and tokenized.
     
     Args:
         messages (List[BaseMessage]): A list of messages.
 
     Returns:
-        int: The total number of tokens across all messages.
+        int: The total number of prompt tokens.
     """
-    total_tokens = 0
-    for message in messages:
-        total_tokens += len(message.content)
-    return total_tokens
+    return len(get_gen_tokenizer().apply_chat_template(
+        convert_messages_to_dict(messages),
+        add_generation_prompt=True,
+        tokenize=True
+    ))
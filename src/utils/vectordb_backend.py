@@ -0,0 +1,248 @@
+from langchain_core.vectorstores import VectorStore
+from langchain_core.embeddings.embeddings import Embeddings
+from utils.local_vector_store import LocalVectorIndex, LocalVectorStore
+from utils.load_app_config import LoadAppConfig
+from utils.resource_registry import ResourceRegistry
+from typing import Any, List
+import threading
+import time
+
+# Load application configuration
+APP_CONFIG = LoadAppConfig()
+
+class VectorDBBackend:
+    """
+    Base class of the vector database backends selected by `vectordb_config.index.backend`.
+    """
+
+    def create_index(self, dimension: int) -> None:
+        """
+        Creates the index if it does not already exist.
+
+        Args:
+            dimension (int): Dimension of the embeddings stored in the index.
+        """
+        raise NotImplementedError
+
+    def get_vector_store(self, embedding: Embeddings) -> VectorStore:
+        """
+        Returns a LangChain vector store on the index.
+
+        Args:
+            embedding (Embeddings): The embedding model used by the store.
+
+        Returns:
+            VectorStore: The vector store.
+        """
+        raise NotImplementedError
+
+    def upsert_embeddings(self,
+                          namespace: str,
+                          ids: List[str],
+                          texts: List[str],
+                          metadatas: List[dict],
+                          embeddings: List[List[float]]
+        ) -> None:
+        """
+        Stores chunks whose embeddings were already computed, replacing chunks with the same ids.
+
+        Args:
+            namespace (str): The namespace to write to.
+            ids (List[str]): The chunk ids.
+            texts (List[str]): The chunk texts.
+            metadatas (List[dict]): The chunk metadata.
+            embeddings (List[List[float]]): The chunk embeddings.
+        """
+        raise NotImplementedError
+
+    def list_namespaces(self) -> List[str]:
+        """
+        Lists the namespaces holding vectors.
+
+        Returns:
+            List[str]: The namespace names.
+        """
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace: str) -> None:
+        """
+        Deletes every vector of a namespace, if the namespace exists.
+
+        Args:
+            namespace (str): The namespace to delete.
+        """
+        raise NotImplementedError
+
+
+class PineconeBackend(VectorDBBackend):
+    """
+    A backend storing the vectors in a Pinecone serverless index.
+    """
+
+    def __init__(self, index_name: str, cloud: str, region: str) -> None:
+        """
+        Initializes the PineconeBackend class.
+
+        Args:
+            index_name (str): Name of the Pinecone index.
+            cloud (str): Cloud provider for Pinecone.
+            region (str): Region of the Pinecone server.
+        """
+        self.index_name = index_name
+        self.cloud = cloud
+        self.region = region
+        self.index_ready = False
+        self.lock = threading.Lock()
+        self.client = None
+        self.index = None
+
+    def __get_index(self) -> Any:
+        """
+        Returns the Pinecone client and index handle, creating them on first use.
+        """
+        from pinecone import Pinecone
+
+        with self.lock:
+            if self.index is None:
+                self.client = Pinecone()
+                self.index = self.client.Index(self.index_name)
+            return self.client, self.index
+
+    def create_index(self, dimension: int) -> None:
+        from pinecone import ServerlessSpec
+
+        # The index only has to be checked once per process
+        if self.index_ready:
+            return
+        pc, _ = self.__get_index()
+        existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
+        if self.index_name not in existing_indexes:
+            pc.create_index(
+                name=self.index_name,
+                dimension=dimension,
+                metric="cosine",
+                spec=ServerlessSpec(cloud=self.cloud, region=self.region),
+            )
+            while not pc.describe_index(self.index_name).status["ready"]:
+                time.sleep(1)
+        else:
+            index_dimension = pc.describe_index(self.index_name).dimension
+            if index_dimension != dimension:
+                raise ValueError(
+                    f"The Pinecone index '{self.index_name}' has dimension {index_dimension}, but the embedding "
+                    f"model produces {dimension}-dimension vectors. Delete the index or use another index name."
+                )
+        self.index_ready = True
+
+    def get_vector_store(self, embedding: Embeddings) -> VectorStore:
+        from langchain_pinecone import PineconeVectorStore
+
+        _, index = self.__get_index()
+        return PineconeVectorStore(index=index, embedding=embedding)
+
+    def upsert_embeddings(self, namespace, ids, texts, metadatas, embeddings) -> None:
+        # Store the text under the "text" key, where PineconeVectorStore reads it back
+        _, index = self.__get_index()
+        vectors = [
+            {"id": chunk_id, "values": embedding, "metadata": {**metadata, "text": text}}
+            for chunk_id, text, metadata, embedding in zip(ids, texts, metadatas, embeddings)
+        ]
+        for start in range(0, len(vectors), 100):
+            index.upsert(vectors=vectors[start:start + 100], namespace=namespace)
+
+    def list_namespaces(self) -> List[str]:
+        _, index = self.__get_index()
+        return list(index.describe_index_stats().get("namespaces", {}).keys())
+
+    def delete_namespace(self, namespace: str) -> None:
+        _, index = self.__get_index()
+        stats = index.describe_index_stats()
+
+        if "namespaces" in stats and namespace in stats["namespaces"]:
+            index.delete(delete_all=True, namespace=namespace)
+
+
+class LocalBackend(VectorDBBackend):
+    """
+    A backend storing the vectors in an embedded, on-disk LocalVectorIndex.
+    """
+
+    def __init__(self, persist_dir: str, ivf_min_vectors: int, ivf_nlist: int, ivf_nprobe: int) -> None:
+        """
+        Initializes the LocalBackend class.
+
+        Args:
+            persist_dir (str): Directory in which the index is persisted.
+            ivf_min_vectors (int): Segment size from which the approximate IVF search is used.
+            ivf_nlist (int): Number of IVF clusters, 0 for sqrt(number of vectors).
+            ivf_nprobe (int): Number of IVF clusters scanned per query.
+        """
+        self.index = LocalVectorIndex(
+            persist_dir,
+            ivf_min_vectors=ivf_min_vectors,
+            ivf_nlist=ivf_nlist,
+            ivf_nprobe=ivf_nprobe
+        )
+
+    def create_index(self, dimension: int) -> None:
+        # The local index is created on disk when it is first written to
+        pass
+
+    def get_vector_store(self, embedding: Embeddings) -> VectorStore:
+        return LocalVectorStore(index=self.index, embedding=embedding)
+
+    def upsert_embeddings(self, namespace, ids, texts, metadatas, embeddings) -> None:
+        self.index.upsert(namespace, ids, texts, metadatas, embeddings)
+
+    def list_namespaces(self) -> List[str]:
+        return self.index.list_namespaces()
+
+    def delete_namespace(self, namespace: str) -> None:
+        self.index.delete(namespace, delete_all=True)
+
+
+def create_vectordb_backend(backend: str, index_name: str, cloud: str, region: str) -> VectorDBBackend:
+    """
+    Returns the vector database backend with the given name. Backends, and with them their
+    clients and index handles, are created once per process and shared.
+
+    Args:
+        backend (str): Name of the backend, "pinecone" or "local".
+        index_name (str): Name of the Pinecone index.
+        cloud (str): Cloud provider for Pinecone.
+        region (str): Region of the Pinecone server.
+
+    Returns:
+        VectorDBBackend: The backend.
+    """
+    if backend == "pinecone":
+        return ResourceRegistry.get_or_create(
+            ("vectordb_backend", backend, index_name, cloud, region),
+            lambda: PineconeBackend(index_name, cloud, region)
+        )
+    if backend == "local":
+        return ResourceRegistry.get_or_create(
+            ("vectordb_backend", backend, APP_CONFIG.local_index_dir),
+            lambda: LocalBackend(
+                APP_CONFIG.local_index_dir,
+                APP_CONFIG.ivf_min_vectors,
+                APP_CONFIG.ivf_nlist,
+                APP_CONFIG.ivf_nprobe
+            )
+        )
+    raise ValueError(f"Unknown vector database backend '{backend}', expected 'pinecone' or 'local'.")
+
+
+def get_vectordb_backend() -> VectorDBBackend:
+    """
+    Returns the vector database backend selected in the application configuration.
+
+    Returns:
+        VectorDBBackend: The backend.
+    """
+    return create_vectordb_backend(
+        APP_CONFIG.vectordb_backend,
+        APP_CONFIG.index_name,
+        APP_CONFIG.cloud,
+        APP_CONFIG.region
+    )